@@ -11,6 +11,7 @@ import sys
 from eggbot import constants
 from eggbot.eggbotcore import eggbot
 from eggbot.utils import loadext
+from eggbot.utils.loadmodules import ModuleRunner
 
 
 def main() -> int:
@@ -18,7 +19,13 @@ def main() -> int:
     logging.basicConfig(level="INFO")
     for ext in loadext.load_ext(constants.FilePaths.exts):
         eggbot.load_extension(ext)
-    eggbot.run(constants.secretbox.get("EGGBOT_TOKEN"))
+    modules = ModuleRunner(eggbot)
+    modules.load_all(constants.FilePaths.modules)
+    modules.register(eggbot)
+    try:
+        eggbot.run(constants.secretbox.get("EGGBOT_TOKEN"))
+    finally:
+        modules.close()
 
     return 0
 
@@ -4,12 +4,116 @@ Author  : Preocts
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/eggbot
 """
+import asyncio
+import copy
 import logging
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import AbstractSet
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import Mapping
+from typing import MutableMapping
 from typing import Optional
+from typing import Set
 
 from eggbot.utils.configio import ConfigIO
+from eggbot.utils.configio import Version
+from eggbot.utils.configwatch import ConfigWatcher
+from eggbot.utils.configwatch import Subscriber
+
+CACHE_SIZE: int = 256
+# Brings one key of a config reloaded from disk to the loaded schema, None to
+# remove it. Can raise KeyError, TypeError, or ValueError
+Upgrade = Callable[[Mapping[str, Any], str], Any]
+
+
+class LazyConfig(MutableMapping[str, Any]):
+    """Config mapping that decodes values by key on first access
+
+    Decoded values are kept in least recently used order. Once more than
+    `cache_size` are held the oldest are dropped, to be decoded again when
+    next read. Keys changed since the last save are pinned; they are never
+    dropped and do not count toward `cache_size`.
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[str],
+        loader: Callable[[str], Any],
+        cache_size: int = CACHE_SIZE,
+    ) -> None:
+        self.known: Dict[str, None] = dict.fromkeys(keys)
+        self.loader = loader
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[str, Any]" = OrderedDict()
+        self.pinned: Set[str] = set()
+
+    def __repr__(self) -> str:
+        return f"LazyConfig({len(self.cache)} of {len(self.known)} loaded)"
+
+    def __len__(self) -> int:
+        return len(self.known)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.known))
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.known
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.known:
+            raise KeyError(key)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        value = self.cache[key] = self.loader(key)
+        self.evict()
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.known[key] = None
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        self.pinned.add(key)
+        self.evict()
+
+    def __delitem__(self, key: str) -> None:
+        del self.known[key]
+        self.cache.pop(key, None)
+        self.pinned.discard(key)
+
+    def refresh(self, key: str, exists: bool) -> None:
+        """Drop decoded value of a key changed on disk, add or remove the key"""
+        self.cache.pop(key, None)
+        if exists:
+            self.known[key] = None
+        else:
+            self.known.pop(key, None)
+
+    def hold(self, key: str, value: Any) -> None:
+        """Hold a decoded value of a key without pinning it, as if loaded"""
+        self.known[key] = None
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        self.evict()
+
+    def unpin(self, keys: Iterable[str]) -> None:
+        """Allow keys to be dropped, once saved"""
+        self.pinned.difference_update(keys)
+        self.evict()
+
+    def evict(self, cache_size: Optional[int] = None) -> None:
+        """Drop least recently used unpinned values until at or under cache_size"""
+        limit = self.cache_size if cache_size is None else cache_size
+        over = len(self.cache) - len(self.pinned) - limit
+        if over <= 0:
+            return
+        for key in [key for key in self.cache if key not in self.pinned][:over]:
+            del self.cache[key]
 
 
 class ConfigFile:
@@ -18,7 +122,12 @@ class ConfigFile:
     configClient: ConfigIO = ConfigIO()
     logger = logging.getLogger(__name__)
 
-    def __init__(self, filename: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        filename: Optional[str] = None,
+        lazy: bool = False,
+        cache_size: int = CACHE_SIZE,
+    ) -> None:
         """Layer for accessing JSON configuration file
 
         If the filename is provided the configuration will be loaded and
@@ -26,31 +135,194 @@ class ConfigFile:
 
         Args:
             filename : Path and name of the JSON config file
+            lazy : Load only the keys, decoding values on first read
+            cache_size : Decoded values held in lazy mode before dropping oldest
         """
         self.filename: Optional[str] = filename
-        self.__config: Dict[str, Any] = {}
+        self.lazy = lazy
+        self.cache_size = cache_size
+        self.__config: MutableMapping[str, Any] = {}
+        self.__changed: Set[str] = set()
+        self.__version: Optional[Version] = None
+        # Applied to keys reloaded from disk, set by configmigrate.migrate()
+        self.upgrade: Optional[Upgrade] = None
+
+    def __contains__(self, key: object) -> bool:
+        """True if key exists in the configuration"""
+        return key in self.__config
+
+    @property
+    def config(self) -> Mapping[str, Any]:
+        """Return read-only view of configuration dictionary, does not copy"""
+        return MappingProxyType(self.__config)
+
+    @property
+    def dirty(self) -> bool:
+        """True if config has changed since last load or save"""
+        return bool(self.__changed)
 
     @property
-    def config(self) -> Dict[str, Any]:
-        """Return copy of configuration dictionary"""
-        return dict(self.__config)
+    def changed(self) -> AbstractSet[str]:
+        """Top-level keys created, updated, or deleted since last load or save"""
+        return frozenset(self.__changed)
+
+    def touch(self, key: str) -> None:
+        """Mark a key as changed after its value was modified in place"""
+        self.__changed.add(key)
 
     def unload(self) -> None:
         """Unloads config without saving"""
         self.__config = {}
+        self.__changed = set()
+        self.__version = None
 
     def load(self, filename: Optional[str] = None) -> bool:
         """Load config. Uses prior loaded file if none provided"""
         if filename:
             self.filename = filename
-        self.__config = self.configClient.load(self.filename)
+        # Taken before reading so a write during the load is seen as a change
+        self.__version = self.configClient.version(self.filename)
+        if self.lazy:
+            loaded_from = self.filename
+            self.__config = LazyConfig(
+                keys=self.configClient.load_keys(loaded_from),
+                loader=lambda key: self.configClient.load_key(key, loaded_from),
+                cache_size=self.cache_size,
+            )
+        else:
+            self.__config = self.configClient.load(self.filename)
+        self.__changed = set()
         return bool(self.__config)
 
+    def evict(self) -> None:
+        """In lazy mode, drop all decoded values that have no unsaved changes"""
+        if isinstance(self.__config, LazyConfig):
+            self.__config.evict(0)
+
+    def watch(
+        self, watcher: ConfigWatcher, subscriber: Optional[Subscriber] = None
+    ) -> Optional[Subscriber]:
+        """Apply changes made to the file on disk as the watcher finds them
+
+        Subscriber, if given, is called with the config and keys applied. A
+        file that loads empty or invalid, such as mid-edit, is not applied.
+        Returns the callback registered with the watcher, to unsubscribe.
+        """
+
+        async def on_change(
+            config: Mapping[str, Any], changed: AbstractSet[str]
+        ) -> None:
+            applied = self.apply_changes(config, changed)
+            if subscriber is not None and applied:
+                result = subscriber(self.config, frozenset(applied))
+                if asyncio.iscoroutine(result):
+                    await result
+
+        def load(filename: str) -> Dict[str, Any]:
+            config = self.configClient.load(filename)
+            if not config:
+                raise ValueError("Config empty or formatted incorrectly")
+            return config
+
+        if not self.filename:
+            self.logger.error(".watch() No filename to watch.")
+            return None
+        current = None if self.lazy else self.__config
+        watcher.subscribe(self.filename, on_change, load, current)
+        return on_change
+
+    def apply_changes(
+        self, config: Mapping[str, Any], changed: AbstractSet[str]
+    ) -> Set[str]:
+        """Update keys from a reloaded config, returns keys applied
+
+        Keys with unsaved changes are kept as they are. With `upgrade` set,
+        keys are upgraded before they are applied and kept as they are if
+        they cannot be.
+        """
+        applied: Set[str] = set()
+        for key in changed:
+            if key in self.__changed:
+                self.logger.warning("'%s' changed on disk and unsaved, kept", key)
+                continue
+            exists, value = key in config, config.get(key)
+            if exists and self.upgrade is not None:
+                try:
+                    value = self.upgrade(config, key)
+                except (KeyError, TypeError, ValueError) as err:
+                    self.logger.error("'%s' reloaded, cannot upgrade: %s", key, err)
+                    continue
+                exists = value is not None
+            if isinstance(self.__config, LazyConfig):
+                self.__config.refresh(key, exists)
+                if exists and self.upgrade is not None:
+                    self.__config.hold(key, copy.deepcopy(value))
+            elif not exists:
+                self.__config.pop(key, None)
+            elif self.__config.get(key) != value:
+                self.__config[key] = copy.deepcopy(value)
+            else:
+                continue
+            applied.add(key)
+        return applied
+
     def save(self, filename: Optional[str] = None) -> bool:
-        """Save config. Uses prior loaded file if none provided"""
-        if filename:
+        """Save config if changed. Uses prior loaded file if none provided
+
+        Saving to a new filename always writes the full config.
+        """
+        changed = self.__start_save(filename)
+        if changed is None:
+            return True
+        saved = self.configClient.save(
+            self.__config,
+            self.filename,
+            changed=changed,
+            version=self.__version,
+            copy_unchanged=self.lazy,
+        )
+        self.__finish_save(changed, saved)
+        return saved
+
+    async def save_async(self, filename: Optional[str] = None) -> bool:
+        """Save config if changed without blocking. See ConfigIO.save_async"""
+        changed = self.__start_save(filename)
+        if changed is None:
+            return True
+        saved = await self.configClient.save_async(
+            self.__config,
+            self.filename,
+            changed=changed,
+            version=self.__version,
+            copy_unchanged=self.lazy,
+        )
+        self.__finish_save(changed, saved)
+        return saved
+
+    def __start_save(self, filename: Optional[str]) -> Optional[Set[str]]:
+        """Return keys changed to save and reset tracking, None if nothing to save"""
+        if filename and filename != self.filename:
             self.filename = filename
-        return self.configClient.save(self.__config, self.filename)
+            self.__changed.update(self.__config)
+            self.__version = None
+        if not self.__changed:
+            self.logger.debug("No changes to save for %s", self.filename)
+            return None
+        changed, self.__changed = self.__changed, set()
+        return changed
+
+    def __finish_save(self, changed: Set[str], saved: bool) -> None:
+        """Restore changed keys to tracking if the save failed
+
+        The version is kept only when the file now matches this config. After
+        a merge with changes from another process it is unknown and later
+        saves merge too, until reloaded.
+        """
+        self.__version = self.configClient.written.get(str(self.filename))
+        if not saved:
+            self.__changed.update(changed)
+        elif isinstance(self.__config, LazyConfig):
+            self.__config.unpin(changed - self.__changed)
 
     def read(self, key: str) -> Any:
         """Reads values by key from config. Returns None if not exists"""
@@ -61,24 +333,27 @@ class ConfigFile:
         if not isinstance(key, str):
             self.logger.error(".create() key not string. Given a %s", str(type(key)))
             return False
-        if key in self.config.keys():
+        if key in self.__config:
             self.logger.error(".create() key already exists, use .update()")
             return False
         self.__config[key] = value
+        self.__changed.add(key)
         return True
 
     def update(self, key: str, value: Any = None) -> bool:
         """Updates key/value pair in the configuration"""
-        if key not in self.__config.keys():
+        if key not in self.__config:
             self.logger.error(".update() key not found, use .create()")
             return False
         self.__config[key] = value
+        self.__changed.add(key)
         return True
 
     def delete(self, key: str) -> bool:
         """Deletes key from configuration"""
-        if key not in self.__config.keys():
+        if key not in self.__config:
             self.logger.error(".delete() key not found.")
             return False
         del self.__config[key]
+        self.__changed.add(key)
         return True
@@ -22,3 +22,4 @@ class FilePaths:
     """Where are things located"""
 
     exts = "eggbot/exts"
+    modules = "modules"
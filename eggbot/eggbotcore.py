@@ -13,6 +13,8 @@ import discord
 from discord.ext import commands
 
 from eggbot import constants
+from eggbot.utils.commandrouter import router
+from eggbot.utils.configwatch import watcher
 
 
 class EggbotCore(commands.Bot):
@@ -23,6 +25,20 @@ class EggbotCore(commands.Bot):
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
 
+    async def on_ready(self) -> None:
+        """Start watching config files for changes once connected"""
+        self.logger.info("Connected as %s", self.user)
+        watcher.start()
+
+    async def on_message(self, message: discord.Message) -> None:
+        """Route module commands, pass other messages on as plain_message"""
+        if message.author.bot:
+            return
+        if await router.dispatch(message):
+            return
+        self.dispatch("plain_message", message)
+        await self.process_commands(message)
+
     def add_cog(self, cog: commands.Cog) -> None:
         """Add our own logging to cog loader"""
         super().add_cog(cog)
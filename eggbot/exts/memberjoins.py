@@ -5,24 +5,55 @@ Offers a simple configuration driven event handler for when a member
 joins a Discord guild. With room to expand, this offer a great starter
 module. Schedule a viewing before it is gone!
 
+Actions of each guild are compiled when the config is loaded or reloaded:
+inactive actions are dropped, channels parsed to IDs, and messages compiled
+as templates. A join only renders and sends.
+
+Channel actions can set a burst window. Once more than `burst_threshold`
+members join within `burst_window` seconds, further joins are collected and
+welcomed together in one message when the window ends. Direct messages are
+queued and sent one at a time, paced to stay under rate limits.
+
+The actions of one join run concurrently, with at most MAX_SENDS channel
+sends in flight across all guilds. An action can name another action of the
+guild it `depends_on`; it then runs after that action, and only if it
+succeeded. A direct message or a join held for a burst succeeds once it is
+sent, not when queued, so its dependents wait for the send. A failed action
+does not stop the others.
+
 Author  : Preocts
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/eggbot
 """
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from collections import deque
+from operator import attrgetter
+from typing import AbstractSet
 from typing import Any
+from typing import Deque
 from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Mapping
 from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
 
 from discord import Guild
+from discord import HTTPException
 from discord import Member
 from discord.ext.commands import Cog
 
 from eggbot.eggbotcore import EggbotCore
 from eggbot.utils import tomlio
+from eggbot.utils.configwatch import watcher
+from eggbot.utils.template import Template
+from eggbot.utils.template import TemplateEngine
 
 
 class JoinConfig(NamedTuple):
@@ -32,6 +63,10 @@ class JoinConfig(NamedTuple):
     channel: str
     message: str
     active: bool
+    burst_window: float = 0.0
+    burst_threshold: int = 0
+    burst_message: str = ""
+    depends_on: str = ""
 
     @classmethod
     def from_dict(cls, config: Dict[str, Any]) -> JoinConfig:
@@ -41,9 +76,59 @@ class JoinConfig(NamedTuple):
             channel=str(config["channel"]),
             message=str(config["message"]),
             active=bool(config["active"]),
+            burst_window=float(config.get("burst_window", 0.0)),
+            burst_threshold=int(config.get("burst_threshold", 0)),
+            burst_message=str(config.get("burst_message", "")),
+            depends_on=str(config.get("depends_on", "")),
         )
 
 
+class Burst(NamedTuple):
+    """Compiled burst settings of a channel action"""
+
+    window: float
+    threshold: int
+    template: Template
+
+
+class JoinAction(NamedTuple):
+    """Compiled action, channel_id is 0 for a direct message"""
+
+    name: str
+    channel_id: int
+    template: Template
+    burst: Optional[Burst] = None
+    depends_on: str = ""
+
+
+class BurstContext(NamedTuple):
+    """Values of a burst message"""
+
+    guild_name: str
+    mentions: str
+    joined: int
+
+
+def resolve(futures: Iterable["asyncio.Future[bool]"], result: bool) -> None:
+    """Set the result of futures not already done"""
+    for future in futures:
+        if not future.done():
+            future.set_result(result)
+
+
+class BurstState:
+    """Recent joins and members waiting to be welcomed by one action"""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self) -> None:
+        self.joins: Deque[float] = deque()
+        self.pending: List[Member] = []
+        # Resolved with the result of the burst message, one per pending member
+        self.sent: List["asyncio.Future[bool]"] = []
+        self.task: Optional["asyncio.Future[None]"] = None
+
+
 class MemberJoins(Cog):
     """Process members joining server"""
 
@@ -57,13 +142,114 @@ class MemberJoins(Cog):
         "[USERNAME]": ["name"],
         "[MENTION]": ["mention"],
     }
+    TEMPLATES = TemplateEngine(
+        {tag: attrgetter(".".join(attrs)) for tag, attrs in METADATA.items()}
+    )
+    BURST_TEMPLATES = TemplateEngine(
+        {
+            "[GUILDNAME]": attrgetter("guild_name"),
+            "[MENTIONS]": attrgetter("mentions"),
+            "[COUNT]": attrgetter("joined"),
+        }
+    )
+    BURST_MESSAGE: str = "Welcome [MENTIONS]!"
+    MESSAGE_LIMIT: int = 2000
+    DM_QUEUE_SIZE: int = 1000
+    DM_INTERVAL: float = 1.0
+    MAX_SENDS: int = 10
 
     logger = logging.getLogger(__name__)
 
     def __init__(self, *args: Any, **kwargs: Dict[str, Any]) -> None:
         self.logger.info("Loading MemberJoins...")
         super().__init__(*args, **kwargs)
-        self.config = tomlio.load(self.DEFAULT_CONFIG)
+        self.config: Mapping[str, Any] = tomlio.load(self.DEFAULT_CONFIG)
+        self.actions: Dict[str, Tuple[JoinAction, ...]] = {}
+        self.compile_guilds(self.config)
+        # By guild ID, channel ID, and action name
+        self.bursts: Dict[Tuple[int, int, str], BurstState] = {}
+        # Direct messages waiting to be sent, with the future of each send
+        self.dm_queue: Optional[
+            "asyncio.Queue[Tuple[str, Member, asyncio.Future[bool]]]"
+        ] = None
+        self._dm_task: Optional["asyncio.Future[None]"] = None
+        self._send_limit: Optional[asyncio.Semaphore] = None
+        watcher.subscribe(
+            self.DEFAULT_CONFIG, self.on_config_change, tomlio.load, self.config
+        )
+
+    def cog_unload(self) -> None:
+        """Stop watching config and sending when the cog is removed"""
+        watcher.unsubscribe(self.DEFAULT_CONFIG, self.on_config_change)
+        for state in self.bursts.values():
+            if state.task is not None:
+                state.task.cancel()
+            resolve(state.sent, False)
+        self.bursts.clear()
+        if self._dm_task is not None:
+            self._dm_task.cancel()
+            self._dm_task = None
+        while self.dm_queue is not None and not self.dm_queue.empty():
+            resolve([self.dm_queue.get_nowait()[2]], False)
+
+    def on_config_change(
+        self, config: Mapping[str, Any], changed: AbstractSet[str]
+    ) -> None:
+        """Replace config when edited on disk, recompiling changed guilds"""
+        self.logger.info("Join actions reloaded for %s", ", ".join(sorted(changed)))
+        self.config = config
+        self.compile_guilds(config, changed)
+
+    def compile_guilds(
+        self, config: Mapping[str, Any], guild_ids: Optional[Iterable[str]] = None
+    ) -> None:
+        """Compile actions of guilds in config, all by default"""
+        for guild_id in config if guild_ids is None else guild_ids:
+            actions = self.compile_actions(guild_id, config.get(guild_id) or [])
+            if actions:
+                self.actions[guild_id] = actions
+            else:
+                self.actions.pop(guild_id, None)
+
+    def compile_actions(
+        self, guild_id: str, config: Iterable[Any]
+    ) -> Tuple[JoinAction, ...]:
+        """Compile active actions of a guild, skipping invalid actions"""
+        actions: List[JoinAction] = []
+        names: Set[str] = set()
+        for action_config in config:
+            try:
+                action = JoinConfig.from_dict(action_config)
+                channel_id = int(action.channel) if action.channel else 0
+            except (KeyError, TypeError, ValueError) as err:
+                self.logger.error("Invalid join action in '%s': %s", guild_id, err)
+                continue
+            if not action.active:
+                continue
+            depends_on = action.depends_on
+            if depends_on and depends_on not in names:
+                self.logger.error(
+                    "Join action '%s' in '%s' depends on '%s', not an earlier action",
+                    action.name,
+                    guild_id,
+                    depends_on,
+                )
+                depends_on = ""
+            names.add(action.name)
+            burst = None
+            if channel_id and action.burst_window > 0:
+                burst = Burst(
+                    action.burst_window,
+                    action.burst_threshold,
+                    self.BURST_TEMPLATES.compile(
+                        action.burst_message or self.BURST_MESSAGE
+                    ),
+                )
+            template = self.TEMPLATES.compile(action.message)
+            actions.append(
+                JoinAction(action.name, channel_id, template, burst, depends_on)
+            )
+        return tuple(actions)
 
     @Cog.listener()
     async def on_member_join(self, member: Member) -> None:
@@ -73,43 +259,179 @@ class MemberJoins(Cog):
         if member.bot:
             return None
 
-        actions = self.get_actions(str(member.guild.id))
+        actions = self.actions.get(str(member.guild.id))
 
         if not actions:
             self.logger.debug("No actions defined for '%s'", member.guild.id)
             return None
 
+        tasks: List["asyncio.Future[bool]"] = []
+        by_name: Dict[str, "asyncio.Future[bool]"] = {}
+        depended_on = {action.depends_on for action in actions}
         for action in actions:
-            if not action.active:
-                continue
-            content = self.format_content(action.message, member)
-            if action.channel:
-                await self._send_channel(content, action.channel, member.guild)
+            dependency = by_name.get(action.depends_on)
+            task = asyncio.ensure_future(
+                self.run_action(
+                    action, member, dependency, wait=action.name in depended_on
+                )
+            )
+            by_name.setdefault(action.name, task)
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+
+    def send_limit(self) -> asyncio.Semaphore:
+        """Semaphore bounding channel sends in flight, made on first use"""
+        if self._send_limit is None:
+            self._send_limit = asyncio.Semaphore(self.MAX_SENDS)
+        return self._send_limit
+
+    async def run_action(
+        self,
+        action: JoinAction,
+        member: Member,
+        dependency: Optional["asyncio.Future[bool]"] = None,
+        wait: bool = False,
+    ) -> bool:
+        """Run one action for a member, returns False if it or its dependency
+        failed
+
+        Direct messages and joins held for a burst are sent later. With wait,
+        as for actions others depend on, the result is that of the send.
+        Otherwise being queued is success.
+        """
+        if dependency is not None and not await dependency:
+            self.logger.info(
+                "Skipped '%s', '%s' failed", action.name, action.depends_on
+            )
+            return False
+        try:
+            if not action.channel_id:
+                sent = self.queue_dm(action.template.render(member), member)
             else:
+                held = self.collect_burst(action, member)
+                if held is None:
+                    content = action.template.render(member)
+                    async with self.send_limit():
+                        await self._send_channel(
+                            content, action.channel_id, member.guild
+                        )
+                    return True
+                sent = held
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception("Join action '%s' failed", action.name)
+            return False
+        return await sent if wait else True
+
+    def collect_burst(
+        self, action: JoinAction, member: Member
+    ) -> Optional["asyncio.Future[bool]"]:
+        """Hold a join for the burst message if over threshold
+
+        Returns a future of whether the burst message was sent, None if the
+        join is not held.
+        """
+        burst = action.burst
+        if burst is None:
+            return None
+        key = (member.guild.id, action.channel_id, action.name)
+        state = self.bursts.setdefault(key, BurstState())
+        now = time.monotonic()
+        while state.joins and state.joins[0] <= now - burst.window:
+            state.joins.popleft()
+        state.joins.append(now)
+        if len(state.joins) <= burst.threshold and state.task is None:
+            return None
+        sent: "asyncio.Future[bool]" = asyncio.get_event_loop().create_future()
+        state.pending.append(member)
+        state.sent.append(sent)
+        if state.task is None:
+            state.task = asyncio.ensure_future(
+                self._flush_burst(key, action, member.guild)
+            )
+        return sent
+
+    async def _flush_burst(
+        self, key: Tuple[int, int, str], action: JoinAction, guild: Guild
+    ) -> None:
+        """Welcome members held during a burst window in one message"""
+        await asyncio.sleep(action.burst.window if action.burst else 0)
+        state = self.bursts[key]
+        members, state.pending, state.task = state.pending, [], None
+        sent, state.sent = state.sent, []
+        if not members or action.burst is None:
+            resolve(sent, False)
+            return
+        content = self.render_burst(action.burst.template, guild, members)
+        result = False
+        try:
+            async with self.send_limit():
+                await self._send_channel(content, action.channel_id, guild)
+            result = True
+        except HTTPException as err:
+            self.logger.error("Burst message '%s' failed: %s", action.name, err)
+        finally:
+            resolve(sent, result)
+
+    def render_burst(
+        self, template: Template, guild: Guild, members: List[Member]
+    ) -> str:
+        """Render a burst message, mentioning as many members as fit"""
+        count = len(members)
+        base = len(template.render(BurstContext(guild.name, "", count)))
+        # Leave room for the count of members not mentioned
+        budget = self.MESSAGE_LIMIT - base - len(f" and {count} more")
+        mentions: List[str] = []
+        for member in members:
+            budget -= len(member.mention) + (2 if mentions else 0)
+            if budget < 0:
+                break
+            mentions.append(member.mention)
+        text = ", ".join(mentions)
+        if len(mentions) < count:
+            text += f" and {count - len(mentions)} more"
+        content = template.render(BurstContext(guild.name, text, count))
+        return content[: self.MESSAGE_LIMIT]
+
+    def queue_dm(self, content: str, member: Member) -> "asyncio.Future[bool]":
+        """Queue a direct message to be sent by the paced DM sender
+
+        Returns a future of whether it was sent, False at once if the queue is
+        full.
+        """
+        if self.dm_queue is None:
+            self.dm_queue = asyncio.Queue(self.DM_QUEUE_SIZE)
+        if self._dm_task is None:
+            self._dm_task = asyncio.ensure_future(self._dm_sender(self.dm_queue))
+        sent: "asyncio.Future[bool]" = asyncio.get_event_loop().create_future()
+        try:
+            self.dm_queue.put_nowait((content, member, sent))
+        except asyncio.QueueFull:
+            self.logger.warning("DM queue full, not sending to '%s'", member.name)
+            sent.set_result(False)
+        return sent
+
+    async def _dm_sender(
+        self, queue: "asyncio.Queue[Tuple[str, Member, asyncio.Future[bool]]]"
+    ) -> None:
+        """Send queued direct messages one at a time, DM_INTERVAL apart"""
+        while True:
+            content, member, sent = await queue.get()
+            result = False
+            try:
                 await self._send_dm(content, member)
+                result = True
+            except HTTPException as err:
+                self.logger.warning("DM to '%s' failed: %s", member.name, err)
+            finally:
+                queue.task_done()
+                resolve([sent], result)
+            await asyncio.sleep(self.DM_INTERVAL)
 
-    def format_content(self, content: str, member: Member) -> str:
-        """Replaced metadata tags in content, returns new string"""
-        new_content = content
-        for metatag, attribs in self.METADATA.items():
-            replace: Any = ""
-            for attr in attribs:
-                replace = getattr(replace, attr) if replace else getattr(member, attr)
-            new_content = new_content.replace(metatag, replace)
-        return new_content
-
-    def get_actions(self, guild_id: str) -> List[JoinConfig]:
-        """Return a list of JoinConfig for a guild. Will be empty if not found"""
-        config = self.config.get(guild_id)
-        if config is None:
-            return []
-        return [JoinConfig.from_dict(action) for action in config]
-
-    async def _send_channel(self, content: str, channel_id: str, guild: Guild) -> None:
+    async def _send_channel(self, content: str, channel_id: int, guild: Guild) -> None:
         """Send a message to a specific channel within guild"""
-        channel = guild.get_channel(int(channel_id))
+        channel = guild.get_channel(channel_id)
         if channel is None:
-            self.logger.warning("'%s' channel not found in %s", channel, guild.name)
+            self.logger.warning("'%s' channel not found in %s", channel_id, guild.name)
         else:
             self.logger.info("Join message sent to '%s' in '%s'", channel, guild.name)
             await channel.send(content)
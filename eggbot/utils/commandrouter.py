@@ -0,0 +1,179 @@
+"""
+Route command messages to the module that owns them
+
+Modules register each of their commands, such as `kudos!max`, with a handler
+and an optional check of who may run it. Commands are kept in a trie by
+character, so a message is matched by walking its first word once: most
+messages leave the trie at their first character, and a command reaches its
+handler in one walk however many modules are loaded.
+
+Handlers run in their own task with a timeout, by owner if one is set.
+dispatch returns once the task is scheduled, so a slow command does not hold
+up the messages after it. A handler that fails or runs past its timeout is
+logged and does not reach the caller of dispatch.
+
+Commands are matched on the message content. Routes added with clean=True
+are confirmed on `clean_content`, with mentions resolved, as parsers reading
+clean_content expect.
+
+    router.add("audit!here", audit.audit_here, check=audit.is_allowed)
+    if not await router.dispatch(message):
+        ...  # Not a command, or not allowed: handle as a plain message
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import asyncio
+import logging
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+
+from discord import Message
+
+# Runs a command from its message
+Handler = Callable[[Message], Awaitable[Any]]
+# True if the author may run the command here
+Check = Callable[[Message], bool]
+
+# Seconds a command handler may take
+COMMAND_TIMEOUT: float = 10.0
+
+logger = logging.getLogger(__name__)
+
+
+class Route(NamedTuple):
+    """A registered command"""
+
+    command: str
+    handler: Handler
+    check: Optional[Check] = None
+    owner: str = ""
+    clean: bool = False
+
+
+class _Node:
+    """Trie node, a route ends here if set"""
+
+    __slots__ = ("children", "route")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        self.route: Optional[Route] = None
+
+
+class CommandRouter:
+    """Prefix trie of commands to handlers"""
+
+    def __init__(self, timeout: float = COMMAND_TIMEOUT) -> None:
+        self._root = _Node()
+        self._routes: Dict[str, Route] = {}
+        self.timeout = timeout
+        self.timeouts: Dict[str, float] = {}
+        self._running: Set["asyncio.Future[None]"] = set()
+
+    def add(
+        self,
+        command: str,
+        handler: Handler,
+        check: Optional[Check] = None,
+        owner: str = "",
+        clean: bool = False,
+    ) -> None:
+        """Route messages starting with command to handler, ValueError if taken
+
+        With clean, the command must also start the message's clean_content.
+        """
+        if not command or command != command.strip() or len(command.split()) > 1:
+            raise ValueError(f"Command must be one word: '{command}'")
+        if command in self._routes:
+            raise ValueError(f"Command already registered: '{command}'")
+        node = self._root
+        for char in command:
+            node = node.children.setdefault(char, _Node())
+        node.route = Route(command, handler, check, owner, clean)
+        self._routes[command] = node.route
+
+    def set_timeout(self, owner: str, timeout: float) -> None:
+        """Seconds the handlers of an owner may take"""
+        self.timeouts[owner] = timeout
+
+    def remove(self, owner: str) -> None:
+        """Remove all commands of an owner"""
+        for route in [r for r in self._routes.values() if r.owner == owner]:
+            del self._routes[route.command]
+            self._prune(route.command)
+        self.timeouts.pop(owner, None)
+
+    def _prune(self, command: str) -> None:
+        """Clear the route of command and drop nodes left empty"""
+        path: List[_Node] = [self._root]
+        for char in command:
+            path.append(path[-1].children[char])
+        path[-1].route = None
+        for depth in range(len(command), 0, -1):
+            if path[depth].children or path[depth].route is not None:
+                break
+            del path[depth - 1].children[command[depth - 1]]
+
+    def commands(self, owner: Optional[str] = None) -> List[str]:
+        """Registered commands, of one owner if given"""
+        return sorted(
+            route.command
+            for route in self._routes.values()
+            if owner is None or route.owner == owner
+        )
+
+    def find(self, content: str) -> Optional[Route]:
+        """Route of the first word of content, None if not a command"""
+        node = self._root
+        for char in content.lstrip():
+            if char.isspace():
+                break
+            next_node = node.children.get(char)
+            if next_node is None:
+                return None
+            node = next_node
+        return node.route
+
+    async def dispatch(self, message: Message) -> bool:
+        """Start the command of a message in its own task, True if started"""
+        route = self.find(message.content or "")
+        if route is not None and route.clean:
+            if self.find(message.clean_content or "") is not route:
+                route = None
+        if route is None:
+            return False
+        if route.check is not None and not route.check(message):
+            logger.debug("'%s' not allowed for %s", route.command, message.author)
+            return False
+        task = asyncio.ensure_future(self._run(route, message))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return True
+
+    async def join(self) -> None:
+        """Wait for the handlers started by dispatch to finish"""
+        while self._running:
+            await asyncio.wait(list(self._running))
+
+    async def _run(self, route: Route, message: Message) -> None:
+        """Run a handler in its own task, logging errors and cancelling on timeout"""
+        timeout = self.timeouts.get(route.owner, self.timeout)
+        try:
+            await asyncio.wait_for(
+                asyncio.ensure_future(route.handler(message)), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("'%s' timed out after %.1fs", route.command, timeout)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception("'%s' failed: %s", route.command, err)
+
+
+router = CommandRouter()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark of config codecs
+
+Compares save time, load time, and file size of each codec in configcodec.
+Given config files are benchmarked as they are. Without any, a config is
+generated shaped like ShoulderBird's: guilds of members, each with a regex
+and ignore list.
+
+Usage:
+    $ python -m eggbot.utils.configbench (configs/name.json ...)
+    $ python -m eggbot.utils.configbench --guilds 500 --members 200
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from eggbot.utils import configcodec
+from eggbot.utils.configio import ConfigIO
+
+
+def generate_config(guilds: int, members: int, seed: int = 0) -> Dict[str, Any]:
+    """Generate a guild-keyed config of the given size"""
+    # Seeded for repeatable sample data, not used for security
+    rand = random.Random(seed)  # nosec
+    config: Dict[str, Any] = {"module": "Benchmark", "version": "1.0.0"}
+    for _ in range(guilds):
+        guild_id = str(rand.getrandbits(60))
+        config[guild_id] = {
+            str(member_id): {
+                "guild_id": guild_id,
+                "member_id": str(member_id),
+                "regex": f"(?i)\\b(egg|{rand.getrandbits(32):x})\\b",
+                "toggle": rand.random() > 0.5,
+                "ignore": [
+                    str(rand.getrandbits(60)) for _ in range(rand.randint(0, 4))
+                ],
+            }
+            for member_id in (rand.getrandbits(60) for _ in range(members))
+        }
+    return config
+
+
+def best_of(runs: int, func: Callable[[], Any]) -> float:
+    """Fastest wall time of func in seconds over runs"""
+    timings: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench(config: Dict[str, Any], runs: int) -> List[Dict[str, Any]]:
+    """Return save time, load time, and size of config for each codec"""
+    configio = ConfigIO()
+    results: List[Dict[str, Any]] = []
+    path = tempfile.mkdtemp()
+    try:
+        for codec in configcodec.CODECS:
+            if codec is configcodec.ZSTD and not configcodec.HAS_ZSTD:
+                continue
+            filename = os.path.join(path, "bench" + codec.suffix)
+            save = best_of(runs, lambda: configio.save(config, filename))
+            load = best_of(runs, lambda: configio.load(filename))
+            results.append(
+                {
+                    "codec": codec.name,
+                    "save_ms": save * 1000,
+                    "load_ms": load * 1000,
+                    "bytes": os.path.getsize(filename),
+                }
+            )
+    finally:
+        shutil.rmtree(path)
+    return results
+
+
+def print_results(title: str, results: List[Dict[str, Any]]) -> None:
+    """Print results as a table"""
+    print(f"\n{title}")
+    print(f"{'codec':<10}{'save ms':>12}{'load ms':>12}{'bytes':>14}")
+    for row in results:
+        print(
+            f"{row['codec']:<10}{row['save_ms']:>12.2f}"
+            f"{row['load_ms']:>12.2f}{row['bytes']:>14,}"
+        )
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark config codecs")
+    parser.add_argument("configs", nargs="*", help="Config files to benchmark")
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--members", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=5)
+    opts = parser.parse_args(args)
+
+    print(f"orjson: {configcodec.HAS_ORJSON}, zstandard: {configcodec.HAS_ZSTD}")
+    for filename in opts.configs:
+        config = ConfigIO().load(filename)
+        if not config:
+            print(f"Skipping {filename}, not loaded")
+            continue
+        print_results(filename, bench(config, opts.runs))
+    if not opts.configs:
+        config = generate_config(opts.guilds, opts.members)
+        title = f"Generated: {opts.guilds} guilds of {opts.members} members"
+        print_results(title, bench(config, opts.runs))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Codecs for JSON config files
+
+The codec used to save a config file is chosen by its extension:
+
+    name.json      : JSON indented by four spaces, for hand editing (default)
+    name.min.json  : compact JSON
+    name.json.gz   : compact JSON, gzip compressed
+    name.json.zst  : compact JSON, zstd compressed (needs `zstandard`)
+
+Loading does not trust the extension; compressed files are recognized by the
+magic bytes at the start of the file so a renamed file still loads.
+
+When `orjson` is installed it is used to encode compact JSON and to decode
+all JSON, falling back to the stdlib for values it does not support.
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import gzip
+import json
+import zlib
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:  # pragma: no cover
+    HAS_ORJSON = False
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:  # pragma: no cover
+    HAS_ZSTD = False
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Byte offsets (start, end) of each top-level value by key
+Offsets = Dict[str, Tuple[int, int]]
+
+
+class Raw(bytes):
+    """A value as found in a saved file, rendered as is without encoding"""
+
+
+def dumps_compact(value: Any) -> bytes:
+    """Encode a value as compact JSON"""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(value, separators=(",", ":")).encode("UTF-8")
+
+
+def dumps_pretty(value: Any) -> bytes:
+    """Encode a value as JSON indented by four spaces"""
+    return json.dumps(value, indent=4).encode("UTF-8")
+
+
+def loads(raw: bytes) -> Any:
+    """Decode JSON. Raises ValueError if invalid"""
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # Stdlib accepts a few things orjson does not, such as NaN
+            pass
+    return json.loads(raw.decode("UTF-8"))
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    """Compress with zstd. Raises ValueError if zstandard is not installed"""
+    if not HAS_ZSTD:
+        raise ValueError("zstd configs need the 'zstandard' package installed")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    """Decompress zstd. Raises ValueError if invalid or not installed"""
+    if not HAS_ZSTD:
+        raise ValueError("zstd configs need the 'zstandard' package installed")
+    try:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    except zstandard.ZstdError as err:
+        raise ValueError(f"Invalid zstd data: {err}") from err
+
+
+def _gzip_decompress(data: bytes) -> bytes:
+    """Decompress gzip. Raises ValueError if invalid"""
+    try:
+        return gzip.decompress(data)
+    except (OSError, EOFError, zlib.error) as err:
+        raise ValueError(f"Invalid gzip data: {err}") from err
+
+
+class Codec:
+    """Encoding of a whole config file"""
+
+    def __init__(
+        self,
+        name: str,
+        suffix: str,
+        pretty: bool,
+        compress: Optional[Callable[[bytes], bytes]] = None,
+    ) -> None:
+        self.name = name
+        self.suffix = suffix
+        self.pretty = pretty
+        self.compress = compress
+
+    def __repr__(self) -> str:
+        return f"Codec({self.name})"
+
+    @property
+    def indexed(self) -> bool:
+        """True if values can be read by byte offset from the saved file"""
+        return self.compress is None
+
+    def encode(self, document: Mapping[str, Any]) -> bytes:
+        """Encode a config as saved on disk"""
+        return self.render(document)[0]
+
+    def render(self, document: Mapping[str, Any]) -> Tuple[bytes, Offsets]:
+        """Encode a config with byte offsets of each value, offsets are empty
+        when the codec compresses"""
+        if self.pretty:
+            content, offsets = _render_pretty(document)
+        else:
+            content, offsets = _render_compact(document)
+        if self.compress is not None:
+            return self.compress(content), {}
+        return content, offsets
+
+
+def _render_pretty(document: Mapping[str, Any]) -> Tuple[bytes, Offsets]:
+    """Render as json.dumps(indent=4) would, with a trailing newline"""
+    if not document:
+        return b"{}\n", {}
+    offsets: Offsets = {}
+    parts: List[bytes] = []
+    position = 2  # b"{\n"
+    for key, value in document.items():
+        head = f"    {json.dumps(key)}: ".encode("UTF-8")
+        if isinstance(value, Raw):
+            body = bytes(value)
+        else:
+            body = dumps_pretty(value).replace(b"\n", b"\n    ")
+        offsets[key] = (position + len(head), position + len(head) + len(body))
+        parts.append(head + body)
+        position += len(head) + len(body) + 2  # b",\n"
+    return b"{\n" + b",\n".join(parts) + b"\n}\n", offsets
+
+
+def _render_compact(document: Mapping[str, Any]) -> Tuple[bytes, Offsets]:
+    """Render as compact JSON"""
+    offsets: Offsets = {}
+    parts: List[bytes] = []
+    position = 1  # b"{"
+    for key, value in document.items():
+        head = dumps_compact(key) + b":"
+        body = bytes(value) if isinstance(value, Raw) else dumps_compact(value)
+        offsets[key] = (position + len(head), position + len(head) + len(body))
+        parts.append(head + body)
+        position += len(head) + len(body) + 1  # b","
+    return b"{" + b",".join(parts) + b"}", offsets
+
+
+PRETTY = Codec("json", ".json", pretty=True)
+COMPACT = Codec("compact", ".min.json", pretty=False)
+GZIP = Codec(
+    "gzip",
+    ".json.gz",
+    pretty=False,
+    compress=lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+)
+ZSTD = Codec("zstd", ".json.zst", pretty=False, compress=_zstd_compress)
+CODECS: List[Codec] = [COMPACT, GZIP, ZSTD, PRETTY]
+
+
+def get_codec(filename: str) -> Codec:
+    """Return the codec used to save a config, by extension"""
+    for codec in CODECS:
+        if filename.lower().endswith(codec.suffix):
+            return codec
+    return PRETTY
+
+
+def decode(raw: bytes) -> Any:
+    """Decode a config file as saved by any codec. Raises ValueError if invalid"""
+    if raw.startswith(GZIP_MAGIC):
+        raw = _gzip_decompress(raw)
+    elif raw.startswith(ZSTD_MAGIC):
+        raw = _zstd_decompress(raw)
+    return loads(raw)
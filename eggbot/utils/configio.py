@@ -1,15 +1,52 @@
 """
 JSON Config input and output
 
+Storage is handled by the backend chosen for the config path, see configstore.
+
+Several processes can share a configs directory. Saves hold the config's lock
+and single file configs are versioned by modified time, size, and inode. A
+save of changed keys to a file another process wrote since it was loaded
+merges the changed keys into the file as it is now instead of overwriting it.
+
 Author  : Preocts
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/eggbot
 """
-import json
+import asyncio
 import logging
+import pickle  # nosec
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AbstractSet
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
 from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from eggbot.utils.configstore import ConfigStore
+from eggbot.utils.configstore import file_lock
+from eggbot.utils.configstore import get_store
+from eggbot.utils.configstore import JsonFileStore
+from eggbot.utils.configstore import stamp
+
+# Modified time, size, and inode of a config file
+Version = Tuple[int, int, int]
+# Snapshot of a save: pickled value by key (None when deleted), keys changed
+# (None for all), version of the file the config was loaded from, and whether
+# keys not changed are copied from the file
+Snapshot = Tuple[
+    Dict[str, Optional[bytes]], Optional[Set[str]], Optional[Version], bool
+]
+# Called on the event loop as a write starts, returns the write to run
+Prepare = Callable[[], Callable[[], bool]]
+# Waiting save of a file: a config snapshot, or a whole-file write to prepare
+Pending = Union[Snapshot, Prepare]
 
 
 class ConfigIO:
@@ -17,37 +54,242 @@ class ConfigIO:
 
     logger = logging.getLogger(__name__)
 
+    def __init__(self) -> None:
+        """Writer thread and state for coalescing async saves by filename"""
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="ConfigIO")
+        self._writers: Dict[str, "asyncio.Future[None]"] = {}
+        self._pending: Dict[str, Tuple[Pending, "asyncio.Future[bool]"]] = {}
+        self.written: Dict[str, Optional[Version]] = {}
+
     def load(self, filename: Optional[str] = None) -> Dict[str, Any]:
-        """Loads a config json, dumps loaded config with no prompt"""
-        loaded_config: Dict[str, Any] = {}
+        """Loads a config, dumps loaded config with no prompt"""
         if not filename:
             self.logger.error("No filename provided to load, aborting.")
-            return loaded_config
-        try:
-            with open(filename, "r", encoding="UTF-8") as input_file:
-                loaded_config = json.loads(input_file.read())
-        except (FileNotFoundError, IsADirectoryError):
-            self.logger.error(".load() Configuration file not found at %s", filename)
-        except json.decoder.JSONDecodeError:
-            self.logger.error(
-                ".load() Configuration file empty or formatted incorrectly, that's "
-                "sad. You can get a new one at: https://github.com/Preocts/Egg_Bot"
-            )
-        except OSError as err:
-            self.logger.error(".load() Something failed loading configuations: %s", err)
-            self.logger.error("", exc_info=True)
-        return loaded_config
+            return {}
+        return get_store(filename).load_all()
 
-    def save(self, config: Dict[str, Any], filename: Optional[str] = None) -> bool:
-        """Saves a config json, overwrites existing file with no prompt"""
+    def load_keys(self, filename: Optional[str] = None) -> List[str]:
+        """Loads the top-level keys of a config without decoding values"""
+        if not filename:
+            self.logger.error("No filename provided to load, aborting.")
+            return []
+        return get_store(filename).keys()
+
+    def load_key(self, key: str, filename: Optional[str] = None) -> Any:
+        """Loads one top-level key of a config, None if not found"""
+        if not filename:
+            self.logger.error("No filename provided to load, aborting.")
+            return None
+        return get_store(filename).load_key(key)
+
+    def version(self, filename: Optional[str] = None) -> Optional[Version]:
+        """Version of a config file on disk, None if not found"""
+        return stamp(filename) if filename else None
+
+    def save(
+        self,
+        config: Mapping[str, Any],
+        filename: Optional[str] = None,
+        changed: Optional[AbstractSet[str]] = None,
+        version: Optional[Version] = None,
+        copy_unchanged: bool = False,
+    ) -> bool:
+        """Saves a config, overwrites existing with no prompt
+
+        When `changed` (top-level keys modified since the last save) is given
+        and the storage supports it only those keys are written. Otherwise the
+        full config is written and keys not in config are removed.
+
+        Single file configs are rewritten whole. When `changed` is given and
+        the file is not at `version` the changed keys are merged into the file
+        as found. The version written is kept in `written`, None if merged.
+        With `copy_unchanged` the changed keys are always merged into the file,
+        so config only needs the changed keys, as for a lazily loaded config.
+        """
         if not filename:
             self.logger.error("No filename provided to save, aborting.")
             return False
         try:
-            with open(filename, "w", encoding="UTF-8") as out_file:
-                out_file.write(json.dumps(config, indent=4) + "\n")
+            with file_lock(filename):
+                store = get_store(filename)
+                if isinstance(store, JsonFileStore):
+                    return self._save_file(
+                        store, config, changed, version, copy_unchanged
+                    )
+                return self._save_keys(store, config, changed)
         except OSError as err:
-            self.logger.error(".save() Cannot save core config: %s", err)
-            self.logger.error("", exc_info=True)
+            self.logger.error(".save() Cannot lock %s: %s", filename, err)
+            return False
+
+    @staticmethod
+    def _save_keys(
+        store: ConfigStore,
+        config: Mapping[str, Any],
+        changed: Optional[AbstractSet[str]],
+    ) -> bool:
+        """Write changed keys, or all keys removing stale keys"""
+        if changed is None:
+            for key in set(store.keys()) - set(config):
+                store.delete_key(key)
+        for key in config if changed is None else changed:
+            if key in config:
+                store.put_key(key, config[key])
+            else:
+                store.delete_key(key)
+        return store.flush()
+
+    def _save_file(
+        self,
+        store: JsonFileStore,
+        config: Mapping[str, Any],
+        changed: Optional[AbstractSet[str]],
+        version: Optional[Version],
+        copy_unchanged: bool = False,
+    ) -> bool:
+        """Write whole file, merging changed keys if written by another process
+
+        Keys not changed are copied from the file as found without decoding.
+        """
+        current = stamp(store.filename)
+        merge = changed is not None and current is not None and current != version
+        if merge:
+            self.logger.info("%s changed on disk, merging changes", store.filename)
+        splice = merge or (
+            copy_unchanged and changed is not None and current is not None
+        )
+        if splice:
+            store.document = store.load_raw()
+        keys: Iterable[str] = changed if splice and changed is not None else config
+        for key in keys:
+            if key in config:
+                store.put_key(key, config[key])
+            else:
+                store.delete_key(key)
+        saved = store.flush()
+        self.written[store.filename] = (
+            stamp(store.filename) if saved and not merge else None
+        )
+        return saved
+
+    async def save_async(
+        self,
+        config: Mapping[str, Any],
+        filename: Optional[str] = None,
+        changed: Optional[AbstractSet[str]] = None,
+        version: Optional[Version] = None,
+        copy_unchanged: bool = False,
+    ) -> bool:
+        """Saves a config from the writer thread, overwrites with no prompt
+
+        A snapshot of the keys to save is taken before returning control to the
+        event loop, pickled as that is cheaper than JSON. Values are encoded
+        once, in the writer thread, as they are written. When a
+        save of the same file is already in flight, waiting snapshots are merged
+        and written once after it; all callers waiting share its result.
+        With `copy_unchanged` only changed keys are taken, see save().
+        """
+        if not filename:
+            self.logger.error("No filename provided to save, aborting.")
             return False
-        return True
+        whole = changed is None or (
+            isinstance(get_store(filename), JsonFileStore) and not copy_unchanged
+        )
+        keys: Iterable[str] = config if whole or changed is None else changed
+        values = {
+            key: pickle.dumps(config[key], pickle.HIGHEST_PROTOCOL)
+            if key in config
+            else None
+            for key in keys
+        }
+        changed_keys = None if changed is None else set(changed)
+        loop = asyncio.get_running_loop()
+
+        pending_save, waiter = self._pending.get(filename, (None, None))
+        if isinstance(pending_save, tuple) and waiter is not None:
+            pending, pending_changed, _, _ = pending_save
+            if not whole:
+                values = {**pending, **values}
+            if changed_keys is not None and pending_changed is not None:
+                changed_keys |= pending_changed
+            else:
+                changed_keys = None
+        else:
+            waiter = loop.create_future()
+        copy_unchanged = copy_unchanged and changed_keys is not None
+        self._pending[filename] = (
+            (values, changed_keys, version, copy_unchanged),
+            waiter,
+        )
+
+        if filename not in self._writers:
+            self._writers[filename] = asyncio.ensure_future(self._writer(filename))
+
+        return await asyncio.shield(waiter)
+
+    async def write_async(self, filename: str, prepare: Prepare) -> bool:
+        """Run a whole-file write of a file that is not a config, such as a
+        sidecar, from the writer thread
+
+        `prepare` is called on the event loop as the write starts, to take its
+        snapshot, and returns the write to run. One write per file is in
+        flight. A write still waiting to start when another is queued is
+        dropped for the newer one, and its callers share the newer result.
+        """
+        pending = self._pending.get(filename)
+        if pending is not None:
+            waiter = pending[1]
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+        self._pending[filename] = (prepare, waiter)
+
+        if filename not in self._writers:
+            self._writers[filename] = asyncio.ensure_future(self._writer(filename))
+
+        return await asyncio.shield(waiter)
+
+    async def _writer(self, filename: str) -> None:
+        """Write pending snapshots of a file one at a time until none remain"""
+        loop = asyncio.get_running_loop()
+        # Version a write started from and the version it wrote
+        chain: Tuple[Optional[Version], Optional[Version]] = (None, None)
+        try:
+            while filename in self._pending:
+                pending, waiter = self._pending.pop(filename)
+                started: Optional[Version] = None
+                if callable(pending):
+                    try:
+                        write = pending()
+                    except Exception as err:  # pylint: disable=broad-except
+                        self.logger.error(".write_async() Prepare failed: %s", err)
+                        waiter.set_result(False)
+                        continue
+                else:
+                    values, changed, version, copy_unchanged = pending
+                    started = version
+                    if version is not None and version == chain[0]:
+                        # Queued from the same version while the last write ran
+                        version = chain[1]
+                    write = partial(
+                        self._write_snapshot,
+                        (values, changed, version, copy_unchanged),
+                        filename,
+                    )
+                try:
+                    result = await loop.run_in_executor(self.executor, write)
+                except Exception as err:  # pylint: disable=broad-except
+                    self.logger.error(".save_async() Writer failed: %s", err)
+                    result = False
+                chain = (started, self.written.get(filename))
+                waiter.set_result(result)
+        finally:
+            del self._writers[filename]
+
+    def _write_snapshot(self, snapshot: Snapshot, filename: str) -> bool:
+        """Unpickle a snapshot, only ever pickled by `save_async()`, and save it"""
+        values, changed, version, copy_unchanged = snapshot
+        config = {
+            key: pickle.loads(value)  # nosec
+            for key, value in values.items()
+            if value is not None
+        }
+        return self.save(config, filename, changed, version, copy_unchanged)
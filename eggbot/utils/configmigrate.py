@@ -0,0 +1,150 @@
+"""
+Schema migrations for module configs
+
+Module configs carry top-level `module` and `version` keys. A module
+registers a migration for each version step of its schema; every other
+top-level key (a guild, for most configs) is a section the migration
+rewrites into the next shape. On load, migrate() runs the steps needed to
+bring a config to the module's current version and saves once, so reads
+can rely on the current schema. Sections later reloaded from disk by a
+watcher are upgraded the same way as they are applied.
+
+    @migration("ShoulderBird", "1.0.0", "1.1.0")
+    def fill_members(key: str, section: Any) -> Any:
+        ...  # Return a new section in the next shape, None to remove it
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import logging
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Tuple
+
+from eggbot.configfile import ConfigFile
+
+logger = logging.getLogger(__name__)
+
+META_KEYS = ("module", "version")
+DEFAULT_VERSION = "1.0.0"
+
+# Called with the key and value of a section, returns new value or None
+Upgrade = Callable[[str, Any], Any]
+
+
+class Migration(NamedTuple):
+    """One version step of a module's config schema"""
+
+    from_version: str
+    to_version: str
+    upgrade: Upgrade
+
+
+MIGRATIONS: Dict[str, Dict[str, Migration]] = {}
+
+
+def version_key(version: str) -> Tuple[int, ...]:
+    """Comparable form of a dotted version string"""
+    return tuple(int(part) for part in version.split("."))
+
+
+def migration(
+    module: str, from_version: str, to_version: str
+) -> Callable[[Upgrade], Upgrade]:
+    """Register a section upgrade from one version of a module config to next"""
+
+    def register(upgrade: Upgrade) -> Upgrade:
+        steps = MIGRATIONS.setdefault(module, {})
+        if from_version in steps:
+            raise ValueError(f"{module} already has a migration from {from_version}")
+        steps[from_version] = Migration(from_version, to_version, upgrade)
+        return upgrade
+
+    return register
+
+
+def plan(module: str, from_version: str, to_version: str) -> List[Migration]:
+    """Steps from one version to another. Raises ValueError if no path"""
+    steps: List[Migration] = []
+    version = from_version
+    while version != to_version:
+        step = MIGRATIONS.get(module, {}).get(version)
+        if step is None or version_key(step.to_version) > version_key(to_version):
+            raise ValueError(f"No migration of {module} from {version}")
+        steps.append(step)
+        version = step.to_version
+    return steps
+
+
+def upgrader(module: str, version: str) -> Callable[[Mapping[str, Any], str], Any]:
+    """Upgrade of one key of a reloaded config to version, for ConfigFile
+
+    Raises ValueError if the reloaded config cannot be brought to version.
+    """
+
+    def upgrade(config: Mapping[str, Any], key: str) -> Any:
+        if key in META_KEYS:
+            return module if key == "module" else version
+        section = config[key]
+        for step in plan(module, config.get("version") or DEFAULT_VERSION, version):
+            section = step.upgrade(key, section)
+            if section is None:
+                break
+        return section
+
+    return upgrade
+
+
+def migrate(config: ConfigFile, module: str, version: str) -> bool:
+    """Bring a loaded config to version, saving once if changed
+
+    Configs without a version are taken as DEFAULT_VERSION. All sections are
+    upgraded before any are written back, so the config is left untouched if
+    it cannot be migrated (newer than version, no path, or a step raised) and
+    False is returned. Once at version, sections the config reloads from disk
+    are upgraded as they are applied.
+    """
+    current = config.read("version") or DEFAULT_VERSION
+    if current == version:
+        config.upgrade = upgrader(module, version)
+        return True
+    if version_key(current) > version_key(version):
+        logger.error("%s config is %s, newer than %s", module, current, version)
+        return False
+    try:
+        steps = plan(module, current, version)
+    except ValueError as err:
+        logger.error("Cannot migrate config: %s", err)
+        return False
+
+    sections = {
+        key: config.read(key) for key in list(config.config) if key not in META_KEYS
+    }
+    try:
+        for step in steps:
+            logger.info("Migrating %s config to %s", module, step.to_version)
+            for key, section in list(sections.items()):
+                upgraded = step.upgrade(key, section)
+                if upgraded is None:
+                    del sections[key]
+                else:
+                    sections[key] = upgraded
+    except (KeyError, TypeError, ValueError) as err:
+        logger.error("Migration of %s config failed, not changed: %s", module, err)
+        return False
+
+    for key in list(config.config):
+        if key not in META_KEYS and key not in sections:
+            config.delete(key)
+    for key, value in {**sections, "module": module, "version": version}.items():
+        if key in config:
+            config.update(key, value)
+        else:
+            config.create(key, value)
+    config.upgrade = upgrader(module, version)
+    return config.save()
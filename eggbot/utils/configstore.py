@@ -0,0 +1,507 @@
+"""
+Storage backends for JSON configs
+
+Each backend stores a config as top-level keys with JSON values. Changes are
+staged with put_key/delete_key and written by flush, which returns False on
+failure. The backend is chosen by the config path:
+
+    configs/name.json          : single JSON file (default for any other path)
+                                 see configcodec for compact and compressed files
+    configs/name.d/            : directory with one JSON file per top-level key
+    configs/name.sqlite (.db)  : SQLite table of key and JSON value
+
+Backends are light and made per operation by get_store(), so a backend is
+only ever used from the thread that made it.
+
+Writers hold an advisory lock (`<path>.lock`, fcntl on POSIX) for the config
+so processes sharing a configs directory take turns writing.
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import json
+import logging
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Protocol
+from typing import Tuple
+from typing import Union
+from urllib.parse import quote
+from urllib.parse import unquote
+
+from eggbot.utils import configcodec
+from eggbot.utils.configcodec import Offsets
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:  # pragma: no cover
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+SHARD_SUFFIX = ".d"
+INDEX_SUFFIX = ".idx"
+LOCK_SUFFIX = ".lock"
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DELETE = object()
+
+# Parsed indexes by filename with the stamp of the file they index
+_indexes: Dict[str, Tuple[List[int], Offsets]] = {}
+_indexes_lock = threading.Lock()
+
+
+class ConfigStore(Protocol):
+    """Storage of a config by top-level key"""
+
+    filename: str
+
+    def keys(self) -> List[str]:
+        """List keys found in storage"""
+
+    def load_key(self, key: str) -> Any:
+        """Load the value of one key, None if not found"""
+
+    def load_all(self) -> Dict[str, Any]:
+        """Load all keys, empty if not found or invalid"""
+
+    def put_key(self, key: str, value: Any) -> None:
+        """Stage key to be written on flush"""
+
+    def delete_key(self, key: str) -> None:
+        """Stage key to be deleted on flush"""
+
+    def flush(self) -> bool:
+        """Write staged changes, returns False on failure"""
+
+
+def get_store(filename: str) -> ConfigStore:
+    """Return the storage backend for a config path"""
+    if filename.lower().endswith(SQLITE_SUFFIXES):
+        return SqliteStore(filename)
+    shard_path = filename.endswith("/") or filename.rstrip("/").endswith(SHARD_SUFFIX)
+    if shard_path or os.path.isdir(filename):
+        return ShardedJsonStore(filename)
+    return JsonFileStore(filename)
+
+
+def stamp(filename: str) -> Optional[Tuple[int, int, int]]:
+    """Modified time, size, and inode of a file, None if not found
+
+    Files are replaced on write so the inode tells apart writes made within
+    the resolution of the modified time.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+@contextmanager
+def file_lock(filename: str) -> Iterator[None]:
+    """Hold an exclusive advisory lock on a config between processes. Can raise
+
+    No lock is taken where fcntl is not available.
+    """
+    if not HAS_FCNTL:
+        yield
+        return
+    with open(filename.rstrip("/") + LOCK_SUFFIX, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(filename: str, content: Union[str, bytes]) -> None:
+    """Write to temp file in same directory, fsync, replace original. Can raise"""
+    temp_name = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if isinstance(content, str):
+        content = content.encode("UTF-8")
+    try:
+        with open(temp_name, "wb") as out_file:
+            out_file.write(content)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(temp_name, filename)
+    finally:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+
+
+def dumps(value: Any) -> str:
+    """Format a value as stored on disk"""
+    return json.dumps(value, indent=4) + "\n"
+
+
+class JsonFileStore:
+    """Whole config in a single JSON file, every flush rewrites the file
+
+    The file is encoded by the codec matching its extension, see configcodec.
+    Byte offsets of each top-level value can be kept in an index sidecar
+    (`<filename>.idx`) so one key is decoded without parsing the whole file.
+    The index is built on first use, rebuilt when the file's stamp() no longer
+    matches, and rewritten on flush once it exists. The parsed index is kept
+    in memory by stamp so loading many keys reads the sidecar once.
+    Compressed files have no index and are decoded whole.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.index_name = filename + INDEX_SUFFIX
+        self.codec = configcodec.get_codec(filename)
+        self.document: Dict[str, Any] = {}
+
+    def keys(self) -> List[str]:
+        """List keys found in storage, from the index"""
+        if not self.codec.indexed:
+            return list(self.load_all())
+        return list(self.index())
+
+    def load_key(self, key: str) -> Any:
+        """Load the value of one key, decoding only that value"""
+        if not self.codec.indexed:
+            return self.load_all().get(key)
+        offsets = self.index().get(key)
+        if offsets is None:
+            return None
+        start, end = offsets
+        try:
+            with open(self.filename, "rb") as input_file:
+                input_file.seek(start)
+                return configcodec.loads(input_file.read(end - start))
+        except (OSError, ValueError) as err:
+            logger.error(
+                ".load() Failed loading '%s' from %s: %s", key, self.filename, err
+            )
+            return None
+
+    def load_raw(self) -> Dict[str, Any]:
+        """Load all keys with values as Raw bytes of the file, not decoded
+
+        Values are rendered as found when the document is flushed. Decoded
+        instead for compressed files. The index sidecar is not created here.
+        """
+        if not self.codec.indexed:
+            return self.load_all()
+        try:
+            stamp = self._stamp()
+            with open(self.filename, "rb") as input_file:
+                raw = input_file.read()
+            offsets = self._known_index(stamp) if stamp is not None else None
+            if offsets is None:
+                offsets = self._scan()
+                self._remember(offsets, stamp)
+        except (OSError, ValueError) as err:
+            logger.error(".load() Cannot load %s: %s", self.filename, err)
+            return {}
+        return {
+            key: configcodec.Raw(raw[start:end])
+            for key, (start, end) in offsets.items()
+        }
+
+    def load_all(self) -> Dict[str, Any]:
+        """Load all keys, empty if not found or invalid"""
+        loaded_config: Dict[str, Any] = {}
+        try:
+            with open(self.filename, "rb") as input_file:
+                loaded_config = configcodec.decode(input_file.read())
+        except (FileNotFoundError, IsADirectoryError):
+            logger.error(".load() Configuration file not found at %s", self.filename)
+        except ValueError:
+            logger.error(
+                ".load() Configuration file empty or formatted incorrectly, that's "
+                "sad. You can get a new one at: https://github.com/Preocts/Egg_Bot"
+            )
+        except OSError as err:
+            logger.error(".load() Something failed loading configuations: %s", err)
+            logger.error("", exc_info=True)
+        return loaded_config
+
+    def put_key(self, key: str, value: Any) -> None:
+        """Stage key to be written on flush"""
+        self.document[key] = value
+
+    def delete_key(self, key: str) -> None:
+        """Stage key to be deleted on flush"""
+        self.document.pop(key, None)
+
+    def flush(self) -> bool:
+        """Write the full document, and the index if one is kept"""
+        content, offsets = self.codec.render(self.document)
+        try:
+            atomic_write(self.filename, content)
+        except OSError as err:
+            logger.error(".save() Cannot save core config: %s", err)
+            logger.error("", exc_info=True)
+            return False
+        stamped = self._stamp()
+        if offsets and stamped is not None and os.path.isfile(self.index_name):
+            self._remember(offsets, stamped)
+            self._save_index(offsets, stamped)
+        return True
+
+    def index(self) -> Offsets:
+        """Return byte offsets (start, end) of each top-level value by key
+
+        The offsets returned may be shared, do not modify.
+        """
+        stamp = self._stamp()
+        if stamp is None:
+            logger.error(".load() Configuration file not found at %s", self.filename)
+            return {}
+        offsets = self._known_index(stamp)
+        if offsets is not None:
+            return offsets
+        try:
+            offsets = self._scan()
+        except (OSError, ValueError) as err:
+            logger.error(".load() Cannot index %s: %s", self.filename, err)
+            return {}
+        self._remember(offsets, stamp)
+        self._save_index(offsets, stamp)
+        return offsets
+
+    def _known_index(self, stamp: List[int]) -> Optional[Offsets]:
+        """Index of the file at stamp held in memory or saved, None if neither"""
+        with _indexes_lock:
+            cached = _indexes.get(self.filename)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            with open(self.index_name, "r", encoding="UTF-8") as input_file:
+                saved = json.loads(input_file.read())
+            if saved["stamp"] == stamp:
+                offsets = {
+                    key: (start, end) for key, (start, end) in saved["keys"].items()
+                }
+                self._remember(offsets, stamp)
+                return offsets
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.debug("Index not found or stale for %s, building", self.filename)
+        return None
+
+    def _remember(self, offsets: Offsets, stamp: Optional[List[int]] = None) -> None:
+        """Keep parsed offsets in memory for the file's stamp, current if None"""
+        stamp = stamp or self._stamp()
+        if stamp is not None:
+            with _indexes_lock:
+                _indexes[self.filename] = (stamp, offsets)
+
+    def _stamp(self) -> Optional[List[int]]:
+        """Stamp of file as stored in the index"""
+        current = stamp(self.filename)
+        return list(current) if current is not None else None
+
+    def _save_index(self, offsets: Offsets, stamp: List[int]) -> None:
+        """Save the index sidecar for the file at stamp, log on failure
+
+        Not saved if the file changed since stamp was taken, as the offsets
+        may not match it.
+        """
+        if self._stamp() != stamp:
+            logger.debug("%s changed while indexing, index not saved", self.filename)
+            return
+        try:
+            atomic_write(
+                self.index_name,
+                json.dumps({"stamp": stamp, "keys": offsets}),
+            )
+        except OSError as err:
+            logger.warning("Cannot save index for %s: %s", self.filename, err)
+
+    def _scan(self) -> Offsets:
+        """Walk top-level of the file for byte offsets of each value. Can raise"""
+        with open(self.filename, "rb") as input_file:
+            raw = input_file.read()
+        text = raw.decode("UTF-8")
+        decoder = json.JSONDecoder()
+        offsets: Offsets = {}
+        # Track char to byte position as we go, identical unless non-ASCII
+        char_pos, byte_pos = 0, 0
+
+        def to_byte(idx: int) -> int:
+            nonlocal char_pos, byte_pos
+            byte_pos += len(text[char_pos:idx].encode("UTF-8"))
+            char_pos = idx
+            return byte_pos
+
+        idx = _skip(text, 0)
+        if not text.startswith("{", idx):
+            raise ValueError("Expected a JSON object")
+        idx = _skip(text, idx + 1)
+        while not text.startswith("}", idx):
+            key, idx = decoder.raw_decode(text, idx)
+            idx = _skip(text, idx)
+            if not text.startswith(":", idx):
+                raise ValueError(f"Expected ':' at {idx}")
+            start = _skip(text, idx + 1)
+            _, end = decoder.raw_decode(text, start)
+            offsets[key] = (to_byte(start), to_byte(end))
+            idx = _skip(text, end)
+            if text.startswith(",", idx):
+                idx = _skip(text, idx + 1)
+            elif not text.startswith("}", idx):
+                raise ValueError(f"Expected ',' or '}}' at {idx}")
+        return offsets
+
+
+def _skip(text: str, idx: int) -> int:
+    """Return index of next non-whitespace character"""
+    match = WHITESPACE.match(text, idx)
+    return match.end() if match else idx
+
+
+class ShardedJsonStore:
+    """Config as a directory with one JSON file per top-level key"""
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.path = pathlib.Path(filename)
+        self.staged: Dict[str, Any] = {}
+
+    def _shard(self, key: str) -> pathlib.Path:
+        """File holding a key, key is quoted to be filename safe"""
+        return self.path / f"{quote(key, safe='')}.json"
+
+    def keys(self) -> List[str]:
+        """List keys found in storage"""
+        if not self.path.is_dir():
+            return []
+        return [unquote(shard.stem) for shard in self.path.glob("*.json")]
+
+    def load_key(self, key: str) -> Any:
+        """Load the value of one key, None if not found"""
+        try:
+            with open(self._shard(key), "r", encoding="UTF-8") as input_file:
+                return json.loads(input_file.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, json.decoder.JSONDecodeError) as err:
+            logger.error(".load() Failed loading '%s' from %s: %s", key, self.path, err)
+            return None
+
+    def load_all(self) -> Dict[str, Any]:
+        """Load all keys, empty if not found or invalid"""
+        if not self.path.is_dir():
+            logger.error(".load() Configuration directory not found at %s", self.path)
+            return {}
+        return {key: self.load_key(key) for key in self.keys()}
+
+    def put_key(self, key: str, value: Any) -> None:
+        """Stage key to be written on flush"""
+        self.staged[key] = value
+
+    def delete_key(self, key: str) -> None:
+        """Stage key to be deleted on flush"""
+        self.staged[key] = _DELETE
+
+    def flush(self) -> bool:
+        """Write only the staged keys, each to its own file"""
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            for key, value in self.staged.items():
+                if value is _DELETE:
+                    if self._shard(key).exists():
+                        self._shard(key).unlink()
+                else:
+                    atomic_write(str(self._shard(key)), dumps(value))
+        except OSError as err:
+            logger.error(".save() Cannot save config shards to %s: %s", self.path, err)
+            return False
+        self.staged = {}
+        return True
+
+
+class SqliteStore:
+    """Config as a SQLite table of top-level key and JSON value"""
+
+    TABLE = "config"
+    DELETE = "DELETE FROM config WHERE key = ?"
+    UPSERT = "INSERT OR REPLACE INTO config VALUES (?, ?)"
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.staged: Dict[str, Any] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open database, creating the table if needed"""
+        connection = sqlite3.connect(self.filename)
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        return connection
+
+    def _select(self, where: str = "", *args: str) -> Optional[List[Any]]:
+        """Run a select of key, value rows. None on error or missing database"""
+        if not os.path.isfile(self.filename):
+            logger.error(
+                ".load() Configuration database not found at %s", self.filename
+            )
+            return None
+        try:
+            connection = self._connect()
+            try:
+                return connection.execute(
+                    f"SELECT key, value FROM {self.TABLE} {where}", args  # nosec
+                ).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as err:
+            logger.error(".load() Failed reading %s: %s", self.filename, err)
+            return None
+
+    def keys(self) -> List[str]:
+        """List keys found in storage"""
+        return [key for key, _ in self._select() or []]
+
+    def load_key(self, key: str) -> Any:
+        """Load the value of one key, None if not found"""
+        rows = self._select("WHERE key = ?", key)
+        return json.loads(rows[0][1]) if rows else None
+
+    def load_all(self) -> Dict[str, Any]:
+        """Load all keys, empty if not found or invalid"""
+        return {key: json.loads(value) for key, value in self._select() or []}
+
+    def put_key(self, key: str, value: Any) -> None:
+        """Stage key to be written on flush"""
+        self.staged[key] = value
+
+    def delete_key(self, key: str) -> None:
+        """Stage key to be deleted on flush"""
+        self.staged[key] = _DELETE
+
+    def flush(self) -> bool:
+        """Write staged keys in one transaction"""
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    for key, value in self.staged.items():
+                        if value is _DELETE:
+                            connection.execute(self.DELETE, (key,))
+                        else:
+                            connection.execute(self.UPSERT, (key, json.dumps(value)))
+            finally:
+                connection.close()
+        except sqlite3.Error as err:
+            logger.error(".save() Cannot save config to %s: %s", self.filename, err)
+            return False
+        self.staged = {}
+        return True
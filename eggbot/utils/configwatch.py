@@ -0,0 +1,239 @@
+"""
+Reload config files when they change on disk
+
+A watched file is checked by its modified time, size, and inode. When any
+changes the file is loaded off the event loop and compared to the last load
+by top-level key (a guild, for most configs). Subscribers are called with the
+new config and only the keys that were added, removed, or changed, so caches
+can be dropped for those guilds alone.
+
+With `inotify_simple` installed on Linux, changes are picked up as they are
+written. Otherwise, and as a fallback, files are polled every `interval`.
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import AbstractSet
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from eggbot.utils.configstore import stamp
+
+try:
+    from inotify_simple import flags
+    from inotify_simple import INotify
+
+    HAS_INOTIFY = True
+except ImportError:  # pragma: no cover
+    HAS_INOTIFY = False
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[str], Mapping[str, Any]]
+# Called with the new config and the top-level keys that changed, can be async
+Subscriber = Callable[[Mapping[str, Any], AbstractSet[str]], Any]
+Stamp = Optional[Tuple[int, int, int]]
+
+POLL_INTERVAL: float = 2.0
+
+
+def digest(config: Mapping[str, Any]) -> Dict[str, bytes]:
+    """Hash of each top-level value by key, to diff without keeping a copy"""
+    return {
+        key: hashlib.blake2b(
+            json.dumps(value, sort_keys=True, default=str).encode("UTF-8"),
+            digest_size=16,
+        ).digest()
+        for key, value in config.items()
+    }
+
+
+def diff(old: Mapping[str, bytes], new: Mapping[str, bytes]) -> Set[str]:
+    """Keys added, removed, or changed between two digests"""
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class Watch(NamedTuple):
+    """State of a watched file"""
+
+    loader: Loader
+    subscribers: List[Subscriber]
+    stamp: Stamp
+    digest: Dict[str, bytes]
+
+
+class ConfigWatcher:
+    """Watch config files and notify subscribers of changed keys"""
+
+    def __init__(self, interval: float = POLL_INTERVAL) -> None:
+        self.interval = interval
+        self.watches: Dict[str, Watch] = {}
+        self._task: Optional["asyncio.Future[None]"] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._inotify: Optional[Any] = None
+        self._watched_dirs: Set[str] = set()
+
+    @property
+    def running(self) -> bool:
+        """True if the watch loop is running"""
+        return self._task is not None and not self._task.done()
+
+    def subscribe(
+        self,
+        filename: str,
+        subscriber: Subscriber,
+        loader: Loader,
+        config: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        """Call subscriber when the file changes, as loaded by loader
+
+        Give the config as currently loaded so the first change is diffed
+        against it. Otherwise the file is read now to diff against.
+        """
+        filename = os.path.abspath(filename)
+        watch = self.watches.get(filename)
+        if watch is not None:
+            watch.subscribers.append(subscriber)
+            return
+        current = stamp(filename)
+        if config is None:
+            try:
+                config = loader(filename) if current is not None else {}
+            except (OSError, ValueError) as err:
+                logger.warning("Cannot load %s to watch: %s", filename, err)
+                config = {}
+        self.watches[filename] = Watch(loader, [subscriber], current, digest(config))
+        self._watch_dir(filename)
+
+    def unsubscribe(self, filename: str, subscriber: Subscriber) -> None:
+        """Stop calling subscriber, stop watching file without subscribers"""
+        filename = os.path.abspath(filename)
+        watch = self.watches.get(filename)
+        if watch is None or subscriber not in watch.subscribers:
+            return
+        watch.subscribers.remove(subscriber)
+        if not watch.subscribers:
+            del self.watches[filename]
+
+    def start(self) -> None:
+        """Start the watch loop on the running event loop, if not running"""
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        if HAS_INOTIFY:
+            self._start_inotify()
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self) -> None:
+        """Stop the watch loop"""
+        if self._inotify is not None:
+            asyncio.get_event_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+            self._watched_dirs = set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def check(self) -> Set[str]:
+        """Reload changed files and notify subscribers, returns files reloaded"""
+        loop = asyncio.get_running_loop()
+        reloaded: Set[str] = set()
+        for filename, watch in list(self.watches.items()):
+            current = await loop.run_in_executor(None, stamp, filename)
+            if current == watch.stamp:
+                continue
+            try:
+                config = await loop.run_in_executor(None, self._load, filename, watch)
+            except (OSError, ValueError) as err:
+                logger.error("Reload of %s failed, keeping current: %s", filename, err)
+                continue
+            if self.watches.get(filename) is not watch:
+                continue  # Unsubscribed while loading
+            new_digest = digest(config)
+            changed = diff(watch.digest, new_digest)
+            self.watches[filename] = watch._replace(stamp=current, digest=new_digest)
+            reloaded.add(filename)
+            if not changed:
+                continue
+            logger.info("Reloaded %s, %d keys changed", filename, len(changed))
+            for subscriber in list(watch.subscribers):
+                await self._notify(subscriber, config, changed)
+        return reloaded
+
+    @staticmethod
+    def _load(filename: str, watch: Watch) -> Mapping[str, Any]:
+        """Load a watched file, empty if removed. Can raise"""
+        if stamp(filename) is None:
+            return {}
+        return watch.loader(filename)
+
+    @staticmethod
+    async def _notify(
+        subscriber: Subscriber, config: Mapping[str, Any], changed: AbstractSet[str]
+    ) -> None:
+        """Call a subscriber, logging instead of raising on failure"""
+        try:
+            result = subscriber(config, frozenset(changed))
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Config subscriber %s failed", subscriber)
+
+    async def _run(self) -> None:
+        """Check files on each change event or interval, until stopped"""
+        wake = self._wake or asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            await self.check()
+
+    def _start_inotify(self) -> None:
+        """Wake the watch loop on writes to directories of watched files"""
+        try:
+            self._inotify = INotify()
+        except OSError as err:
+            logger.warning("inotify not available, polling for changes: %s", err)
+            return
+        asyncio.get_event_loop().add_reader(self._inotify.fd, self._on_inotify)
+        for filename in self.watches:
+            self._watch_dir(filename)
+
+    def _watch_dir(self, filename: str) -> None:
+        """Add an inotify watch to the directory of a file, once"""
+        directory = os.path.dirname(filename)
+        if self._inotify is None or directory in self._watched_dirs:
+            return
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+        try:
+            self._inotify.add_watch(directory, mask)
+        except OSError as err:
+            logger.warning("Cannot watch %s, polling: %s", directory, err)
+            return
+        self._watched_dirs.add(directory)
+
+    def _on_inotify(self) -> None:
+        """Drain inotify events, wake the watch loop"""
+        if self._inotify is None or self._wake is None:
+            return
+        if self._inotify.read(timeout=0):
+            self._wake.set()
+
+
+watcher = ConfigWatcher()
@@ -0,0 +1,75 @@
+"""
+HyperLogLog estimate of how many distinct integers were seen
+
+Memory is fixed at 2 ** precision bytes whatever the number of values. The
+relative standard error of an estimate is 1.04 / sqrt(2 ** precision), about
+0.81% at the default precision of 14 (16 KiB). Estimates are within twice
+that about 95% of the time. Small counts use linear counting and are close to
+exact.
+
+    authors = HyperLogLog()
+    for message in messages:
+        authors.add(message.author.id)
+    authors.count()
+
+Estimators of the same precision merge into the estimate of the union.
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import math
+
+DEFAULT_PRECISION = 14
+MASK_64 = 2 ** 64 - 1
+
+
+def mix64(value: int) -> int:
+    """Spread an integer over 64 bits (splitmix64 finalizer)"""
+    value = (value + 0x9E3779B97F4A7C15) & MASK_64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return value ^ (value >> 31)
+
+
+class HyperLogLog:
+    """Distinct count estimator over integers, such as Discord IDs"""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION) -> None:
+        """Precision from 7 to 18, registers used are 2 ** precision"""
+        if not 7 <= precision <= 18:
+            raise ValueError(f"Precision must be 7 to 18, got {precision}")
+        self.precision = precision
+        self.registers = bytearray(2 ** precision)
+
+    @property
+    def error_rate(self) -> float:
+        """Relative standard error of count()"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value: int) -> None:
+        """Count an integer"""
+        hashed = mix64(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Count the values of another estimator of the same precision"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge estimators of different precision")
+        self.registers = bytearray(
+            max(mine, theirs) for mine, theirs in zip(self.registers, other.registers)
+        )
+
+    def count(self) -> int:
+        """Estimated number of distinct integers added"""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -rank for rank in self.registers)
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * size and empty:
+            estimate = size * math.log(size / empty)
+        return round(estimate)
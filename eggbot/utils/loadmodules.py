@@ -0,0 +1,159 @@
+"""
+Load the modules in ./modules and run their event hooks
+
+A module is a `module_*.py` file with an `AUTO_LOAD` constant naming a class
+that takes the client. Each loaded class may have any of the hooks in EVENTS,
+async or not, and may register commands with `register_commands(router)`.
+
+Modules are called for an event each in their own task. A hook that runs past
+its timeout is cancelled and logged, without holding up the other modules on
+the same event. A class may set EVENT_TIMEOUT to change its own timeout,
+which applies to the commands it registers under its class name too.
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import asyncio
+import importlib
+import inspect
+import logging
+from typing import Any
+from typing import Callable
+from typing import Coroutine
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+
+from discord import Client
+
+from eggbot.utils.commandrouter import CommandRouter
+from eggbot.utils.commandrouter import router as default_router
+from eggbot.utils.loadext import convert_to_module_path
+from eggbot.utils.loadext import get_files
+
+# Seconds a module may take on one event
+MODULE_TIMEOUT: float = 10.0
+# Client events and the module hook each is sent to. Messages that were not
+# commands are dispatched by EggbotCore as "plain_message". Every message,
+# from bots and commands too, goes to on_any_message
+EVENTS: Dict[str, str] = {
+    "on_ready": "on_ready",
+    "on_disconnect": "on_disconnect",
+    "on_member_join": "on_member_join",
+    "on_plain_message": "on_message",
+    "on_message": "on_any_message",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class ModuleClass(NamedTuple):
+    """Import path of a module and the name of its class to load"""
+
+    module_path: str
+    class_name: str
+
+
+def find_modules(modulespath: str) -> List[ModuleClass]:
+    """Identify all module_*.py files in path with an AUTO_LOAD class"""
+    found: List[ModuleClass] = []
+    for filepath in sorted(get_files(modulespath)):
+        if not filepath.name.startswith("module_"):
+            continue
+        module_path = convert_to_module_path(filepath)
+        importmod = importlib.import_module(module_path)
+        class_name = getattr(importmod, "AUTO_LOAD", None)
+        if not isinstance(class_name, str) or not inspect.isclass(
+            getattr(importmod, class_name, None)
+        ):
+            continue
+        found.append(ModuleClass(module_path, class_name))
+    return found
+
+
+class ModuleRunner:
+    """Loaded modules, called for client events with a timeout each"""
+
+    def __init__(
+        self,
+        client: Client,
+        router: CommandRouter = default_router,
+        timeout: float = MODULE_TIMEOUT,
+    ) -> None:
+        self.client = client
+        self.router = router
+        self.timeout = timeout
+        self.modules: Dict[str, Any] = {}
+
+    def load(self, module: ModuleClass) -> bool:
+        """Create a module with the client and register its commands"""
+        try:
+            importmod = importlib.import_module(module.module_path)
+            instance = getattr(importmod, module.class_name)(self.client)
+            if hasattr(instance, "register_commands"):
+                self.router.set_timeout(
+                    module.class_name, getattr(instance, "EVENT_TIMEOUT", self.timeout)
+                )
+                instance.register_commands(self.router)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception("Module %s failed to load: %s", module.class_name, err)
+            self.router.remove(module.class_name)
+            return False
+        self.modules[module.class_name] = instance
+        logger.info("Module loaded: %s", module.class_name)
+        return True
+
+    def load_all(self, modulespath: str) -> List[str]:
+        """Load every module found in path, returns the names loaded"""
+        return [
+            module.class_name
+            for module in find_modules(modulespath)
+            if self.load(module)
+        ]
+
+    def register(self, client: Client) -> None:
+        """Add a listener to the client for each event of EVENTS"""
+        for event, hook in EVENTS.items():
+            client.add_listener(self._listener(hook), event)
+
+    def _listener(self, hook: str) -> Callable[..., Coroutine[Any, Any, None]]:
+        """Coroutine calling hook of every module"""
+
+        async def listener(*args: Any) -> None:
+            await self.run(hook, *args)
+
+        return listener
+
+    async def run(self, hook: str, *args: Any) -> None:
+        """Call hook of every module that has it, each in its own task"""
+        tasks = [
+            asyncio.ensure_future(self._run_one(name, instance, hook, args))
+            for name, instance in self.modules.items()
+            if callable(getattr(instance, hook, None))
+        ]
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def _run_one(self, name: str, instance: Any, hook: str, args: Any) -> None:
+        """Call one hook, logging errors and cancelling it on timeout"""
+        timeout = getattr(instance, "EVENT_TIMEOUT", self.timeout)
+        try:
+            result = getattr(instance, hook)(*args)
+            if inspect.isawaitable(result):
+                await asyncio.wait_for(result, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s.%s timed out after %.1fs", name, hook, timeout)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception("%s.%s failed: %s", name, hook, err)
+
+    def close(self) -> None:
+        """Close modules that have close(), then forget them all"""
+        for name, instance in self.modules.items():
+            if callable(getattr(instance, "close", None)):
+                try:
+                    instance.close()
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.exception("%s failed to close: %s", name, err)
+            self.router.remove(name)
+        self.modules.clear()
@@ -0,0 +1,51 @@
+"""
+Discord snowflake IDs and the times they encode
+
+Every Discord ID carries the millisecond it was created in its top 42 bits,
+counted from the Discord epoch (2015-01-01). Times are read from IDs here
+without asking Discord, and IDs are made from times to bound history ranges.
+
+Datetimes are naive and in UTC, as discord.py returns them.
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+from datetime import datetime
+from datetime import timedelta
+from typing import Optional
+
+DISCORD_EPOCH = 1420070400000
+TIMESTAMP_SHIFT = 22
+MAX_SNOWFLAKE = 2 ** 64 - 1
+# Clock difference allowed between Discord and here
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+def snowflake_ms(snowflake: int) -> int:
+    """Unix time in milliseconds a snowflake was created"""
+    return (snowflake >> TIMESTAMP_SHIFT) + DISCORD_EPOCH
+
+
+def snowflake_time(snowflake: int) -> datetime:
+    """Time a snowflake was created, naive UTC"""
+    return datetime.utcfromtimestamp(snowflake_ms(snowflake) / 1000)
+
+
+def time_snowflake(when: datetime, high: bool = False) -> int:
+    """Lowest snowflake possible at a time, or highest if high
+
+    For the lowest ID after a time use high=True, for the highest ID before a
+    time use high=False.
+    """
+    millis = int((when - datetime(1970, 1, 1)).total_seconds() * 1000)
+    low = (millis - DISCORD_EPOCH) << TIMESTAMP_SHIFT
+    return low + (2 ** TIMESTAMP_SHIFT - 1) if high else low
+
+
+def is_snowflake(value: int, now: Optional[datetime] = None) -> bool:
+    """True if value could be a Discord ID: in range, and not in the future"""
+    if not 0 < value <= MAX_SNOWFLAKE:
+        return False
+    now = now or datetime.utcnow()
+    return snowflake_time(value) <= now + CLOCK_SKEW
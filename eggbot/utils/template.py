@@ -0,0 +1,65 @@
+"""
+Compiled message templates with [TAG] placeholders
+
+An engine knows a set of tags and how to resolve each from a context object,
+such as a Member. Messages are split once into literal text and placeholders,
+cached by message, and rendered in one pass. Only tags that appear in the
+message are resolved; text in brackets that is not a known tag is left as is.
+
+    engine = TemplateEngine({"[NAME]": attrgetter("name")})
+    engine.render("Welcome [NAME]!", member)
+
+Author  : Preocts
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/eggbot
+"""
+import re
+from functools import lru_cache
+from typing import Any
+from typing import Callable
+from typing import Mapping
+from typing import NamedTuple
+from typing import Tuple
+
+CACHE_SIZE = 256
+
+# Returns the value of a tag from the context rendered
+Resolver = Callable[[Any], Any]
+
+
+class Template(NamedTuple):
+    """Literal text around placeholders, one more literal than resolvers"""
+
+    literals: Tuple[str, ...]
+    resolvers: Tuple[Resolver, ...]
+
+    def render(self, context: Any) -> str:
+        """Fill placeholders from context"""
+        if not self.resolvers:
+            return self.literals[0]
+        parts = [self.literals[0]]
+        for resolver, literal in zip(self.resolvers, self.literals[1:]):
+            parts.append(str(resolver(context)))
+            parts.append(literal)
+        return "".join(parts)
+
+
+class TemplateEngine:
+    """Compile and render templates for a set of tags"""
+
+    def __init__(self, tags: Mapping[str, Resolver], cache_size: int = CACHE_SIZE):
+        self.tags = dict(tags)
+        pattern = "|".join(map(re.escape, sorted(self.tags, key=len, reverse=True)))
+        self._pattern = re.compile(f"({pattern})") if self.tags else None
+        self.compile = lru_cache(maxsize=cache_size)(self._compile)
+
+    def _compile(self, content: str) -> Template:
+        """Split content on tags, cached by content"""
+        if self._pattern is None:
+            return Template((content,), ())
+        parts = self._pattern.split(content)
+        return Template(tuple(parts[::2]), tuple(self.tags[tag] for tag in parts[1::2]))
+
+    def render(self, content: str, context: Any) -> str:
+        """Render content, compiling it on first use"""
+        return self.compile(content).render(context)
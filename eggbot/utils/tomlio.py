@@ -1,44 +1,123 @@
 """
 IO functions for TOML config files
 
+Parsed files are cached by path, modified time, and size so loading an
+unchanged file again costs a stat. Loaded configs are shared between callers
+so they are returned frozen: tables as read-only mappings and arrays as
+tuples. Use thaw() for a mutable copy.
+
 Author  : Preocts
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/eggbot
 """
 import logging
+import os
 import pathlib
+import sys
+import threading
+from types import MappingProxyType
 from typing import Any
 from typing import Dict
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
 
 import toml
 
+from eggbot.utils.configstore import atomic_write
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:  # pragma: no cover
+    tomllib = None
 
 logger = logging.getLogger("TOMLHandler")
 
+Stamp = Tuple[int, int]
+
+_cache: Dict[str, Tuple[Stamp, Mapping[str, Any]]] = {}
+_cache_lock = threading.Lock()
+
+
+def freeze(value: Any) -> Any:
+    """Return value with dicts as read-only mappings and lists as tuples"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Return a mutable copy of a frozen value, mappings as dicts and tuples
+    as lists"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
 
-def load(filepath: str) -> Dict[str, Any]:
-    """Load a TOML file"""
+def _stamp(filepath: str) -> Optional[Stamp]:
+    """Modified time and size of a file, None if not a file"""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
-    if not pathlib.Path(filepath).is_file():
+
+def _parse(content: str) -> Dict[str, Any]:
+    """Parse TOML, with tomllib when available. Raises ValueError if invalid"""
+    try:
+        if tomllib is not None:
+            return tomllib.loads(content)
+        return dict(toml.loads(content))
+    except (toml.TomlDecodeError, ValueError) as err:
+        raise ValueError("Expected TOML format") from err
+
+
+def clear_cache() -> None:
+    """Drop all parsed files from the cache"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def load(filepath: str) -> Mapping[str, Any]:
+    """Load a TOML file, frozen. Parses only if changed since last load"""
+    key = os.path.abspath(filepath)
+    stamp = _stamp(filepath)
+    if stamp is None or not pathlib.Path(filepath).is_file():
         raise FileNotFoundError(f"File not found: {filepath}")
 
-    with open(filepath, "r", encoding="utf-8") as infile:
-        try:
-            loaded = toml.load(infile)
-        except toml.TomlDecodeError as err:
-            raise ValueError("Expected TOML format") from err
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
 
-    return dict(loaded)
+    with open(filepath, "r", encoding="utf-8") as infile:
+        loaded = freeze(_parse(infile.read()))
+    with _cache_lock:
+        _cache[key] = (stamp, loaded)
+    return loaded
 
 
-def save(filepath: str, data: Dict[str, Any]) -> None:
-    """Save a TOML file"""
+def save(filepath: str, data: Mapping[str, Any]) -> None:
+    """Save a TOML file, replacing any existing file in one step"""
 
     if not pathlib.Path(filepath).parent.is_dir():
         raise FileNotFoundError(f"Path not found: {filepath}")
 
-    with open(filepath, "w", encoding="utf-8") as outfile:
-        try:
-            toml.dump(data, outfile)
-        except TypeError as err:
-            raise TypeError("Cannot format as TOML") from err
+    try:
+        content = toml.dumps(thaw(data))
+    except TypeError as err:
+        raise TypeError("Cannot format as TOML") from err
+
+    key = os.path.abspath(filepath)
+    with _cache_lock:
+        atomic_write(filepath, content)
+        stamp = _stamp(filepath)
+        if stamp is None:
+            _cache.pop(key, None)
+        else:
+            _cache[key] = (stamp, freeze(_parse(content)))
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Local index of message history for Audit
+
+Messages read by audits (ID, channel, author) are kept in a SQLite file next
+to the Audit config, with the author's latest names. For each channel the
+ranges of message IDs known to be complete are kept as coverage. An audit
+asks for the gaps in coverage over its range, reads only those from Discord,
+then counts from the index.
+
+Message IDs encode their creation time, so ranges of IDs are ranges of time.
+Coverage ranges are inclusive. Messages deleted after being indexed are still
+counted. Messages older than a retention window are pruned with their
+coverage, audits read those ranges from Discord again.
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+from typing import TypeVar
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS messages "
+    "(id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, author_id INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel_id, id)",
+    "CREATE TABLE IF NOT EXISTS authors "
+    "(id INTEGER PRIMARY KEY, name TEXT NOT NULL, display_name TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS coverage "
+    "(channel_id INTEGER NOT NULL, first INTEGER NOT NULL, last INTEGER NOT NULL, "
+    "PRIMARY KEY (channel_id, first))",
+)
+
+# Range of message IDs, inclusive
+IdRange = Tuple[int, int]
+T = TypeVar("T")
+
+
+class IndexedMessage(NamedTuple):
+    """Message as kept in the index, with its author's names"""
+
+    msg_id: int
+    author_id: int
+    name: str
+    display_name: str
+
+
+class AuthorCount(NamedTuple):
+    """Messages of one author in a range"""
+
+    author_id: int
+    name: str
+    display_name: str
+    messages: int
+    first_id: int
+    last_id: int
+
+
+class MessageIndex:
+    """SQLite index of messages and the ranges of history it covers"""
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, filename: str) -> None:
+        """Path and name of the index database, created if missing"""
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        with self._connection:
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            self._connection.close()
+
+    def _execute(self, sql: str, args: Iterable[Any] = ()) -> List[Any]:
+        """Run one statement in a transaction, returning rows"""
+        with self._lock, self._connection:
+            return self._connection.execute(sql, tuple(args)).fetchall()
+
+    def add_messages(self, channel_id: int, messages: Iterable[IndexedMessage]) -> int:
+        """Add messages of a channel, updating author names. Returns count"""
+        messages = list(messages)
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?)",
+                [(msg.msg_id, channel_id, msg.author_id) for msg in messages],
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO authors VALUES (?, ?, ?)",
+                [(msg.author_id, msg.name, msg.display_name) for msg in messages],
+            )
+        return len(messages)
+
+    def add_coverage(self, channel_id: int, first: int, last: int) -> None:
+        """Mark a range of a channel complete, merging touching ranges"""
+        if first > last:
+            return
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT first, last FROM coverage "
+                "WHERE channel_id = ? AND first <= ? AND last >= ?",
+                (channel_id, last + 1, first - 1),
+            ).fetchall()
+            for row_first, row_last in rows:
+                first, last = min(first, row_first), max(last, row_last)
+            self._connection.execute(
+                "DELETE FROM coverage "
+                "WHERE channel_id = ? AND first >= ? AND last <= ?",
+                (channel_id, first, last),
+            )
+            self._connection.execute(
+                "INSERT INTO coverage VALUES (?, ?, ?)", (channel_id, first, last)
+            )
+
+    def gaps(self, channel_id: int, first: int, last: int) -> List[IdRange]:
+        """Ranges within first to last not covered for a channel, in order"""
+        rows = self._execute(
+            "SELECT first, last FROM coverage "
+            "WHERE channel_id = ? AND first <= ? AND last >= ? ORDER BY first",
+            (channel_id, last, first),
+        )
+        gaps: List[IdRange] = []
+        start = first
+        for row_first, row_last in rows:
+            if row_first > start:
+                gaps.append((start, row_first - 1))
+            start = max(start, row_last + 1)
+        if start <= last:
+            gaps.append((start, last))
+        return gaps
+
+    def author_counts(
+        self, channel_id: int, first: int, last: int
+    ) -> List[AuthorCount]:
+        """Message count and first and last message ID by author in a range"""
+        rows = self._execute(
+            "SELECT m.author_id, a.name, a.display_name, COUNT(*), MIN(m.id), "
+            "MAX(m.id) FROM messages m JOIN authors a ON a.id = m.author_id "
+            "WHERE m.channel_id = ? AND m.id BETWEEN ? AND ? "
+            "GROUP BY m.author_id ORDER BY m.author_id",
+            (channel_id, first, last),
+        )
+        return [AuthorCount(*row) for row in rows]
+
+    def for_each_author(
+        self, channel_id: int, first: int, last: int, func: Callable[[int, int], Any]
+    ) -> None:
+        """Call func(author_id, messages) per author in a range, rows not kept"""
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT author_id, COUNT(*) FROM messages "
+                "WHERE channel_id = ? AND id BETWEEN ? AND ? GROUP BY author_id",
+                (channel_id, first, last),
+            )
+            for author_id, messages in cursor:
+                func(author_id, messages)
+
+    def prune(self, before: int) -> int:
+        """Drop messages and coverage with IDs before `before`. Returns count
+
+        Authors left without messages are dropped too.
+        """
+        with self._lock, self._connection:
+            pruned = self._connection.execute(
+                "DELETE FROM messages WHERE id < ?", (before,)
+            ).rowcount
+            self._connection.execute("DELETE FROM coverage WHERE last < ?", (before,))
+            self._connection.execute(
+                "UPDATE coverage SET first = ? WHERE first < ?", (before, before)
+            )
+            self._connection.execute(
+                "DELETE FROM authors WHERE id NOT IN "
+                "(SELECT DISTINCT author_id FROM messages)"
+            )
+        return pruned
+
+    @staticmethod
+    async def run(func: Callable[..., T], *args: Any) -> T:
+        """Call one of the methods above from the default executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Background audit jobs for Audit
+
+An audit command starts a job instead of running inline. Jobs are kept in a
+JSON sidecar next to the Audit config with their request, state, progress,
+and the last message ID read in each channel, so running jobs survive a
+restart and are resumed when the bot is ready again.
+
+With the message index on, resuming reads only what was not read before; the
+index records each batch as it is read. Without it a resumed job reads its
+range again.
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from eggbot.configfile import ConfigFile
+
+MODULE_NAME: str = "AuditJobs"
+MODULE_VERSION: str = "1.0.0"
+# Finished jobs kept for audit!status
+KEEP_FINISHED: int = 20
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# States audit!resume restarts, finished jobs are not run again
+RESUMABLE = (FAILED, CANCELLED)
+
+
+class AuditJob:
+    """Model of one audit job, a channel or whole guild over a range"""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        job_id: int,
+        guild_id: int,
+        reply_channel_id: int,
+        start_msg_id: int,
+        end_msg_id: Optional[int] = None,
+        channel_id: Optional[int] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Audit of channel_id, or every readable channel if None"""
+        self.job_id = job_id
+        self.guild_id = guild_id
+        self.reply_channel_id = reply_channel_id
+        self.start_msg_id = start_msg_id
+        self.end_msg_id = end_msg_id
+        self.channel_id = channel_id
+        self.status_msg_id: Optional[int] = kwargs.get("status_msg_id")
+        self.state: str = kwargs.get("state", RUNNING)
+        self.read: int = kwargs.get("read", 0)
+        self.checkpoints: Dict[str, int] = dict(kwargs.get("checkpoints", {}))
+        self.error: str = kwargs.get("error", "")
+        self.started: float = kwargs.get("started", time.time())
+
+    def checkpoint(self, channel_id: int, msg_id: int, read: int = 1) -> None:
+        """Record messages read in a channel, up to msg_id"""
+        self.read += read
+        self.checkpoints[str(channel_id)] = msg_id
+
+    def describe(self) -> str:
+        """One line of state and progress"""
+        target = f"<#{self.channel_id}>" if self.channel_id else "guild"
+        elapsed = int(time.time() - self.started)
+        line = f"Job {self.job_id} ({target}): {self.state}, {self.read} messages read"
+        if self.state == RUNNING:
+            line += f", {elapsed}s"
+        return f"{line}, {self.error}" if self.error else line
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converts values to dict for use in JSON"""
+        return {
+            "job_id": self.job_id,
+            "guild_id": self.guild_id,
+            "reply_channel_id": self.reply_channel_id,
+            "start_msg_id": self.start_msg_id,
+            "end_msg_id": self.end_msg_id,
+            "channel_id": self.channel_id,
+            "status_msg_id": self.status_msg_id,
+            "state": self.state,
+            "read": self.read,
+            "checkpoints": dict(self.checkpoints),
+            "error": self.error,
+            "started": self.started,
+        }
+
+
+class JobRegistry:
+    """Audit jobs by ID, saved to a JSON sidecar"""
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, filename: str) -> None:
+        """Load jobs from file, need not exist yet"""
+        self.config = ConfigFile()
+        self.config.load(filename)
+        if not self.config.config:
+            self.config.create("module", MODULE_NAME)
+            self.config.create("version", MODULE_VERSION)
+        self.jobs: Dict[int, AuditJob] = {}
+        for key in self.config.config:
+            if key.isdigit():
+                job = AuditJob(**self.config.read(key))
+                self.jobs[job.job_id] = job
+
+    def create(self, **kwargs: Any) -> AuditJob:
+        """Add a running job with the next ID"""
+        job = AuditJob(max(self.jobs, default=0) + 1, **kwargs)
+        self.jobs[job.job_id] = job
+        self.update(job)
+        self._prune()
+        return job
+
+    def get(self, job_id: Optional[int]) -> Optional[AuditJob]:
+        """Job by ID, None if not found"""
+        return self.jobs.get(job_id) if job_id is not None else None
+
+    def running(self) -> List[AuditJob]:
+        """Jobs not finished, oldest first"""
+        return [job for _, job in sorted(self.jobs.items()) if job.state == RUNNING]
+
+    def update(self, job: AuditJob) -> None:
+        """Stage the current values of a job to be saved"""
+        key = str(job.job_id)
+        if key in self.config:
+            self.config.update(key, job.to_dict())
+        else:
+            self.config.create(key, job.to_dict())
+
+    async def save(self) -> bool:
+        """Save changed jobs without blocking the event loop"""
+        return await self.config.save_async()
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs past KEEP_FINISHED"""
+        finished = sorted(
+            job_id for job_id, job in self.jobs.items() if job.state != RUNNING
+        )
+        for job_id in finished[: max(0, len(finished) - KEEP_FINISHED)]:
+            del self.jobs[job_id]
+            self.config.delete(str(job_id))
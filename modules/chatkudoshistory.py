@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Time bucketed score history for ChatKudos leaderboards
+
+Every change in score is recorded into a daily bucket per user. Rolling
+totals for each window (week, month) are kept in memory and adjusted as
+buckets fall out of the window, so a board never rescans the raw history.
+Daily buckets older than the longest window are folded into monthly buckets,
+and monthly buckets are dropped after a fixed retention. The all-time board
+continues to use the lifetime scores of the guild.
+
+Stored within the guild config as:
+    "history": {
+        "daily": {"<epoch day>": {"<user id>": <delta>}},
+        "monthly": {"<YYYY-MM>": {"<user id>": <delta>}}
+    }
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+import logging
+import time
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+DAY_SECONDS: int = 86_400
+DAILY_RETENTION: int = 30
+MONTHLY_RETENTION: int = 24
+WINDOWS: Dict[str, int] = {
+    "week": 7,
+    "month": 30,
+}
+
+
+def epoch_day(timestamp: Optional[float] = None) -> int:
+    """Return the number of whole days since epoch (UTC)"""
+    return int((time.time() if timestamp is None else timestamp) // DAY_SECONDS)
+
+
+def month_label(day: int) -> str:
+    """Return the YYYY-MM label the given epoch day falls within"""
+    return datetime.fromtimestamp(day * DAY_SECONDS, tz=timezone.utc).strftime("%Y-%m")
+
+
+class KudosHistory:
+    """Daily score buckets with rolling window totals for one guild"""
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        history: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None,
+        today: Optional[int] = None,
+    ) -> None:
+        """Build from the stored history segment, computing window totals once"""
+        history = history if history is not None else {}
+        self.daily: Dict[str, Dict[str, int]] = history.get("daily", {})
+        self.monthly: Dict[str, Dict[str, int]] = history.get("monthly", {})
+        self.as_of: int = epoch_day() if today is None else today
+        self.totals: Dict[str, Dict[str, int]] = {name: {} for name in WINDOWS}
+
+        self._downsample()
+        for key, bucket in self.daily.items():
+            for name, length in WINDOWS.items():
+                if int(key) > self.as_of - length:
+                    self._add_bucket(self.totals[name], bucket, 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the history segment for storing in config"""
+        return {"daily": self.daily, "monthly": self.monthly}
+
+    def record(self, user_id: str, amount: int, today: Optional[int] = None) -> None:
+        """Record a change in score into today's bucket and all windows"""
+        self.advance(epoch_day() if today is None else today)
+        bucket = self.daily.setdefault(str(self.as_of), {})
+        bucket[user_id] = bucket.get(user_id, 0) + amount
+        for totals in self.totals.values():
+            self._add_bucket(totals, {user_id: amount}, 1)
+
+    def window(self, name: str, today: Optional[int] = None) -> Dict[str, int]:
+        """Return rolling totals by user id for a named window"""
+        self.advance(epoch_day() if today is None else today)
+        return dict(self.totals[name])
+
+    def advance(self, today: int) -> None:
+        """Expire buckets that have left each window since last call"""
+        if today <= self.as_of:
+            return
+        for name, length in WINDOWS.items():
+            for key, bucket in self.daily.items():
+                if self.as_of - length < int(key) <= today - length:
+                    self._add_bucket(self.totals[name], bucket, -1)
+        self.as_of = today
+        self._downsample()
+
+    def _downsample(self) -> None:
+        """Fold expired daily buckets into monthly, drop monthly past retention"""
+        cutoff = self.as_of - DAILY_RETENTION
+        for key in [key for key in self.daily if int(key) <= cutoff]:
+            monthly = self.monthly.setdefault(month_label(int(key)), {})
+            self._add_bucket(monthly, self.daily.pop(key), 1)
+            self.logger.debug("Downsampled daily bucket '%s'", key)
+
+        for key in sorted(self.monthly)[:-MONTHLY_RETENTION]:
+            del self.monthly[key]
+
+    @staticmethod
+    def _add_bucket(totals: Dict[str, int], bucket: Dict[str, int], sign: int) -> None:
+        """Add (or subtract) bucket into totals, removing zeroed users"""
+        for user_id, amount in bucket.items():
+            total = totals.get(user_id, 0) + amount * sign
+            if total:
+                totals[user_id] = total
+            else:
+                totals.pop(user_id, None)
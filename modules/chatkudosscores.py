@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Compact score tables for ChatKudos
+
+Scores are held in two parallel arrays, unsigned 64-bit user IDs and signed
+64-bit scores, kept sorted by user ID. This costs 16 bytes per scored user
+instead of a str key, int value, and dict slot for each. The table behaves as
+a MutableMapping of str user IDs to int scores so it can be used in place of
+the `Dict[str, int]` it replaces.
+
+Tables are saved to a binary sidecar file next to the JSON config:
+    header : b"EGGKUDOS", uint32 format version, uint32 guild count
+    guild  : uint64 guild ID, uint64 count, count * uint64 IDs, count * int64 scores
+All values are little-endian.
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from functools import partial
+from typing import AbstractSet
+from typing import BinaryIO
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import MutableMapping
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from eggbot.configfile import ConfigFile
+from eggbot.utils.configstore import atomic_write
+from eggbot.utils.configstore import file_lock
+
+MAGIC: bytes = b"EGGKUDOS"
+FORMAT_VERSION: int = 1
+HEADER = struct.Struct("<8sII")
+GUILD_HEADER = struct.Struct("<QQ")
+BATCH_SIZE: int = 10_000
+MERGE_MODES: Dict[str, Callable[[int, int], int]] = {
+    "replace": lambda current, new: new,
+    "add": lambda current, new: current + new,
+    "max": max,
+}
+
+
+def read_array(in_file: BinaryIO, typecode: str, count: int) -> "array[int]":
+    """Read `count` little-endian 64-bit values from an open binary file"""
+    values = array(typecode)
+    values.fromfile(in_file, count)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+class ScoreTable(MutableMapping[str, int]):
+    """Mapping of user ID to score backed by sorted parallel arrays"""
+
+    __slots__ = ("ids", "scores")
+
+    def __init__(self, values: Optional[Mapping[str, int]] = None) -> None:
+        """Build from an existing mapping of user ID to score, if given"""
+        self.ids = array("Q")
+        self.scores = array("q")
+        values = values or {}
+        for user_id in sorted(values, key=int):
+            self.ids.append(int(user_id))
+            self.scores.append(int(values[user_id]))
+
+    def __repr__(self) -> str:
+        return f"ScoreTable({dict(self)})"
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(user_id) for user_id in self.ids)
+
+    def __getitem__(self, key: str) -> int:
+        idx = self._find(key)
+        if idx is None:
+            raise KeyError(key)
+        return self.scores[idx]
+
+    def __setitem__(self, key: str, value: int) -> None:
+        user_id = self._to_id(key)
+        if user_id is None:
+            raise ValueError(
+                f"User ID must be an unsigned 64-bit integer, given '{key}'"
+            )
+        idx = bisect_left(self.ids, user_id)
+        if idx < len(self.ids) and self.ids[idx] == user_id:
+            self.scores[idx] = value
+        else:
+            self.ids.insert(idx, user_id)
+            self.scores.insert(idx, value)
+
+    def __delitem__(self, key: str) -> None:
+        idx = self._find(key)
+        if idx is None:
+            raise KeyError(key)
+        del self.ids[idx]
+        del self.scores[idx]
+
+    def copy(self) -> ScoreTable:
+        """Return a copy of the table, arrays are copied as a block"""
+        table = ScoreTable()
+        table.ids = array("Q", self.ids)
+        table.scores = array("q", self.scores)
+        return table
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the backing arrays"""
+        return (len(self.ids) + len(self.scores)) * 8
+
+    def merge(self, rows: Iterable[Tuple[str, int]], mode: str = "replace") -> int:
+        """Apply a batch of (user ID, score) rows by merge mode, returns new users
+
+        Existing users are updated in place. New users are inserted in a single
+        pass over the arrays so a large batch does not shift them per user.
+
+        Modes:
+            replace: incoming score overwrites the current score
+            add: incoming score is added to the current score
+            max: the larger of the current and incoming score is kept
+        """
+        combine = MERGE_MODES[mode]
+        pending: Dict[int, int] = {}
+        for key, value in rows:
+            user_id = self._to_id(key)
+            if user_id is None:
+                raise ValueError(f"User ID must be an unsigned 64-bit integer: '{key}'")
+            idx = self._find(key)
+            if idx is not None:
+                self.scores[idx] = combine(self.scores[idx], value)
+            elif user_id in pending:
+                pending[user_id] = combine(pending[user_id], value)
+            else:
+                pending[user_id] = value
+
+        if pending:
+            ids, scores, start = array("Q"), array("q"), 0
+            for user_id in sorted(pending):
+                idx = bisect_left(self.ids, user_id, start)
+                ids.extend(self.ids[start:idx])
+                scores.extend(self.scores[start:idx])
+                ids.append(user_id)
+                scores.append(pending[user_id])
+                start = idx
+            ids.extend(self.ids[start:])
+            scores.extend(self.scores[start:])
+            self.ids, self.scores = ids, scores
+        return len(pending)
+
+    def _find(self, key: str) -> Optional[int]:
+        """Return index of key in arrays, None if not found"""
+        user_id = self._to_id(key)
+        if user_id is None:
+            return None
+        idx = bisect_left(self.ids, user_id)
+        if idx < len(self.ids) and self.ids[idx] == user_id:
+            return idx
+        return None
+
+    @staticmethod
+    def _to_id(key: str) -> Optional[int]:
+        """Convert a str user ID to int, None if not a valid ID"""
+        try:
+            user_id = int(key)
+        except (TypeError, ValueError):
+            return None
+        return user_id if 0 <= user_id < 2 ** 64 else None
+
+    def write(self, out_file: BinaryIO) -> None:
+        """Write arrays to an open binary file as little-endian"""
+        ids, scores = self.ids, self.scores
+        if sys.byteorder != "little":
+            ids, scores = array("Q", ids), array("q", scores)
+            ids.byteswap()
+            scores.byteswap()
+        ids.tofile(out_file)
+        scores.tofile(out_file)
+
+    @classmethod
+    def read(cls, in_file: BinaryIO, count: int) -> ScoreTable:
+        """Read `count` entries from an open binary file, as written by write()"""
+        table = cls()
+        table.ids = read_array(in_file, "Q", count)
+        table.scores = read_array(in_file, "q", count)
+        return table
+
+
+class ScoreFile:
+    """Input and output layer for the binary score sidecar file"""
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, filename: str) -> None:
+        """Path and name of the sidecar file, need not exist yet"""
+        self.filename = filename
+        # Guild IDs with score changes not yet given to save_async
+        self.changed: Set[str] = set()
+
+    def load(self) -> Dict[str, ScoreTable]:
+        """Load all tables by guild ID, empty if file is missing or invalid"""
+        tables: Dict[str, ScoreTable] = {}
+        try:
+            with open(self.filename, "rb") as in_file:
+                magic, version, guilds = HEADER.unpack(in_file.read(HEADER.size))
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    raise ValueError(f"Unknown format: {magic!r} v{version}")
+                for _ in range(guilds):
+                    guild_id, count = GUILD_HEADER.unpack(
+                        in_file.read(GUILD_HEADER.size)
+                    )
+                    tables[str(guild_id)] = ScoreTable.read(in_file, count)
+        except FileNotFoundError:
+            self.logger.debug("No score file at %s", self.filename)
+        except (struct.error, EOFError, ValueError) as err:
+            self.logger.error(".load() Score file formatted incorrectly: %s", err)
+            tables = {}
+        except OSError as err:
+            self.logger.error(".load() Something failed loading scores: %s", err)
+            tables = {}
+        return tables
+
+    def iter_scores(
+        self,
+        guild_id: Optional[str] = None,
+        batch_size: int = BATCH_SIZE,
+    ) -> Iterator[Tuple[str, str, int]]:
+        """Stream (guild ID, user ID, score) from file in bounded memory
+
+        Only `batch_size` entries are held at a time. Other guilds are skipped
+        without being read when `guild_id` is given.
+        """
+        with open(self.filename, "rb") as in_file:
+            magic, version, guilds = HEADER.unpack(in_file.read(HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"Unknown format: {magic!r} v{version}")
+            for _ in range(guilds):
+                table_id, count = GUILD_HEADER.unpack(in_file.read(GUILD_HEADER.size))
+                ids_at = in_file.tell()
+                next_at = ids_at + count * 16
+                if guild_id is not None and str(table_id) != guild_id:
+                    in_file.seek(next_at)
+                    continue
+                for offset in range(0, count, batch_size):
+                    size = min(batch_size, count - offset)
+                    in_file.seek(ids_at + offset * 8)
+                    ids = read_array(in_file, "Q", size)
+                    in_file.seek(ids_at + (count + offset) * 8)
+                    scores = read_array(in_file, "q", size)
+                    for user_id, score in zip(ids, scores):
+                        yield str(table_id), str(user_id), score
+                in_file.seek(next_at)
+
+    def save(self, tables: Mapping[str, ScoreTable]) -> bool:
+        """Save all non-empty tables, overwrites existing file with no prompt
+
+        The file is replaced whole under the config lock, a failed write leaves
+        the last saved file as it was.
+        """
+        saving = {key: table for key, table in tables.items() if table}
+        content = io.BytesIO()
+        content.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(saving)))
+        for guild_id, table in saving.items():
+            content.write(GUILD_HEADER.pack(int(guild_id), len(table)))
+            table.write(content)
+        try:
+            with file_lock(self.filename):
+                atomic_write(self.filename, content.getvalue())
+        except OSError as err:
+            self.logger.error(".save() Cannot save scores: %s", err)
+            return False
+        return True
+
+    def save_changed(
+        self, tables: Mapping[str, ScoreTable], changed: AbstractSet[str]
+    ) -> bool:
+        """Save the tables of changed guilds, copying other guilds from the file
+
+        Changed guilds without a table in tables are removed.
+        """
+        saving = {key: tables[key] for key in changed if key in tables}
+        saving = {key: table for key, table in saving.items() if table}
+        try:
+            with file_lock(self.filename):
+                kept = self._blocks(skip=changed)
+                content = io.BytesIO()
+                content.write(
+                    HEADER.pack(MAGIC, FORMAT_VERSION, len(kept) + len(saving))
+                )
+                for block in kept:
+                    content.write(block)
+                for guild_id, table in saving.items():
+                    content.write(GUILD_HEADER.pack(int(guild_id), len(table)))
+                    table.write(content)
+                atomic_write(self.filename, content.getvalue())
+        except OSError as err:
+            self.logger.error(".save() Cannot save scores: %s", err)
+            return False
+        return True
+
+    def _blocks(self, skip: AbstractSet[str]) -> List[bytes]:
+        """Guilds of the file as saved, header and arrays, except those in skip
+
+        Empty if the file is missing or invalid, as `load()` reads it.
+        """
+        if not os.path.isfile(self.filename) or not os.path.getsize(self.filename):
+            return []
+        blocks: List[bytes] = []
+        try:
+            with open(self.filename, "rb") as in_file:
+                magic, version, guilds = HEADER.unpack(in_file.read(HEADER.size))
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    raise ValueError(f"Unknown format: {magic!r} v{version}")
+                for _ in range(guilds):
+                    head = in_file.read(GUILD_HEADER.size)
+                    table_id, count = GUILD_HEADER.unpack(head)
+                    if str(table_id) in skip:
+                        in_file.seek(count * 16, io.SEEK_CUR)
+                        continue
+                    body = in_file.read(count * 16)
+                    if len(body) != count * 16:
+                        raise EOFError(f"Guild {table_id} cut short")
+                    blocks.append(head + body)
+        except (struct.error, EOFError, ValueError) as err:
+            self.logger.error(".save() Score file formatted incorrectly: %s", err)
+            return []
+        return blocks
+
+    async def save_async(self, tables: Mapping[str, ScoreTable]) -> bool:
+        """Save the tables of guilds in `changed` from the config writer thread
+
+        Saves coalesce as config saves do, one write of the file is in flight.
+        Tables are copied as the write starts, only for guilds changed by then,
+        and other guilds are copied from the file. Guilds taken are changed
+        again if the write fails.
+        """
+        taken: Set[str] = set()
+
+        def prepare() -> Callable[[], bool]:
+            taken.update(self.changed)
+            self.changed = set()
+            if not taken:
+                return lambda: True
+            snapshot = {key: tables[key].copy() for key in taken if key in tables}
+            return partial(self.save_changed, snapshot, frozenset(taken))
+
+        saved = await ConfigFile.configClient.write_async(self.filename, prepare)
+        if not saved:
+            self.changed |= taken
+        return saved
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Bulk import and export of ChatKudos scores
+
+Streams scores of one guild, or all guilds, between the ChatKudos score
+sidecar and CSV or JSON Lines files. Exports read the sidecar in batches and
+never hold more than one batch of rows. Imports read the input in batches and
+merge each batch into the score tables by the chosen mode (replace, add, max).
+
+Guilds whose scores have not yet been moved from the JSON config into the
+sidecar are read from the JSON config.
+
+Stop the bot before importing; a running bot will overwrite the sidecar with
+its own scores on the next save.
+
+Row format:
+    CSV  : guild_id,user_id,score (with header)
+    JSONL: {"guild_id": "111", "user_id": "222", "score": 5}
+
+IDs must be Discord IDs and scores whole numbers. An import stops at the
+first invalid row, naming its line, and saves nothing.
+
+Usage:
+    $ python -m modules.chatkudostransfer export scores.csv (--guild ID)
+    $ python -m modules.chatkudostransfer import scores.jsonl --mode add
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+from typing import Any
+from typing import Dict
+from typing import IO
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from eggbot.configfile import ConfigFile
+from eggbot.utils.snowflake import MAX_SNOWFLAKE
+from modules.chatkudosscores import BATCH_SIZE
+from modules.chatkudosscores import MERGE_MODES
+from modules.chatkudosscores import ScoreFile
+from modules.chatkudosscores import ScoreTable
+from modules.module_chatkudos import DEFAULT_CONFIG
+
+FIELDS: List[str] = ["guild_id", "user_id", "score"]
+FORMATS: List[str] = ["csv", "jsonl"]
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[str, str, int]
+
+
+def get_format(filename: str, file_format: Optional[str] = None) -> str:
+    """Return given format, or format by file extension. Defaults to csv"""
+    if file_format:
+        return file_format
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def scorefile_for(config_file: str) -> ScoreFile:
+    """Return the score sidecar used by ChatKudos for the given config"""
+    return ScoreFile(os.path.splitext(config_file)[0] + ".scores")
+
+
+def iter_config_scores(config_file: str, skip: Set[str]) -> Iterator[Row]:
+    """Yield rows of scores still stored in the JSON config"""
+    config = ConfigFile(config_file)
+    config.load()
+    for guild_id, guild_conf in config.config.items():
+        if guild_id in skip or not isinstance(guild_conf, dict):
+            continue
+        for user_id, score in guild_conf.get("scores", {}).items():
+            yield guild_id, user_id, int(score)
+
+
+def iter_export(config_file: str, guild_id: Optional[str] = None) -> Iterator[Row]:
+    """Yield all score rows, or only rows for one guild"""
+    scorefile = scorefile_for(config_file)
+    seen: Set[str] = set()
+    if os.path.isfile(scorefile.filename):
+        for row in scorefile.iter_scores(guild_id):
+            seen.add(row[0])
+            yield row
+    for row in iter_config_scores(config_file, seen):
+        if guild_id is None or row[0] == guild_id:
+            yield row
+
+
+def write_rows(rows: Iterator[Row], out_file: IO[str], file_format: str) -> int:
+    """Write rows to an open text file, returns count of rows written"""
+    count = 0
+    if file_format == "csv":
+        writer = csv.writer(out_file)
+        writer.writerow(FIELDS)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+    else:
+        for count, row in enumerate(rows, 1):
+            out_file.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+    return count
+
+
+def parse_row(guild_id: Any, user_id: Any, score: Any, line: int) -> Row:
+    """Row with IDs and score checked, ValueError naming the line if invalid"""
+    try:
+        ids = [int(str(value)) for value in (guild_id, user_id)]
+        if not all(0 < id_ <= MAX_SNOWFLAKE for id_ in ids):
+            raise ValueError("ID out of range")
+        return str(ids[0]), str(ids[1]), int(score)
+    except (TypeError, ValueError) as err:
+        raise ValueError(
+            f"Line {line}: invalid row ({guild_id!r}, {user_id!r}, {score!r}), {err}"
+        ) from err
+
+
+def read_rows(in_file: IO[str], file_format: str) -> Iterator[Row]:
+    """Read rows from an open text file, ValueError at the first invalid row"""
+    if file_format == "csv":
+        reader = csv.DictReader(in_file)
+        for record in reader:
+            yield parse_row(
+                record.get("guild_id"),
+                record.get("user_id"),
+                record.get("score"),
+                reader.line_num,
+            )
+    else:
+        for line_num, line in enumerate(in_file, 1):
+            if not line.strip():
+                continue
+            try:
+                values = json.loads(line)
+            except ValueError as err:
+                raise ValueError(f"Line {line_num}: not JSON, {err}") from err
+            if not isinstance(values, dict):
+                raise ValueError(f"Line {line_num}: not a JSON object")
+            yield parse_row(
+                values.get("guild_id"),
+                values.get("user_id"),
+                values.get("score"),
+                line_num,
+            )
+
+
+def import_rows(
+    rows: Iterator[Row],
+    config_file: str,
+    mode: str = "replace",
+    guild_id: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Merge rows into the score sidecar in batches, returns rows applied"""
+    scorefile = scorefile_for(config_file)
+    tables = scorefile.load()
+    legacy: Dict[str, Dict[str, int]] = {}
+    for guild, user_id, score in iter_config_scores(config_file, set(tables)):
+        legacy.setdefault(guild, {})[user_id] = score
+
+    count = 0
+    rows = (row for row in rows if guild_id is None or row[0] == guild_id)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        batch.sort(key=lambda row: row[0])
+        for guild, guild_rows in itertools.groupby(batch, key=lambda row: row[0]):
+            if guild not in tables:
+                tables[guild] = ScoreTable(legacy.pop(guild, None))
+            tables[guild].merge(((row[1], row[2]) for row in guild_rows), mode)
+        count += len(batch)
+        logger.debug("Imported %d rows", count)
+
+    if not scorefile.save(tables):
+        raise OSError(f"Unable to save scores to {scorefile.filename}")
+    return count
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Import or export ChatKudos scores")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("filename", help="CSV or JSON Lines file, '-' for stdio")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="ChatKudos config")
+    parser.add_argument("--guild", default=None, help="Limit to one guild ID")
+    parser.add_argument("--format", choices=FORMATS, default=None)
+    parser.add_argument("--mode", choices=list(MERGE_MODES), default="replace")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    opts = parser.parse_args(args)
+    logging.basicConfig(level="INFO")
+
+    file_format = get_format(opts.filename, opts.format)
+    stdio = opts.filename == "-"
+
+    if opts.action == "export":
+        out_file = (
+            sys.stdout
+            if stdio
+            else open(opts.filename, "w", encoding="utf-8", newline="")
+        )
+        try:
+            count = write_rows(
+                iter_export(opts.config, opts.guild), out_file, file_format
+            )
+        finally:
+            if not stdio:
+                out_file.close()
+        logger.info("Exported %d scores", count)
+        return 0
+
+    in_file = (
+        sys.stdin if stdio else open(opts.filename, "r", encoding="utf-8", newline="")
+    )
+    try:
+        rows = read_rows(in_file, file_format)
+        count = import_rows(rows, opts.config, opts.mode, opts.guild, opts.batch)
+    except ValueError as err:
+        logger.error("Nothing imported from %s: %s", opts.filename, err)
+        return 1
+    finally:
+        if not stdio:
+            in_file.close()
+    logger.info("Imported %d scores with mode '%s'", count, opts.mode)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
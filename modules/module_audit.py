@@ -7,39 +7,72 @@ Author  : Preocts <preocts@preocts.com>
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/Egg_Bot
 """
+import asyncio
+import csv
 import logging
 import os
+import tempfile
 from datetime import datetime
+from datetime import timedelta
 from typing import Any
 from typing import Coroutine
 from typing import Dict
+from typing import Iterable
 from typing import List
-from typing import MutableSet
 from typing import NamedTuple
 from typing import Optional
 
 from discord import Client
+from discord import File
 from discord import Guild
 from discord import Message
+from discord import Object
 from discord import TextChannel
 from discord.errors import Forbidden
 from discord.errors import HTTPException
 from discord.errors import NotFound
 
 from eggbot.configfile import ConfigFile
+from eggbot.utils.commandrouter import CommandRouter
+from eggbot.utils.hyperloglog import HyperLogLog
+from eggbot.utils.snowflake import is_snowflake
+from eggbot.utils.snowflake import snowflake_time
+from eggbot.utils.snowflake import time_snowflake
+from modules import auditjobs
+from modules.auditindex import AuthorCount
+from modules.auditindex import IndexedMessage
+from modules.auditindex import MessageIndex
+from modules.auditjobs import AuditJob
+from modules.auditjobs import JobRegistry
 
 AUTO_LOAD: str = "Audit"
+CSV_HEADER = (
+    "author_id",
+    "name",
+    "display_name",
+    "messages",
+    "first_seen",
+    "last_seen",
+)
 
 
 class AuditResults(NamedTuple):
-    """Data class for audit results"""
+    """Data class for audit results, counts are by author ID"""
 
     counter: int
     channel: str
     channel_id: int
-    authors: MutableSet[str]
+    counts: Dict[int, AuthorCount]
     start: datetime
     end: Optional[datetime] = None
+    # Unique authors estimated in place of counts, see approximate-authors
+    estimate: Optional[HyperLogLog] = None
+
+    def unique_authors(self) -> int:
+        """Number of unique authors, estimated if counts were not kept"""
+        if self.estimate is not None:
+            return self.estimate.count()
+        return len(self.counts)
 
 
 # Protocols
@@ -57,16 +90,55 @@ class Audit:
     COMMAND_CONFIG: Dict[str, str] = {
         "audit!here": "audit_here",
         "audit!channel": "audit_channel",
+        "audit!guild": "audit_guild",
+        "audit!status": "show_status",
+        "audit!cancel": "cancel_job",
+        "audit!resume": "resume_job",
         "audit!help": "print_help",
     }
+    # Channels audited at once by audit!guild, and seconds between starts
+    GUILD_CONCURRENCY: int = 5
+    GUILD_PACE: float = 0.5
+    RETRIES: int = 3
+    RETRY_DELAY: float = 2.0
+    # Messages read from history before writing them to the index
+    INDEX_BATCH: int = 500
+    # Days of messages kept in the index, 0 keeps all, and time between prunes
+    INDEX_RETENTION_DAYS: int = 90
+    PRUNE_INTERVAL: timedelta = timedelta(hours=1)
+    # Seconds between progress edits and saves of a running job
+    PROGRESS_INTERVAL: float = 15.0
 
     def __init__(self, client: Client, config_file: str = DEFAULT_CONFIG) -> None:
         """Create instance and load configuration file"""
         self.logger.info("Initializing Audit module")
+        self.client = client
         self.owner = os.getenv("BOT_OWNER", "")
         self.config = ConfigFile()
         self.config.load(config_file)
         self.allow_list: List[str] = self.config.config.get("allow-list", [])
+        # Fetch start and end messages to confirm they exist before an audit
+        self.verify: bool = bool(self.config.config.get("verify-messages", False))
+        self.concurrency = int(
+            self.config.config.get("guild-concurrency", self.GUILD_CONCURRENCY)
+        )
+        self.pace = float(self.config.config.get("guild-pace", self.GUILD_PACE))
+        # Only estimate the number of unique authors, in fixed memory
+        self.approximate = bool(self.config.config.get("approximate-authors", False))
+        # Keep audited messages in a local index, read only gaps from Discord
+        self.index: Optional[MessageIndex] = None
+        if self.config.config.get("index-messages", False):
+            index_file = os.path.splitext(config_file)[0] + ".index"
+            self.index = MessageIndex(index_file)
+        self.retention = int(
+            self.config.config.get("index-retention-days", self.INDEX_RETENTION_DAYS)
+        )
+        self._pruned_at: Optional[datetime] = None
+        # Index messages as they are sent, last message ID seen by channel
+        self.index_live = bool(self.config.config.get("index-live", False))
+        self._live_last: Dict[int, int] = {}
+        self.jobs = JobRegistry(os.path.splitext(config_file)[0] + ".jobs.json")
+        self._tasks: Dict[int, "asyncio.Future[None]"] = {}
         if not self.config.config:
             self.config.create("module", self.MODULE_NAME)
             self.config.create("version", self.MODULE_VERSION)
@@ -80,13 +152,19 @@ class Audit:
             "will include all messages since start message ID.\n\n",
             "`audit!channel [Channel ID] [Start Message ID] (End Message ID)`\n",
             "Will run the audit on the given channel ID and post result in ",
-            "current channel. Channel ID must be in the same guild.",
+            "current channel. Channel ID must be in the same guild.\n\n",
+            "`audit!guild [Start Message ID] (End Message ID)`\n",
+            "Will run the audit on every text channel the bot can read, over ",
+            "the time range of the message IDs, and post the combined result.\n\n",
+            "Audits run in the background and post progress as they go.\n",
+            "`audit!status` lists jobs, `audit!cancel [Job ID]` stops one, ",
+            "and `audit!resume [Job ID]` restarts a failed or cancelled job.",
         ]
 
         await message.channel.send("".join(help_msg))
 
-    async def audit_channel(self, message: Message) -> Optional[AuditResults]:
-        """Run audit against given channel, return output or None"""
+    async def audit_channel(self, message: Message) -> Optional[AuditJob]:
+        """Start audit of given channel, return job or None"""
         channel_id = self.pull_msg_arg(message.content, 1)
         start_msg_id = self.pull_msg_arg(message.content, 2)
         end_msg_id = self.pull_msg_arg(message.content, 3)
@@ -99,35 +177,306 @@ class Audit:
         if channel is None:
             return None
 
-        return await self.run_audit(channel, start_msg_id, end_msg_id)
+        return await self.start_job(message, start_msg_id, end_msg_id, channel.id)
+
+    async def audit_here(self, message: Message) -> Optional[AuditJob]:
+        """Start audit of current channel, return job or None"""
+        start_msg_id = self.pull_msg_arg(message.content, 1)
+        end_msg_id = self.pull_msg_arg(message.content, 2)
+
+        if start_msg_id is None:
+            return None
+
+        return await self.start_job(
+            message, start_msg_id, end_msg_id, message.channel.id
+        )
 
-    async def audit_here(self, message: Message) -> Optional[AuditResults]:
-        """Run audit in current channel, return output or None"""
+    async def audit_guild(self, message: Message) -> Optional[AuditJob]:
+        """Start audit of all readable text channels, return job or None"""
         start_msg_id = self.pull_msg_arg(message.content, 1)
         end_msg_id = self.pull_msg_arg(message.content, 2)
 
         if start_msg_id is None:
             return None
 
-        return await self.run_audit(message.channel, start_msg_id, end_msg_id)
+        return await self.start_job(message, start_msg_id, end_msg_id)
+
+    async def show_status(self, message: Message) -> None:
+        """Post state and progress of the jobs of this guild"""
+        lines = [
+            job.describe()
+            for job in self.jobs.jobs.values()
+            if job.guild_id == message.guild.id
+        ]
+        await message.channel.send("\n".join(lines) or "No audit jobs.")
+
+    async def cancel_job(self, message: Message) -> None:
+        """Cancel a running job of this guild"""
+        job = self.jobs.get(self.pull_msg_arg(message.content, 1))
+        task = self._tasks.get(job.job_id) if job else None
+        if job is None or task is None or job.guild_id != message.guild.id:
+            await message.channel.send("No running audit job with that ID.")
+            return
+        task.cancel()
+        job.state = auditjobs.CANCELLED
+        self.jobs.update(job)
+        await self.jobs.save()
+        await message.channel.send(f"Cancelling audit job {job.job_id}.")
+
+    async def resume_job(self, message: Message) -> None:
+        """Restart a failed or cancelled job of this guild"""
+        job = self.jobs.get(self.pull_msg_arg(message.content, 1))
+        if job is None or job.guild_id != message.guild.id:
+            await message.channel.send("No audit job with that ID.")
+            return
+        if job.job_id in self._tasks:
+            await message.channel.send(f"Audit job {job.job_id} is running.")
+            return
+        if job.state not in auditjobs.RESUMABLE:
+            await message.channel.send(
+                f"Audit job {job.job_id} is {job.state}, "
+                "only failed or cancelled jobs can resume."
+            )
+            return
+        job.state, job.error = auditjobs.RUNNING, ""
+        self.jobs.update(job)
+        self._start(job)
+        await message.channel.send(f"Resuming audit job {job.job_id}.")
+
+    async def start_job(
+        self,
+        message: Message,
+        start_msg_id: int,
+        end_msg_id: Optional[int],
+        channel_id: Optional[int] = None,
+    ) -> Optional[AuditJob]:
+        """Create and start a job auditing a channel, or the guild if None"""
+        if not self._valid_range(start_msg_id, end_msg_id):
+            return None
+        job = self.jobs.create(
+            guild_id=message.guild.id,
+            reply_channel_id=message.channel.id,
+            start_msg_id=start_msg_id,
+            end_msg_id=end_msg_id,
+            channel_id=channel_id,
+        )
+        status = await message.channel.send(f"Audit job {job.job_id} started.")
+        job.status_msg_id = status.id
+        self.jobs.update(job)
+        await self.jobs.save()
+        self._start(job)
+        return job
+
+    def close(self) -> None:
+        """Close the message index"""
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    async def on_ready(self) -> None:
+        """Resume jobs left running when the bot stopped, prune the index"""
+        for job in self.jobs.running():
+            if job.job_id not in self._tasks:
+                self.logger.info("Resuming audit job %d", job.job_id)
+                self._start(job)
+        await self.prune_index()
+
+    async def prune_index(self, now: Optional[datetime] = None) -> int:
+        """Drop indexed messages past retention, at most once per PRUNE_INTERVAL"""
+        now = now or datetime.utcnow()
+        if self.index is None or self.retention <= 0:
+            return 0
+        if self._pruned_at is not None and now - self._pruned_at < self.PRUNE_INTERVAL:
+            return 0
+        self._pruned_at = now
+        before = time_snowflake(now - timedelta(days=self.retention))
+        pruned = await self.index.run(self.index.prune, before)
+        if pruned:
+            self.logger.info("Pruned %d messages from the index", pruned)
+        return pruned
+
+    def _start(self, job: AuditJob) -> None:
+        """Run a job in the background"""
+        task = asyncio.ensure_future(self._run_job(job))
+        self._tasks[job.job_id] = task
+
+        def forget(_: "asyncio.Future[None]") -> None:
+            if self._tasks.get(job.job_id) is task:
+                del self._tasks[job.job_id]
+
+        task.add_done_callback(forget)
+
+    async def _run_job(self, job: AuditJob) -> None:
+        """Run a job to the end, reporting progress and the result"""
+        reply = self.client.get_channel(job.reply_channel_id)
+        progress = asyncio.ensure_future(self._report_progress(job, reply))
+        result: Optional[AuditResults] = None
+        try:
+            result = await self._audit_job(job)
+            job.state = auditjobs.DONE if result is not None else auditjobs.FAILED
+            if result is None and not job.error:
+                job.error = "No messages could be read"
+        except asyncio.CancelledError:
+            job.state = auditjobs.CANCELLED
+            raise
+        except HTTPException as err:
+            job.state, job.error = auditjobs.FAILED, str(err)
+        except Exception as err:  # pylint: disable=broad-except
+            self.logger.exception("Audit job %d failed", job.job_id)
+            job.state, job.error = auditjobs.FAILED, str(err)
+        finally:
+            progress.cancel()
+            self.jobs.update(job)
+            await self._edit_status(job, reply)
+            await self.jobs.save()
+        if result is not None and reply is not None:
+            await self.send_results(reply, result)
+
+    async def _audit_job(self, job: AuditJob) -> Optional[AuditResults]:
+        """Audit the target of a job, retrying errors from the last checkpoint"""
+        for attempt in range(self.RETRIES):
+            try:
+                if job.channel_id is None:
+                    guild = self.client.get_guild(job.guild_id)
+                    if guild is None:
+                        job.error = "Guild not found"
+                        return None
+                    channels = self._get_readable_channels(guild)
+                    return await self.run_guild_audit(
+                        guild, channels, job.start_msg_id, job.end_msg_id, job
+                    )
+                channel = self.client.get_channel(job.channel_id)
+                if channel is None:
+                    job.error = "Channel not found"
+                    return None
+                return await self.run_audit(
+                    channel, job.start_msg_id, job.end_msg_id, job
+                )
+            except Forbidden:
+                raise
+            except HTTPException as err:
+                if attempt + 1 >= self.RETRIES:
+                    raise
+                self.logger.warning("Audit job %d failed: %s", job.job_id, err)
+                await asyncio.sleep(self.RETRY_DELAY * 2 ** attempt)
+        return None
+
+    async def _report_progress(
+        self, job: AuditJob, reply: Optional[TextChannel]
+    ) -> None:
+        """Edit the status message and save the job every PROGRESS_INTERVAL"""
+        while True:
+            await asyncio.sleep(self.PROGRESS_INTERVAL)
+            self.jobs.update(job)
+            await self._edit_status(job, reply)
+            await self.jobs.save()
+
+    async def _edit_status(self, job: AuditJob, reply: Optional[TextChannel]) -> None:
+        """Show the progress of a job in its status message"""
+        if reply is None or job.status_msg_id is None:
+            return
+        try:
+            await reply.get_partial_message(job.status_msg_id).edit(
+                content=job.describe()
+            )
+        except HTTPException as err:
+            self.logger.warning("Cannot edit status of job %d: %s", job.job_id, err)
+
+    async def run_guild_audit(
+        self,
+        guild: Guild,
+        channels: Iterable[TextChannel],
+        start_msg_id: int,
+        end_msg_id: Optional[int],
+        job: Optional[AuditJob] = None,
+    ) -> Optional[AuditResults]:
+        """Audit channels concurrently and merge results into one for the guild
+
+        At most `concurrency` channels are read at once and channel audits
+        start at least `pace` seconds apart. Channels that cannot be read are
+        left out of the result.
+        """
+        if not self._valid_range(start_msg_id, end_msg_id):
+            return None
+
+        limit = asyncio.Semaphore(max(1, self.concurrency))
+        starting = asyncio.Lock()
+
+        async def audit(channel: TextChannel) -> Optional[AuditResults]:
+            async with limit:
+                async with starting:
+                    await asyncio.sleep(self.pace)
+                return await self._get_auditresults_retry(
+                    channel, start_msg_id, end_msg_id, job
+                )
+
+        results = await asyncio.gather(*(audit(channel) for channel in channels))
+        audited = [result for result in results if result is not None]
+        self.logger.info(
+            "Guild audit of %s read %d of %d channels",
+            guild.name,
+            len(audited),
+            len(results),
+        )
+        return self.merge_results(guild, audited, start_msg_id, end_msg_id)
+
+    @staticmethod
+    def merge_results(
+        guild: Guild,
+        results: Iterable[AuditResults],
+        start_msg_id: int,
+        end_msg_id: Optional[int],
+    ) -> AuditResults:
+        """Combine channel results into one result named for the guild"""
+        counter = 0
+        counts: Dict[int, AuthorCount] = {}
+        estimate: Optional[HyperLogLog] = None
+        for result in results:
+            counter += result.counter
+            for author in result.counts.values():
+                add_count(counts, author)
+            if result.estimate is not None:
+                estimate = estimate or HyperLogLog(result.estimate.precision)
+                estimate.merge(result.estimate)
+        return AuditResults(
+            counter=counter,
+            channel=guild.name,
+            channel_id=guild.id,
+            counts=counts,
+            start=snowflake_time(start_msg_id),
+            end=None if end_msg_id is None else snowflake_time(end_msg_id),
+            estimate=estimate,
+        )
 
     async def run_audit(
         self,
         channel: TextChannel,
         start_msg_id: int,
         end_msg_id: Optional[int],
+        job: Optional[AuditJob] = None,
     ) -> Optional[AuditResults]:
-        """Runs audit on given channel, starting point and ending point"""
-        start_time = await self._get_timestamp(channel, start_msg_id)
-        audit: Optional[AuditResults] = None
+        """Runs audit on given channel, starting point and ending point
+
+        Times are read from the message IDs, the messages need not exist
+        unless `verify` is set.
+        """
+        if not self._valid_range(start_msg_id, end_msg_id):
+            return None
+
+        if self.verify:
+            for msg_id in filter(None, (start_msg_id, end_msg_id)):
+                if await self._get_timestamp(channel, msg_id) is None:
+                    return None
 
-        if start_time and not end_msg_id:
-            audit = await self._get_auditresults(channel, start_time)
-        elif start_time and end_msg_id:
-            end_time = await self._get_timestamp(channel, end_msg_id)
-            audit = await self._get_auditresults(channel, start_time, end_time)
+        return await self._get_auditresults(channel, start_msg_id, end_msg_id, job)
 
-        return audit
+    def _valid_range(self, start_msg_id: int, end_msg_id: Optional[int]) -> bool:
+        """True if start and end, when given, are valid message IDs"""
+        msg_ids = [start_msg_id] if end_msg_id is None else [start_msg_id, end_msg_id]
+        if not all(is_snowflake(msg_id) for msg_id in msg_ids):
+            self.logger.error("Not a valid message ID: %s", msg_ids)
+            return False
+        return True
 
     def _get_text_channel(
         self,
@@ -137,6 +486,16 @@ class Audit:
         """Fetches text channel, if exists, from guild"""
         return guild.get_channel(channel_id)
 
+    @staticmethod
+    def _get_readable_channels(guild: Guild) -> List[TextChannel]:
+        """Text channels of guild whose history the bot can read"""
+        readable: List[TextChannel] = []
+        for channel in guild.text_channels:
+            permissions = channel.permissions_for(guild.me)
+            if permissions.read_messages and permissions.read_message_history:
+                readable.append(channel)
+        return readable
+
     async def _get_timestamp(
         self,
         channel: TextChannel,
@@ -151,67 +510,226 @@ class Audit:
 
         return msg if msg is None else msg.created_at
 
+    async def _get_auditresults_retry(
+        self,
+        channel: TextChannel,
+        start_msg_id: int,
+        end_msg_id: Optional[int] = None,
+        job: Optional[AuditJob] = None,
+    ) -> Optional[AuditResults]:
+        """Audit a channel, retrying with backoff on errors. None on failure"""
+        for attempt in range(self.RETRIES):
+            try:
+                return await self._get_auditresults(
+                    channel, start_msg_id, end_msg_id, job
+                )
+            except Forbidden as err:
+                self.logger.warning("Cannot audit %s: %s", channel.name, err)
+                return None
+            except HTTPException as err:
+                self.logger.warning("Audit of %s failed: %s", channel.name, err)
+                if attempt + 1 < self.RETRIES:
+                    await asyncio.sleep(self.RETRY_DELAY * 2 ** attempt)
+        return None
+
     async def _get_auditresults(
         self,
         channel: TextChannel,
-        start: datetime,
-        end: Optional[datetime] = None,
+        start_msg_id: int,
+        end_msg_id: Optional[int] = None,
+        job: Optional[AuditJob] = None,
     ) -> AuditResults:
-        """Returns AuditResults from starttime to current, or end if provided"""
+        """Returns AuditResults after start message to current, or end message
+
+        Progress is recorded in job, when given, as messages are read. Authors
+        are counted by ID, or only estimated when `approximate` is set.
+        """
         counter: int = 0
-        name_set: MutableSet[str] = set()
-        if end is None:
-            history_cor = channel.history(after=start)
-        else:
-            history_cor = channel.history(after=start, before=end)
+        counts: Dict[int, AuthorCount] = {}
+        estimate = HyperLogLog() if self.approximate else None
+        start = snowflake_time(start_msg_id)
+        end = None if end_msg_id is None else snowflake_time(end_msg_id)
+
+        if self.index is not None:
+            first = start_msg_id + 1
+            if end_msg_id is None:
+                last = time_snowflake(datetime.utcnow(), high=True)
+            else:
+                last = end_msg_id - 1
+            for gap in await self.index.run(self.index.gaps, channel.id, first, last):
+                await self._index_history(channel, *gap, job=job)
+            if estimate is not None:
+                add_author = estimate.add
+
+                def count(author_id: int, author_messages: int) -> None:
+                    nonlocal counter
+                    add_author(author_id)
+                    counter += author_messages
+
+                await self.index.run(
+                    self.index.for_each_author, channel.id, first, last, count
+                )
+            else:
+                for author in await self.index.run(
+                    self.index.author_counts, channel.id, first, last
+                ):
+                    counter += author.messages
+                    counts[author.author_id] = author
 
-        async for past_message in history_cor:
-            counter += 1
-            name_set.add(
-                f"{past_message.author.display_name},{past_message.author},{past_message.author.id}"  # noqa
-            )
+        else:
+            if end_msg_id is None:
+                history_cor = channel.history(limit=None, after=Object(start_msg_id))
+            else:
+                history_cor = channel.history(
+                    limit=None, after=Object(start_msg_id), before=Object(end_msg_id)
+                )
+
+            async for past_message in history_cor:
+                counter += 1
+                if job is not None:
+                    job.checkpoint(channel.id, past_message.id)
+                if estimate is not None:
+                    estimate.add(past_message.author.id)
+                    continue
+                indexed = self._indexed(past_message)
+                add_count(
+                    counts,
+                    AuthorCount(
+                        indexed.author_id,
+                        indexed.name,
+                        indexed.display_name,
+                        1,
+                        indexed.msg_id,
+                        indexed.msg_id,
+                    ),
+                )
 
         return AuditResults(
             counter=counter,
             channel=channel.name,
             channel_id=channel.id,
-            authors=name_set,
+            counts=counts,
             start=start,
             end=end,
+            estimate=estimate,
         )
 
-    async def on_message(self, message: Message) -> None:
-        """ON MESSAGE event hook"""
-        if str(message.channel.type) != "text":
-            self.logger.debug("Not text channel")
+    async def _index_history(
+        self,
+        channel: TextChannel,
+        first: int,
+        last: int,
+        job: Optional[AuditJob] = None,
+    ) -> None:
+        """Read a range of channel history into the index, oldest first
+
+        Coverage is recorded as each batch is written, so a failed read keeps
+        what was read before it.
+        """
+        if self.index is None:
             return
+        batch: List[IndexedMessage] = []
+        async for past_message in channel.history(
+            limit=None,
+            after=Object(first - 1),
+            before=Object(last + 1),
+            oldest_first=True,
+        ):
+            batch.append(self._indexed(past_message))
+            if len(batch) >= self.INDEX_BATCH:
+                await self.index.run(self.index.add_messages, channel.id, batch)
+                await self.index.run(
+                    self.index.add_coverage, channel.id, first, batch[-1].msg_id
+                )
+                if job is not None:
+                    job.checkpoint(channel.id, batch[-1].msg_id, len(batch))
+                batch = []
+        await self.index.run(self.index.add_messages, channel.id, batch)
+        if job is not None and batch:
+            job.checkpoint(channel.id, batch[-1].msg_id, len(batch))
+        await self.index.run(self.index.add_coverage, channel.id, first, last)
 
-        if str(message.author.id) not in self.allow_list:
-            self.logger.debug("Not the mama")
+    @staticmethod
+    def _indexed(message: Message) -> IndexedMessage:
+        """Index record of a message"""
+        author = message.author
+        return IndexedMessage(message.id, author.id, str(author), author.display_name)
+
+    async def _index_live(self, message: Message) -> None:
+        """Index a message as sent, covering the range since the last one seen"""
+        if self.index is None:
             return
+        channel_id = message.channel.id
+        await self.index.run(
+            self.index.add_messages, channel_id, [self._indexed(message)]
+        )
+        last_seen = self._live_last.get(channel_id)
+        if last_seen is not None:
+            await self.index.run(
+                self.index.add_coverage, channel_id, last_seen, message.id
+            )
+        self._live_last[channel_id] = message.id
 
-        if not message.content.startswith("audit!"):
-            self.logger.debug("Not the magic words")
-            return
+    async def on_disconnect(self) -> None:
+        """Messages may be missed while disconnected, restart live coverage"""
+        self._live_last.clear()
 
-        audit_result: Optional[AuditResults] = None
+    def register_commands(self, router: CommandRouter) -> None:
+        """Route audit! commands to this module"""
+        for command, attr in self.COMMAND_CONFIG.items():
+            router.add(command, getattr(self, attr), self.is_allowed, self.MODULE_NAME)
 
-        try:
-            command = getattr(self, self.COMMAND_CONFIG[message.content.split()[0]])
-            audit_result = await command(message)
+    def is_allowed(self, message: Message) -> bool:
+        """Commands are run from text channels by authors in the allow list"""
+        if str(message.channel.type) != "text":
+            self.logger.debug("Not text channel")
+            return False
+        if str(message.author.id) not in self.allow_list:
+            self.logger.debug("Not the mama")
+            return False
+        return True
 
-        except (KeyError, AttributeError):
-            pass
+    async def on_any_message(self, message: Message) -> None:
+        """Every message, bots and commands included, so live coverage is whole"""
+        if str(message.channel.type) != "text":
+            self.logger.debug("Not text channel")
+            return
 
-        if audit_result is not None:
+        if self.index_live:
+            await self._index_live(message)
+        await self.prune_index()
 
-            output_names = "\n".join(audit_result.authors)
-            output_top = f"Audit: {audit_result.channel} ({audit_result.channel_id})\n"
-            output_range = f"Start: {audit_result.start} - End: {audit_result.end}\n"
-            output_desc = f"Of {audit_result.counter} messages the unique names are:\n"
-            output_msg = f"{output_top}{output_range}{output_desc}```{output_names}```"
+    @staticmethod
+    def format_results(audit_result: AuditResults) -> str:
+        """Summary of the results of an audit, authors are in the CSV"""
+        output_top = f"Audit: {audit_result.channel} ({audit_result.channel_id})\n"
+        output_range = f"Start: {audit_result.start} - End: {audit_result.end}\n"
+        if audit_result.estimate is not None:
+            error = audit_result.estimate.error_rate
+            output_desc = (
+                f"Of {audit_result.counter} messages there are about "
+                f"{audit_result.unique_authors()} unique authors (±{error:.1%})."
+            )
+        else:
+            output_desc = (
+                f"Of {audit_result.counter} messages there are "
+                f"{audit_result.unique_authors()} unique authors, attached."
+            )
+        return f"{output_top}{output_range}{output_desc}"
 
-            await message.channel.send(output_msg)
+    async def send_results(self, channel: TextChannel, result: AuditResults) -> None:
+        """Post the summary of an audit with its authors attached as CSV"""
+        if result.estimate is not None:
+            await channel.send(self.format_results(result))
+            return
+        loop = asyncio.get_running_loop()
+        filename = await loop.run_in_executor(None, write_csv, result)
+        attachment = File(filename, filename=f"audit_{result.channel_id}.csv")
+        try:
+            await channel.send(self.format_results(result), file=attachment)
+        finally:
+            attachment.close()
+            os.remove(filename)
 
     @staticmethod
     def pull_msg_arg(msg: str, pos: int = 1) -> Optional[int]:
@@ -222,3 +740,41 @@ class Audit:
             except (ValueError, IndexError):
                 pass
         return None
+
+
+def add_count(counts: Dict[int, AuthorCount], author: AuthorCount) -> None:
+    """Add the messages of an author to counts, keeping the latest names"""
+    known = counts.get(author.author_id)
+    if known is None:
+        counts[author.author_id] = author
+        return
+    latest = author if author.last_id > known.last_id else known
+    counts[author.author_id] = latest._replace(
+        messages=known.messages + author.messages,
+        first_id=min(known.first_id, author.first_id),
+        last_id=max(known.last_id, author.last_id),
+    )
+
+
+def write_csv(result: AuditResults) -> str:
+    """Write the author counts of a result to a temporary CSV, returns its path
+
+    Rows are written one at a time; the caller removes the file when done.
+    """
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", newline="", suffix=".csv", delete=False
+    ) as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_HEADER)
+        for author in sorted(result.counts.values(), key=lambda a: -a.messages):
+            writer.writerow(
+                (
+                    author.author_id,
+                    author.name,
+                    author.display_name,
+                    author.messages,
+                    snowflake_time(author.first_id).isoformat(),
+                    snowflake_time(author.last_id).isoformat(),
+                )
+            )
+    return csv_file.name
@@ -15,22 +15,36 @@ Git Repo: https://github.com/Preocts/Egg_Bot
 from __future__ import annotations
 
 import logging
+import os
 import re
 import time
+from collections import OrderedDict
+from functools import partial
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import Mapping
+from typing import MutableMapping
 from typing import NamedTuple
 from typing import Optional
 
 from discord import Client
 from discord import Message
 
+from eggbot.configfile import CACHE_SIZE
 from eggbot.configfile import ConfigFile
+from eggbot.utils.commandrouter import CommandRouter
+from eggbot.utils.configmigrate import migrate
+from eggbot.utils.configmigrate import migration
+from eggbot.utils.template import TemplateEngine
+from modules.chatkudoshistory import KudosHistory
+from modules.chatkudoshistory import WINDOWS
+from modules.chatkudosscores import ScoreFile
+from modules.chatkudosscores import ScoreTable
 
 AUTO_LOAD: str = "ChatKudos"
 MODULE_NAME: str = "ChatKudos"
-MODULE_VERSION: str = "1.0.0"
+MODULE_VERSION: str = "1.1.0"
 DEFAULT_CONFIG: str = "configs/chatkudos.json"
 COMMAND_CONFIG: Dict[str, str] = {
     "kudos!max": "set_max",
@@ -53,7 +67,8 @@ class KudosConfig(NamedTuple):
     lock: bool = False
     gain_message: str = "[POINTS] to [NICKNAME]! That gives them [TOTAL] total!"
     loss_message: str = "[POINTS] from [NICKNAME]! That leaves them [TOTAL] total!"
-    scores: Dict[str, int] = {}
+    scores: MutableMapping[str, int] = {}
+    history: Dict[str, Any] = {}
 
     @classmethod
     def from_dict(cls, config: Dict[str, Any]) -> KudosConfig:
@@ -61,8 +76,26 @@ class KudosConfig(NamedTuple):
         return cls(**config)
 
     def as_dict(self) -> Dict[str, Any]:
-        """Returns NamedTuple as Dict"""
-        return self._asdict()  # pylint: disable=E1101
+        """Returns NamedTuple as Dict, scores are excluded as they save to sidecar"""
+        config = self._asdict()  # pylint: disable=E1101
+        del config["scores"]
+        return config
+
+
+@migration(MODULE_NAME, "1.0.0", "1.1.0")
+def complete_guild(guild_id: str, guild: Any) -> Optional[Dict[str, Any]]:
+    """Store every guild with all fields, unknown fields dropped
+
+    Scores still in the config are kept for the sidecar to take on next save.
+    """
+    # pylint: disable=unused-argument
+    if not isinstance(guild, dict):
+        return None
+    defaults = KudosConfig().as_dict()
+    complete = {key: guild.get(key, value) for key, value in defaults.items()}
+    if "scores" in guild:
+        complete["scores"] = guild["scores"]
+    return complete
 
 
 class Kudos(NamedTuple):
@@ -74,27 +107,83 @@ class Kudos(NamedTuple):
     current: int
 
 
+# Tags of gain and loss messages, rendered from a Kudos
+KUDOS_TEMPLATES = TemplateEngine(
+    {
+        "[POINTS]": lambda kudos: kudos.amount,
+        "[NAME]": lambda kudos: kudos.display_name,
+        "[NICKNAME]": lambda kudos: kudos.display_name,
+        "[TOTAL]": lambda kudos: kudos.current + kudos.amount,
+    }
+)
+
+
 class ChatKudos:
     """Kudos points brought to Discord"""
 
     logger = logging.getLogger(__name__)
 
     def __init__(self, client: Client, config_file: str = DEFAULT_CONFIG) -> None:
-        """Create instance and load configuration file"""
+        """Create instance and load configuration file with score sidecar"""
         self.logger.info("Initializing ChatKudos module")
-        self.config = ConfigFile()
+        self.config = ConfigFile(lazy=True)
         self.config.load(config_file)
+        self.scorefile = ScoreFile(os.path.splitext(config_file)[0] + ".scores")
+        self.scores: Dict[str, ScoreTable] = self.scorefile.load()
+        # Models built from config, least recently used dropped past cache_size
+        self.cache_size = CACHE_SIZE
+        self.history: "OrderedDict[str, KudosHistory]" = OrderedDict()
+        self.guilds: "OrderedDict[str, KudosConfig]" = OrderedDict()
         if not self.config.config:
             self.config.create("module", MODULE_NAME)
             self.config.create("version", MODULE_VERSION)
+        if not migrate(self.config, MODULE_NAME, MODULE_VERSION):
+            raise ValueError(f"Cannot migrate {config_file} to {MODULE_VERSION}")
 
     def get_guild(self, guild_id: str) -> KudosConfig:
-        """Load a guild from the config, return defaults if empty"""
+        """Load a guild from the config, return defaults if empty
+
+        Models are kept for the most recently used guilds and replaced by
+        save_guild(). Others are built again from the config.
+        """
         self.logger.debug("Get guild '%s'", guild_id)
+        if guild_id in self.guilds:
+            self.guilds.move_to_end(guild_id)
+            return self.guilds[guild_id]
         guild_conf = self.config.read(guild_id)
         if not guild_conf:
-            return KudosConfig()
-        return KudosConfig.from_dict(guild_conf)
+            return KudosConfig(scores=self.get_scores(guild_id))
+        guild = KudosConfig.from_dict(
+            {**guild_conf, "scores": self.get_scores(guild_id)}
+        )
+        self._keep(self.guilds, guild_id, guild)
+        return guild
+
+    def get_scores(self, guild_id: str) -> ScoreTable:
+        """Load the score table of a guild, converting scores found in config"""
+        if guild_id not in self.scores:
+            guild_conf = self.config.read(guild_id) or {}
+            self.scores[guild_id] = ScoreTable(guild_conf.get("scores"))
+        return self.scores[guild_id]
+
+    def get_history(self, guild_id: str) -> KudosHistory:
+        """Load the score history of a guild, kept for recently used guilds
+
+        Every change is saved to the guild config, which rebuilds dropped ones.
+        """
+        if guild_id in self.history:
+            self.history.move_to_end(guild_id)
+            return self.history[guild_id]
+        history = KudosHistory(self.get_guild(guild_id).history)
+        self._keep(self.history, guild_id, history)
+        return history
+
+    def _keep(self, cache: "OrderedDict[str, Any]", guild_id: str, model: Any) -> None:
+        """Keep a model as most recently used, drop the oldest past cache_size"""
+        cache[guild_id] = model
+        cache.move_to_end(guild_id)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
 
     def save_guild(self, guild_id: str, **kwargs: Any) -> None:
         """
@@ -107,10 +196,18 @@ class ChatKudos:
             lock: bool, restict to `roles`/`users` or open to all
             gain_message: str, message displayed on gain of points
             loss_message: str, message displayed on loss of points
-            scores: Dict[str, int], Discord user id paired with total Kudos
+            scores: Mapping[str, int], Discord user id paired with total Kudos
+            history: Dict[str, Any], time bucketed changes in scores
         """
         self.logger.debug("Save: %s, (%s)", guild_id, kwargs)
         guild_conf = self.get_guild(guild_id)
+        scores = kwargs.get("scores", guild_conf.scores)
+        if not isinstance(scores, ScoreTable):
+            scores = ScoreTable(scores)
+        self.scores[guild_id] = scores
+        # Scores still in config are dropped from it here, sidecar must save them
+        if "scores" in kwargs or "scores" in (self.config.read(guild_id) or {}):
+            self.scorefile.changed.add(guild_id)
         new_conf = KudosConfig(
             roles=kwargs.get("roles", guild_conf.roles),
             users=kwargs.get("users", guild_conf.users),
@@ -118,12 +215,14 @@ class ChatKudos:
             lock=kwargs.get("lock", guild_conf.lock),
             gain_message=kwargs.get("gain_message", guild_conf.gain_message),
             loss_message=kwargs.get("loss_message", guild_conf.loss_message),
-            scores=kwargs.get("scores", guild_conf.scores),
+            scores=scores,
+            history=kwargs.get("history", guild_conf.history),
         )
         if not self.config.read(guild_id):
             self.config.create(guild_id, new_conf.as_dict())
         else:
             self.config.update(guild_id, new_conf.as_dict())
+        self._keep(self.guilds, guild_id, new_conf)
 
     def set_max(self, message: Message) -> str:
         """Set max number of points to be gained in one line"""
@@ -209,23 +308,30 @@ class ChatKudos:
         )
 
     def generate_board(self, message: Message) -> str:
-        """Create scoreboard"""
+        """Create scoreboard, all-time or for a window of time (week, month)"""
         self.logger.debug("Scoreboard: %s", message.content)
+        args = message.content.replace("kudos!board", "").split()
+        window = args.pop(0) if args and args[0] in WINDOWS else ""
         try:
-            count = int(message.content.replace("kudos!board", ""))
+            count = int(" ".join(args))
         except ValueError:
             count = 10
-        guild_conf = self.get_guild(str(message.guild.id))
+        guild_id = str(message.guild.id)
+        scores: Mapping[str, int]
+        if window:
+            scores = self.get_history(guild_id).window(window)
+            title = f"Top {count} ChatKudos holders this {window}:"
+        else:
+            scores = self.get_guild(guild_id).scores
+            title = f"Top {count} ChatKudos holders:"
         # Make a list of keys (user IDs) sorted by their value (score) low to high
-        id_list = sorted(guild_conf.scores, key=lambda key: guild_conf.scores[key])
-        score_list: List[str] = [f"Top {count} ChatKudos holders:", "```"]
+        id_list = sorted(scores, key=lambda key: scores[key])
+        score_list: List[str] = [title, "```"]
         while count > 0 and id_list:
             user_id = id_list.pop()
             user = message.guild.get_member(int(user_id))
             display_name = user.display_name if user else user_id
-            score_list.append(
-                "{:>5} | {:<38}".format(guild_conf.scores[user_id], display_name)
-            )
+            score_list.append("{:>5} | {:<38}".format(scores[user_id], display_name))
             count -= 1
         score_list.append("```")
         return "\n".join(score_list)
@@ -273,10 +379,31 @@ class ChatKudos:
     def apply_kudos(self, guild_id: str, kudos_list: List[Kudos]) -> None:
         """Update scores in config"""
         scores = self.get_guild(guild_id).scores
+        history = self.get_history(guild_id)
         for kudos in kudos_list:
             scores[kudos.user_id] = scores.get(kudos.user_id, 0) + kudos.amount
+            history.record(kudos.user_id, kudos.amount)
 
-        self.save_guild(guild_id, scores=scores)
+        self.save_guild(guild_id, scores=scores, history=history.as_dict())
+
+    def save(self) -> bool:
+        """Save score sidecar then config if changed, False if either fails
+
+        Scores are written first as the config drops legacy scores. The config
+        is not saved when the scores fail to save.
+        """
+        if self.scorefile.changed:
+            if not self.scorefile.save(self.scores):
+                return False
+            self.scorefile.changed.clear()
+        return self.config.save()
+
+    async def save_async(self) -> bool:
+        """Save score sidecar then config if changed without blocking the event loop"""
+        if self.scorefile.changed:
+            if not await self.scorefile.save_async(self.scores):
+                return False
+        return await self.config.save_async()
 
     def parse_command(self, message: Message) -> str:
         """Process all commands prefixed with 'kudos!'"""
@@ -289,6 +416,27 @@ class ChatKudos:
             return ""
         return result
 
+    def register_commands(self, router: CommandRouter) -> None:
+        """Route kudos! commands to this module"""
+        for command, attr in COMMAND_CONFIG.items():
+            router.add(
+                command,
+                partial(self.on_command, attr),
+                self.is_command_message,
+                MODULE_NAME,
+            )
+
+    async def on_command(self, attr: str, message: Message) -> None:
+        """Run a routed command, send its response and save"""
+        response = getattr(self, attr)(message)
+        if response:
+            await message.channel.send(response)
+            await self.save_async()
+
+    def is_command_message(self, message: Message) -> bool:
+        """Commands are run from text channels by allowed authors"""
+        return str(message.channel.type) == "text" and self.is_command_allowed(message)
+
     def is_command_allowed(self, message: Message) -> bool:
         """Determine if author of message can run commands"""
         if str(message.author.id) == str(message.guild.owner.id):
@@ -320,20 +468,13 @@ class ChatKudos:
         tic = time.perf_counter()
         self.logger.debug("[START] onmessage - ChatKudos")
 
-        if message.content.startswith("kudos!") and self.is_command_allowed(message):
-            response = self.parse_command(message)
-            if response:
-                await message.channel.send(response)
-                self.config.save()
-            return
-
         if not (message.mentions and self.is_kudos_allowed(message)):
             return
 
         kudos_list = self.find_kudos(message)
         self.apply_kudos(str(message.guild.id), kudos_list)
         await self._announce_kudos(message, kudos_list)
-        self.config.save()
+        await self.save_async()
 
         toc = time.perf_counter()
         self.logger.debug("[FINISH] onmessage: %f ms", round(toc - tic, 2))
@@ -351,10 +492,4 @@ class ChatKudos:
     @staticmethod
     def _format_message(content: str, kudos: Kudos) -> str:
         """Apply metadata replacements"""
-        new_total = kudos.current + kudos.amount
-
-        formatted_msg = content.replace("[POINTS]", str(kudos.amount))
-        formatted_msg = formatted_msg.replace("[NAME]", kudos.display_name)
-        formatted_msg = formatted_msg.replace("[TOTAL]", str(new_total))
-
-        return formatted_msg
+        return KUDOS_TEMPLATES.render(content, kudos)
@@ -9,6 +9,7 @@ Git Repo: https://github.com/Preocts/Egg_Bot
 import logging
 import os
 import time
+from functools import partial
 from typing import Dict
 from typing import NamedTuple
 from typing import Optional
@@ -18,6 +19,8 @@ from discord import Message
 from discord import TextChannel
 from discord import User
 
+from eggbot.utils.commandrouter import CommandRouter
+
 AUTO_LOAD: str = "EchoBox"
 
 
@@ -61,7 +64,7 @@ class EchoBox:
             return
 
         try:
-            self.owner = self.client.client.get_user(int(self.owner_id))
+            self.owner = self.client.get_user(int(self.owner_id))
         except ValueError:
             self.owner_id = ""
 
@@ -104,6 +107,32 @@ class EchoBox:
             self.logger.error("Attribute not defined for command: %s", command)
         return responses
 
+    def register_commands(self, router: CommandRouter) -> None:
+        """Route echo! commands to this module"""
+        for command, attr in self.COMMAND_CONFIG.items():
+            router.add(
+                command,
+                partial(self.on_command, attr),
+                self.is_owner_dm,
+                self.MODULE_NAME,
+            )
+
+    def is_owner_dm(self, message: Message) -> bool:
+        """Commands are run by the owner in a DM to the bot"""
+        return (
+            str(message.channel.type) == "private"
+            and bool(self.owner_id)
+            and str(message.author.id) == self.owner_id
+        )
+
+    async def on_command(self, attr: str, msg: Message) -> None:
+        """Run a routed command, sending its results"""
+        self.__populate_owner()
+        result = getattr(self, attr)(msg)
+        await self.__send_to_channel(result.channel)
+        await self.__send_to_owner(result.owner)
+        self.logger.info("Results: %s", result)
+
     def set_connection(self, message: Message) -> ReturnMessage:
         """Sets echo connection to given channel ID if found"""
         try:
@@ -111,7 +140,7 @@ class EchoBox:
         except ValueError:
             return ReturnMessage("", "Invalid channel ID provided")
 
-        self.target_channel = self.client.client.get_channel(channel_id)
+        self.target_channel = self.client.get_channel(channel_id)
         self.target_use_mark = time.perf_counter()
 
         if not self.target_channel or str(self.target_channel.type) != "text":
@@ -151,18 +180,12 @@ class EchoBox:
         return ReturnMessage("", "Echo target cleared.")
 
     async def on_message(self, msg: Message) -> None:
-        """ON MESSAGE event hook"""
+        """ON MESSAGE event hook, commands come through register_commands"""
         if str(msg.channel.type) != "private" or not self.owner_id:
             return
         self.logger.debug("Got message: %s", msg)
         self.__populate_owner()
 
-        if msg.content.startswith("echo!") and (str(msg.author.id) == self.owner_id):
-            result = self.parse_command(msg)
-            await self.__send_to_channel(result.channel)
-            await self.__send_to_owner(result.owner)
-            self.logger.info("Results: %s", result)
-
-        elif self.owner is not None:
+        if self.owner is not None:
             msg = f"EchoBox: DM to bot from {msg.author}\n```{msg.content}```"
             await self.__send_to_owner(msg)
@@ -16,6 +16,7 @@ Git Repo: https://github.com/Preocts/Egg_Bot
 import logging
 import re
 import time
+from functools import partial
 from typing import List
 
 from discord import Client
@@ -23,6 +24,9 @@ from discord import Guild
 from discord import Member
 from discord import Message
 
+from eggbot.utils.commandrouter import CommandRouter
+from eggbot.utils.configwatch import watcher
+from modules.shoulderbirdcli import COMMAND_CONFIG
 from modules.shoulderbirdcli import ShoulderbirdCLI
 from modules.shoulderbirdconfig import BirdMember
 from modules.shoulderbirdconfig import DEFAULT_CONFIG
@@ -38,13 +42,14 @@ class ShoulderBirdParser:
 
     def __init__(self, client: Client, config_file: str = DEFAULT_CONFIG) -> None:
         """Loads config"""
-        self.__config = ShoulderBirdConfig(config_file)
+        self.__config = ShoulderBirdConfig(config_file, watcher)
         self.cli = ShoulderbirdCLI(self.__config, client)
         self.client = client
 
     def close(self) -> None:
         """Saves config state, breaks all references"""
         self.__config.save_config()
+        self.__config.close()
         del self.__config
 
     def get_matches(
@@ -65,6 +70,29 @@ class ShoulderBirdParser:
                 match_list.append(member)
         return match_list
 
+    def register_commands(self, router: CommandRouter) -> None:
+        """Route sb! commands, sent by DM, to the CLI which reads clean_content"""
+        for command, config in COMMAND_CONFIG.items():
+            router.add(
+                command,
+                partial(self.on_command, config["attr"]),
+                self.is_private,
+                AUTO_LOAD,
+                clean=True,
+            )
+
+    @staticmethod
+    def is_private(message: Message) -> bool:
+        """Commands are DMs to the bot"""
+        return str(message.channel.type) == "private"
+
+    async def on_command(self, attr: str, message: Message) -> None:
+        """Run a routed CLI command, DM the response and save"""
+        response = getattr(self.cli, attr)(message)
+        if response:
+            await self.__send_dm(message.author, response)
+            await self.__config.save_config_async()
+
     @classmethod
     def __is_valid_message(cls, message: Message) -> bool:
         """Tests for valid message to process"""
@@ -90,11 +118,8 @@ class ShoulderBirdParser:
         tic = time.perf_counter()
         self.logger.debug("[START] onmessage")
 
-        # If this is a private message, branch to CLI hander and return here
+        # Commands by DM come through register_commands, nothing to match here
         if str(message.channel.type) == "private":
-            response = self.cli.parse_command(message)
-            if response:
-                await self.__send_dm(message.author, response)
             return None
 
         guild: Guild = message.guild
@@ -6,7 +6,7 @@ This was designed for Nayomii.
 
 This class file handle the DM controlled commands for Shoulderbird. The
 goal is to allow full configuration of the module from the DM window
-within Discord.
+within Discord. Changes are saved by the caller once the command returns.
 
 Author  : Preocts <preocts@preocts.com>
 Discord : Preocts#8196
@@ -99,7 +99,6 @@ class ShoulderbirdCLI:
 
         clean_search = ShoulderbirdCLI.sanitize_search(segments[1].strip())
         self.config.save_member(guild_id, str(message.author.id), regex=clean_search)
-        self.config.save_config()
         return f"Search set: {clean_search}"
 
     def ignore(self, message: Message) -> str:
@@ -136,8 +135,6 @@ class ShoulderbirdCLI:
             self.config.save_member(
                 config.guild_id, config.member_id, ignore=config.ignore
             )
-        if member_list:
-            self.config.save_config()
         return f"'{target}' {verb} ignore list."
 
     def toggle_on(self, message: Message) -> str:
@@ -156,7 +153,6 @@ class ShoulderbirdCLI:
         for member in member_list:
             self.config.save_member(member.guild_id, member.member_id, toggle=switch)
         if member_list:
-            self.config.save_config()
             return f"ShoulderBird now **{verb}** for {len(member_list)} guild(s)."
 
         return "No searches found, use `sb!help set` to get started."
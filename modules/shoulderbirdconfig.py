@@ -4,23 +4,34 @@ Shoulder Bird is a bot plugin that pings a user when a defined keyword is read i
 
 The objects in this script are the layer for CRUD operations against ShoulderBird's
 configuration file.  If the file is missing a new one will be created.  Each config
-contains top-level key-values for the module name and version which can be used
-to upgrade existing configs when schema changes.
+contains top-level key-values for the module name and version. Older configs are
+migrated to the current version on load, so every member is stored complete.
+Given a ConfigWatcher, edits made to the file on disk are applied as found.
 
 Author  : Preocts <preocts@preocts.com>
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/Egg_Bot
 """
+from __future__ import annotations
+
 import logging
+from typing import AbstractSet
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import Mapping
+from typing import Optional
 from typing import Set
 
 from eggbot.configfile import ConfigFile
+from eggbot.utils.configmigrate import META_KEYS
+from eggbot.utils.configmigrate import migrate
+from eggbot.utils.configmigrate import migration
+from eggbot.utils.configwatch import ConfigWatcher
+from eggbot.utils.configwatch import Subscriber
 
 MODULE_NAME = "ShoulderBird"
-MODULE_VERSION = "1.0.0"
+MODULE_VERSION = "1.1.0"
 DEFAULT_CONFIG = "configs/shoulderbird.json"
 
 
@@ -46,25 +57,77 @@ class BirdMember:
             "ignore": list(self.ignore),
         }
 
+    @classmethod
+    def from_dict(
+        cls, guild_id: str, member_id: str, member: Dict[str, Any]
+    ) -> BirdMember:
+        """Create model from a stored member, defaults for fields missing"""
+        return cls(
+            guild_id,
+            member_id,
+            regex=member.get("regex", ""),
+            toggle=member.get("toggle", True),
+            ignore=member.get("ignore", []),
+        )
+
+
+@migration(MODULE_NAME, "1.0.0", "1.1.0")
+def complete_members(guild_id: str, guild: Any) -> Optional[Dict[str, Any]]:
+    """Store every member with all fields, ids taken from their keys"""
+    if not isinstance(guild, dict):
+        return None
+    return {
+        member_id: {
+            "guild_id": guild_id,
+            "member_id": member_id,
+            "regex": str(member.get("regex", "")),
+            "toggle": bool(member.get("toggle", True)),
+            "ignore": sorted({str(ignore) for ignore in member.get("ignore", [])}),
+        }
+        for member_id, member in guild.items()
+        if isinstance(member, dict)
+    }
+
 
 class ShoulderBirdConfig:
     """Shoulder Bird Config class, CRUD config operations"""
 
     logger = logging.getLogger(__name__)
 
-    def __init__(self, config_file: str = DEFAULT_CONFIG) -> None:
-        """Init and load config"""
+    def __init__(
+        self,
+        config_file: str = DEFAULT_CONFIG,
+        watcher: Optional[ConfigWatcher] = None,
+    ) -> None:
+        """Init and load config, applying changes found by watcher if given"""
         self.logger.info("Initializing Shoulder Bird Parser")
         self.__configclient = ConfigFile()
         self.__configclient.load(config_file)
         if not self.__configclient.config:
             self.__configclient.create("module", MODULE_NAME)
             self.__configclient.create("version", MODULE_VERSION)
+        if not migrate(self.__configclient, MODULE_NAME, MODULE_VERSION):
+            raise ValueError(f"Cannot migrate {config_file} to {MODULE_VERSION}")
+        self.__watcher = watcher
+        self.__on_change: Optional[Subscriber] = None
+        if watcher is not None:
+            self.__on_change = self.__configclient.watch(watcher, self.__changed)
+
+    def __changed(self, config: Mapping[str, Any], changed: AbstractSet[str]) -> None:
+        """Log guilds reloaded from disk, members are read from config on use"""
+        self.logger.info("Reloaded ShoulderBird config: %s", sorted(changed))
+
+    def close(self) -> None:
+        """Stop applying changes found on disk"""
+        if self.__watcher is not None and self.__on_change is not None:
+            filename = str(self.__configclient.filename)
+            self.__watcher.unsubscribe(filename, self.__on_change)
+        self.__on_change = None
 
     def __load_guild(self, guild_id: str) -> Dict[str, Any]:
         """Load a specific guild from config. Will create guild if not found"""
         self.logger.debug("load_guild: '%s'", guild_id)
-        if guild_id not in self.__configclient.config:
+        if guild_id not in self.__configclient:
             self.__configclient.create(guild_id, {})
         return self.__configclient.read(guild_id)
 
@@ -82,28 +145,38 @@ class ShoulderBirdConfig:
         """Saves current config to file"""
         return self.__configclient.save()
 
+    async def save_config_async(self) -> bool:
+        """Saves current config to file without blocking the event loop"""
+        return await self.__configclient.save_async()
+
     def member_list_all(self, member_id: str) -> List[BirdMember]:
         """Returns all configs for member across guilds, can return empty list"""
         self.logger.debug("member_list_all: '%s'", member_id)
         config_list = []
-        for guild in self.__configclient.config.values():
-            if member_id in guild:
-                config_list.append(BirdMember(**guild[member_id]))
+        for guild_id, guild in self.__configclient.config.items():
+            if guild_id not in META_KEYS and member_id in guild:
+                config_list.append(
+                    BirdMember.from_dict(guild_id, member_id, guild[member_id])
+                )
         return config_list
 
     def guild_list_all(self, guild_id: str) -> List[BirdMember]:
         """Returns all configs within a single guild, can return empty list"""
         self.logger.debug("guild_list_all: '%s'", guild_id)
         config_list = []
-        for member in self.__load_guild(guild_id).values():
-            config_list.append(BirdMember(**member))
+        for member_id, member in self.__load_guild(guild_id).items():
+            config_list.append(BirdMember.from_dict(guild_id, member_id, member))
         return config_list
 
     def load_member(self, guild_id: str, member_id: str) -> BirdMember:
         """Load a member from a guild. Will return empty member if not found"""
         self.logger.debug("load_member: '%s', '%s'", guild_id, member_id)
         member = self.__load_guild(guild_id).get(member_id)
-        return BirdMember(**member) if member else BirdMember(guild_id, member_id)
+        return (
+            BirdMember.from_dict(guild_id, member_id, member)
+            if member
+            else BirdMember(guild_id, member_id)
+        )
 
     def save_member(self, guild_id: str, member_id: str, **kwargs: Any) -> BirdMember:
         """Save (creating or updating) a member to a guild
@@ -0,0 +1,111 @@
+"""Tests for utils/commandrouter.py"""
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import Mock
+
+import pytest
+
+from eggbot.utils.commandrouter import CommandRouter
+
+
+def test_find_first_word() -> None:
+    """Only a whole first word matches a command"""
+    router = CommandRouter()
+    here, guild = AsyncMock(), AsyncMock()
+    router.add("audit!here", here)
+    router.add("audit!guild", guild)
+
+    assert router.find("audit!here 123 456").handler is here  # type: ignore
+    assert router.find("  audit!guild\n123").handler is guild  # type: ignore
+    assert router.find("audit!") is None
+    assert router.find("audit!heres 123") is None
+    assert router.find("say audit!here") is None
+    assert router.find("") is None
+
+
+def test_add_and_remove() -> None:
+    """Commands are unique, one word, and removed by owner"""
+    router = CommandRouter()
+    router.add("sb!on", AsyncMock(), owner="bird")
+    router.add("sb!one", AsyncMock(), owner="other")
+
+    with pytest.raises(ValueError):
+        router.add("sb!on", AsyncMock())
+    with pytest.raises(ValueError):
+        router.add("sb! on", AsyncMock())
+
+    router.remove("bird")
+    assert router.find("sb!on") is None
+    assert router.find("sb!one") is not None
+    assert router.commands() == ["sb!one"]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_checks() -> None:
+    """Handlers run only when their check passes"""
+    router = CommandRouter()
+    handler = AsyncMock()
+    router.add("echo!send", handler, check=lambda msg: msg.author.id == 1)
+    message = Mock(content="echo!send hello")
+
+    message.author.id = 2
+    assert not await router.dispatch(message)
+    message.author.id = 1
+    assert await router.dispatch(message)
+    await router.join()
+    handler.assert_awaited_once_with(message)
+    assert not await router.dispatch(Mock(content="hello"))
+
+
+@pytest.mark.asyncio
+async def test_dispatch_isolates_handlers() -> None:
+    """Failing and slow handlers are logged, slow ones cancelled by owner timeout"""
+    router = CommandRouter()
+    slow_done = []
+
+    async def slow(message: Mock) -> None:
+        await asyncio.sleep(1)
+        slow_done.append(message)
+
+    router.add("cmd!fail", AsyncMock(side_effect=ValueError), owner="broken")
+    router.add("cmd!slow", slow, owner="slow")
+    router.set_timeout("slow", 0.01)
+
+    assert await router.dispatch(Mock(content="cmd!fail"))
+    assert await router.dispatch(Mock(content="cmd!slow"))
+    await router.join()
+    assert not slow_done
+    router.remove("slow")
+    assert "slow" not in router.timeouts
+
+
+@pytest.mark.asyncio
+async def test_dispatch_does_not_wait() -> None:
+    """Dispatch returns once a handler is started, before it finishes"""
+    router = CommandRouter()
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow(_: Mock) -> None:
+        started.set()
+        await release.wait()
+
+    router.add("cmd!slow", slow)
+    assert await asyncio.wait_for(router.dispatch(Mock(content="cmd!slow")), 1)
+    await started.wait()
+    release.set()
+    await router.join()
+    assert not router._running  # pylint: disable=protected-access
+
+
+@pytest.mark.asyncio
+async def test_dispatch_clean_content() -> None:
+    """Clean routes must also match the message's clean_content"""
+    router = CommandRouter()
+    handler = AsyncMock()
+    router.add("sb!ignore", handler, clean=True)
+
+    message = Mock(content="sb!ignore <@111>", clean_content="sb!ignore @dave")
+    assert await router.dispatch(message)
+    await router.join()
+    handler.assert_awaited_once_with(message)
+    assert not await router.dispatch(Mock(content="sb!ignore", clean_content="x"))
@@ -0,0 +1,116 @@
+"""Tests for utils/configcodec.py"""
+import json
+import os
+import shutil
+import tempfile
+from typing import Generator
+from unittest.mock import patch
+
+import pytest
+
+from eggbot.configfile import ConfigFile
+from eggbot.utils import configbench
+from eggbot.utils import configcodec
+from eggbot.utils.configio import ConfigIO
+from eggbot.utils.configstore import JsonFileStore
+
+CONFIG = {
+    "module": "Tester",
+    "name": "Ünïcode 🥚",
+    "111": {"scores": {"222": 5}, "big": 2 ** 70},
+    "1/2": [1, 2.5, None, True],
+}
+
+NAMES = ["test.json", "test.min.json", "test.json.gz"]
+if configcodec.HAS_ZSTD:
+    NAMES.append("test.json.zst")
+
+
+@pytest.fixture(scope="function", name="tempdir")
+def fixture_tempdir() -> Generator[str, None, None]:
+    """Creates a directory to save into"""
+    path = tempfile.mkdtemp()
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+def test_get_codec() -> None:
+    """Codec is chosen by extension, .json by default"""
+    assert configcodec.get_codec("configs/test.json") is configcodec.PRETTY
+    assert configcodec.get_codec("configs/test") is configcodec.PRETTY
+    assert configcodec.get_codec("configs/test.MIN.json") is configcodec.COMPACT
+    assert configcodec.get_codec("configs/test.json.gz") is configcodec.GZIP
+    assert configcodec.get_codec("configs/test.json.zst") is configcodec.ZSTD
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_codec_round_trip(tempdir: str, name: str) -> None:
+    """Save and load through each codec, lazy loads read single keys"""
+    filename = os.path.join(tempdir, name)
+    assert ConfigIO().save(CONFIG, filename)
+    assert ConfigIO().load(filename) == CONFIG
+
+    config = ConfigFile(filename, lazy=True)
+    assert config.load()
+    assert config.read("111") == CONFIG["111"]
+    assert list(config.config) == list(CONFIG)
+
+
+@pytest.mark.parametrize("codec", [configcodec.PRETTY, configcodec.COMPACT])
+def test_render_offsets(codec: configcodec.Codec) -> None:
+    """Offsets from render match those found by scanning the file"""
+    content, offsets = codec.render(CONFIG)
+    for key, (start, end) in offsets.items():
+        assert json.loads(content[start:end]) == CONFIG[key]
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "test" + codec.suffix)
+        with open(filename, "wb") as out_file:
+            out_file.write(content)
+        assert JsonFileStore(filename)._scan() == offsets
+
+
+def test_pretty_matches_stdlib() -> None:
+    """Default codec writes files as they were written before codecs"""
+    expected = json.dumps(CONFIG, indent=4) + "\n"
+    assert configcodec.PRETTY.encode(CONFIG).decode("UTF-8") == expected
+    assert configcodec.PRETTY.encode({}) == b"{}\n"
+
+
+def test_decode_by_magic(tempdir: str) -> None:
+    """Compressed files load whatever their extension"""
+    filename = os.path.join(tempdir, "test.json.gz")
+    assert ConfigIO().save(CONFIG, filename)
+    renamed = os.path.join(tempdir, "renamed.json")
+    os.rename(filename, renamed)
+    assert ConfigIO().load(renamed) == CONFIG
+
+
+def test_decode_invalid(tempdir: str) -> None:
+    """Invalid compressed data loads as empty"""
+    filename = os.path.join(tempdir, "test.json.gz")
+    with open(filename, "wb") as out_file:
+        out_file.write(configcodec.GZIP_MAGIC + b"not gzip")
+    assert ConfigIO().load(filename) == {}
+
+    with pytest.raises(ValueError):
+        configcodec.decode(configcodec.ZSTD_MAGIC + b"not zstd")
+
+
+def test_stdlib_fallback() -> None:
+    """Compact encoding and decoding work without orjson"""
+    with patch.object(configcodec, "HAS_ORJSON", False):
+        encoded = configcodec.dumps_compact(CONFIG)
+        assert b": " not in encoded and b", " not in encoded
+        assert configcodec.loads(encoded) == CONFIG
+    assert configcodec.loads(configcodec.dumps_compact(CONFIG)) == CONFIG
+
+
+def test_bench() -> None:
+    """Benchmark reports each available codec"""
+    results = configbench.bench(configbench.generate_config(2, 3), runs=1)
+    assert [row["codec"] for row in results][0:2] == ["compact", "gzip"]
+    assert all(row["bytes"] > 0 for row in results)
+    assert configbench.main(["--guilds", "1", "--members", "1", "--runs", "1"]) == 0
@@ -1,14 +1,41 @@
 """Tests for configfile.py"""
+import asyncio
+import json
+import os
+import pathlib
 import random
+import shutil
+import tempfile
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from unittest.mock import patch
+
+import pytest
 
 from eggbot.configfile import ConfigFile
+from eggbot.utils.configstore import atomic_write
 
 
 def test_properties() -> None:
     """Unit Test"""
     config = ConfigFile("./tests/fixtures/mock_config.json")
     config.load()
-    assert isinstance(config.config, dict)
+    assert isinstance(config.config, Mapping)
+
+
+def test_config_read_only_view() -> None:
+    """Config property is a live view that cannot be changed"""
+    config = ConfigFile("./tests/fixtures/mock_config.json")
+    view = config.config
+
+    assert config.create("key", "value")
+    assert view["key"] == "value"
+    assert "key" in config
+    assert "nokey" not in config
+    with pytest.raises(TypeError):
+        view["key"] = "changed"  # type: ignore
 
 
 def test_load() -> None:
@@ -52,12 +79,14 @@ def test_config_crud() -> None:
     assert not config.delete(key)
 
 
-def test_save() -> None:
-    """Unit Test"""
+def test_save(tmp_path: pathlib.Path) -> None:
+    """Unit Test, on a copy as saves lock the config with a file beside it"""
     random.seed()
     key = f"unitTest{random.randint(1000,10000)}"  # nosec
+    filename = str(tmp_path / "mock_config.json")
+    shutil.copyfile("./tests/fixtures/mock_config.json", filename)
 
-    config = ConfigFile("./tests/fixtures/mock_config.json")
+    config = ConfigFile(filename)
     config.load()
 
     assert config.config
@@ -74,6 +103,100 @@ def test_save() -> None:
     assert config.config
 
 
+def test_dirty_tracking() -> None:
+    """Changed keys are tracked, save without changes does not write"""
+    config = ConfigFile("./tests/fixtures/mock_config.json")
+    config.load()
+    assert not config.dirty
+
+    with patch.object(config.configClient, "save") as mock_save:
+        assert config.save()
+        mock_save.assert_not_called()
+
+        config.create("new", 1)
+        config.update("Mock", "Changed")
+        config.touch("inplace")
+        assert config.changed == {"new", "Mock", "inplace"}
+
+        assert config.save()
+        assert mock_save.call_args.kwargs["changed"] == {"new", "Mock", "inplace"}
+        assert not config.dirty
+
+        mock_save.return_value = False
+        config.delete("new")
+        assert not config.save()
+        assert config.changed == {"new"}
+
+
+def test_lazy_load() -> None:
+    """Values are decoded on first read, unchanged values are dropped past size"""
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "lazy.json")
+        values = {str(key): {"value": key} for key in range(10)}
+        assert ConfigFile().configClient.save(values, filename)
+
+        config = ConfigFile(filename, lazy=True, cache_size=2)
+        loader = config.configClient.load_key
+        with patch.object(config.configClient, "load_key", wraps=loader) as load:
+            assert config.load()
+            load.assert_not_called()
+            assert len(config.config) == 10
+            assert "9" in config
+
+            for key, value in values.items():
+                assert config.read(key) == value
+            assert config.read("missing") is None
+            assert load.call_count == 10
+            config.read("9")
+            assert load.call_count == 10
+            config.read("1")
+            assert load.call_count == 11
+
+            config.update("0", "changed")
+            config.create("new", "created")
+            config.read("1")
+            config.read("2")
+            assert load.call_count == 12
+            assert config.read("0") == "changed"
+            assert config.read("1") == values["1"]
+            assert load.call_count == 12
+
+            assert config.save()
+            config.evict()
+            load.reset_mock()
+            assert config.read("0") == "changed"
+            assert config.read("new") == "created"
+            assert load.call_count == 2
+
+        assert ConfigFile(filename).load()
+        assert ConfigFile(filename, lazy=True).config == {}
+
+
+@pytest.mark.asyncio
+async def test_lazy_save_async() -> None:
+    """Saving a lazy config decodes only the keys changed"""
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "lazy.json")
+        values: Dict[str, Any] = {str(key): {"value": key} for key in range(300)}
+        assert ConfigFile().configClient.save(values, filename)
+
+        config = ConfigFile(filename, lazy=True)
+        assert config.load()
+        config.update("0", "changed")
+        loader = config.configClient.load_key
+        with patch.object(config.configClient, "load_key", wraps=loader) as load:
+            assert await config.save_async()
+            load.assert_not_called()
+
+        assert ConfigFile().configClient.load(filename) == {**values, "0": "changed"}
+        config.update("1", "again")
+        assert await config.save_async()
+        assert config.read("0") == "changed"
+        reloaded = ConfigFile(filename, lazy=True)
+        assert reloaded.load()
+        assert reloaded.read("1") == "again"
+
+
 def test_unload() -> None:
     """Empty current config, reload from same file"""
     config = ConfigFile("./tests/fixtures/mock_config.json")
@@ -88,3 +211,44 @@ def test_unload() -> None:
     config.load()
 
     assert config.config
+
+
+@pytest.mark.asyncio
+async def test_save_async_coalesces() -> None:
+    """Overlapping saves write at most twice, last snapshot wins"""
+    file_desc, path = tempfile.mkstemp()
+    os.close(file_desc)
+    config = ConfigFile(path)
+    write_calls: List[str] = []
+
+    def counted_write(filename: str, content: str) -> None:
+        write_calls.append(content)
+        atomic_write(filename, content)
+
+    try:
+        with patch("eggbot.utils.configstore.atomic_write", counted_write):
+            config.create("key0", 0)
+            saves = [asyncio.ensure_future(config.save_async())]
+            # Let the first write get in flight before the rest are requested
+            await asyncio.sleep(0)
+            for idx in range(1, 5):
+                config.create(f"key{idx}", idx)
+                saves.append(asyncio.ensure_future(config.save_async()))
+            results = await asyncio.gather(*saves)
+
+        assert all(results)
+        assert len(write_calls) == 2
+        assert os.listdir(os.path.dirname(path)).count(os.path.basename(path)) == 1
+        with open(path, "r", encoding="UTF-8") as in_file:
+            assert json.loads(in_file.read()) == {f"key{idx}": idx for idx in range(5)}
+    finally:
+        os.remove(path)
+
+
+@pytest.mark.asyncio
+async def test_save_async_invalid_path() -> None:
+    """Failed writes return False and leave no temp file"""
+    config = ConfigFile("./8675309_call_now/nofile.json")
+    config.create("key", "value")
+
+    assert not await config.save_async()
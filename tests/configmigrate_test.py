@@ -0,0 +1,186 @@
+"""Tests for utils/configmigrate.py"""
+import json
+import os
+import shutil
+import tempfile
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Optional
+
+import discord
+import pytest
+
+from eggbot.configfile import ConfigFile
+from eggbot.utils.configmigrate import migrate
+from eggbot.utils.configmigrate import migration
+from eggbot.utils.configmigrate import MIGRATIONS
+from eggbot.utils.configmigrate import plan
+from modules.module_chatkudos import ChatKudos
+from modules.shoulderbirdconfig import ShoulderBirdConfig
+
+MODULE = "Migrator"
+
+
+@migration(MODULE, "1.0.0", "1.1.0")
+def rename(key: str, section: Any) -> Optional[Dict[str, Any]]:
+    """Test step: rename a field, drop sections that are not dicts"""
+    if not isinstance(section, dict):
+        return None
+    return {"id": key, "name": section.get("title", "")}
+
+
+@migration(MODULE, "1.1.0", "2.0.0")
+def require_name(key: str, section: Dict[str, Any]) -> Dict[str, Any]:
+    """Test step: fail on an empty name"""
+    if not section["name"]:
+        raise ValueError(f"{key} has no name")
+    return {**section, "active": True}
+
+
+@pytest.fixture(scope="function", name="tempdir")
+def fixture_tempdir() -> Generator[str, None, None]:
+    """Creates a directory to save into"""
+    path = tempfile.mkdtemp()
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+def write(filename: str, config: Dict[str, Any]) -> ConfigFile:
+    """Write a config and load it"""
+    with open(filename, "w", encoding="UTF-8") as out_file:
+        json.dump(config, out_file)
+    config_file = ConfigFile()
+    config_file.load(filename)
+    return config_file
+
+
+def test_plan() -> None:
+    """Steps are chained, missing or overshooting paths raise"""
+    assert [step.to_version for step in plan(MODULE, "1.0.0", "2.0.0")] == [
+        "1.1.0",
+        "2.0.0",
+    ]
+    assert plan(MODULE, "2.0.0", "2.0.0") == []
+    with pytest.raises(ValueError):
+        plan(MODULE, "1.0.0", "1.0.5")
+    with pytest.raises(ValueError):
+        plan("Unknown", "1.0.0", "1.1.0")
+    with pytest.raises(ValueError):
+        migration(MODULE, "1.0.0", "1.2.0")(rename)
+    assert MIGRATIONS[MODULE]["1.0.0"].upgrade is rename
+
+
+def test_migrate(tempdir: str) -> None:
+    """Sections upgraded through every step and saved once with new version"""
+    filename = os.path.join(tempdir, "test.json")
+    config = write(filename, {"module": MODULE, "111": {"title": "one"}, "222": 1})
+
+    assert migrate(config, MODULE, "2.0.0")
+    assert not config.dirty
+
+    config.load()
+    assert config.config == {
+        "module": MODULE,
+        "version": "2.0.0",
+        "111": {"id": "111", "name": "one", "active": True},
+    }
+    assert migrate(config, MODULE, "2.0.0")
+
+
+def test_migrate_failures_leave_config(tempdir: str) -> None:
+    """Failed steps, downgrades, and unknown paths change nothing"""
+    filename = os.path.join(tempdir, "test.json")
+    original = {
+        "module": MODULE,
+        "version": "1.0.0",
+        "111": {},
+        "222": {"title": "two"},
+    }
+    config = write(filename, original)
+
+    assert not migrate(config, MODULE, "2.0.0")
+    assert not migrate(config, MODULE, "0.9.0")
+    assert not migrate(config, MODULE, "3.0.0")
+    assert not config.dirty
+    assert config.config == original
+
+
+def test_shoulderbird_migration(tempdir: str) -> None:
+    """Members missing fields are completed from defaults and their keys"""
+    filename = os.path.join(tempdir, "shoulderbird.json")
+    write(
+        filename,
+        {
+            "module": "ShoulderBird",
+            "version": "1.0.0",
+            "101": {"202": {"regex": "egg", "ignore": ["3", "1", "3"]}, "203": []},
+        },
+    )
+
+    member = ShoulderBirdConfig(filename).load_member("101", "202")
+
+    assert (member.guild_id, member.member_id) == ("101", "202")
+    assert member.regex == "egg"
+    assert member.toggle is True
+    assert member.ignore == {"1", "3"}
+    with open(filename, "r", encoding="UTF-8") as in_file:
+        saved = json.load(in_file)
+    assert saved["version"] == "1.1.0"
+    assert saved["101"] == {"202": {**member.to_dict(), "ignore": ["1", "3"]}}
+
+
+def test_chatkudos_migration(tempdir: str) -> None:
+    """Guilds are completed with defaults, unknown fields dropped"""
+    filename = os.path.join(tempdir, "chatkudos.json")
+    write(
+        filename,
+        {
+            "module": "ChatKudos",
+            "111": {"max": 10, "stale": True, "scores": {"123": 4}},
+        },
+    )
+
+    kudos = ChatKudos(discord.Client(), filename)
+    guild = kudos.get_guild("111")
+
+    assert guild.max == 10
+    assert guild.lock is False
+    assert guild.history == {}
+    assert guild.scores["123"] == 4
+    assert "stale" not in kudos.config.read("111")
+    assert kudos.config.read("version") == "1.1.0"
+
+
+def test_reloaded_sections_upgraded(tempdir: str) -> None:
+    """Sections applied from disk after migrating are upgraded as they apply"""
+    filename = os.path.join(tempdir, "test.json")
+    config = write(filename, {"module": MODULE, "111": {"title": "one"}})
+    assert migrate(config, MODULE, "1.1.0")
+
+    reloaded = {"module": MODULE, "version": "1.0.0", "222": {"title": "two"}}
+    applied = config.apply_changes(reloaded, {"version", "111", "222"})
+
+    assert applied == {"111", "222"}
+    assert config.read("version") == "1.1.0"
+    assert config.read("222") == {"id": "222", "name": "two"}
+    assert "111" not in config
+
+    newer = {"module": MODULE, "version": "3.0.0", "222": {"name": "three"}}
+    assert not config.apply_changes(newer, {"222"})
+    assert config.read("222") == {"id": "222", "name": "two"}
+
+
+def test_modules_refuse_unmigrated(tempdir: str) -> None:
+    """Modules do not run on a config they cannot migrate"""
+    filename = os.path.join(tempdir, "shoulderbird.json")
+    write(filename, {"module": "ShoulderBird", "version": "9.0.0", "101": {}})
+    with pytest.raises(ValueError):
+        ShoulderBirdConfig(filename)
+
+    filename = os.path.join(tempdir, "chatkudos.json")
+    write(filename, {"module": "ChatKudos", "version": "9.0.0", "111": {}})
+    with pytest.raises(ValueError):
+        ChatKudos(discord.Client(), filename)
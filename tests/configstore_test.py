@@ -0,0 +1,290 @@
+"""Tests for utils/configstore.py"""
+import fcntl
+import multiprocessing
+import os
+import shutil
+import tempfile
+from typing import Dict
+from typing import Generator
+from typing import Tuple
+from unittest.mock import patch
+
+import pytest
+
+from eggbot.configfile import ConfigFile
+from eggbot.utils.configio import ConfigIO
+from eggbot.utils.configstore import atomic_write
+from eggbot.utils.configstore import file_lock
+from eggbot.utils.configstore import get_store
+from eggbot.utils.configstore import JsonFileStore
+from eggbot.utils.configstore import ShardedJsonStore
+from eggbot.utils.configstore import SqliteStore
+
+CONFIG = {
+    "module": "Tester",
+    "version": "1.0.0",
+    "111": {"scores": {"222": 5}},
+    "1/2": [1, 2, None],
+}
+
+
+@pytest.fixture(scope="function", name="tempdir")
+def fixture_tempdir() -> Generator[str, None, None]:
+    """Creates a directory to save into"""
+    path = tempfile.mkdtemp()
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+def test_get_store() -> None:
+    """Backend is chosen by path"""
+    assert isinstance(get_store("configs/test.json"), JsonFileStore)
+    assert isinstance(get_store("README.md"), JsonFileStore)
+    assert isinstance(get_store("configs/test.d"), ShardedJsonStore)
+    assert isinstance(get_store("configs/test/"), ShardedJsonStore)
+    assert isinstance(get_store("tests/fixtures"), ShardedJsonStore)
+    assert isinstance(get_store("configs/test.sqlite"), SqliteStore)
+    assert isinstance(get_store("configs/test.db"), SqliteStore)
+
+
+@pytest.mark.parametrize("name", ["test.json", "test.d", "test.sqlite"])
+def test_store_round_trip(tempdir: str, name: str) -> None:
+    """Put, flush, load, and delete against each backend"""
+    store = get_store(os.path.join(tempdir, name))
+    assert store.load_all() == {}
+    assert store.load_key("111") is None
+
+    for key, value in CONFIG.items():
+        store.put_key(key, value)
+    assert store.flush()
+
+    store = get_store(os.path.join(tempdir, name))
+    assert store.load_all() == CONFIG
+    assert store.load_key("111") == CONFIG["111"]
+    assert sorted(store.keys()) == sorted(CONFIG)
+
+    store.delete_key("111")
+    assert store.flush()
+    assert "111" not in get_store(os.path.join(tempdir, name)).load_all()
+
+
+@pytest.mark.parametrize("name", ["test.d", "test.sqlite"])
+def test_save_changed_keys_only(tempdir: str, name: str) -> None:
+    """Partial backends write only changed keys, full saves remove stale keys"""
+    filename = os.path.join(tempdir, name)
+    configio = ConfigIO()
+    assert configio.save(CONFIG, filename)
+
+    changed = dict(CONFIG, version="2.0.0")
+    del changed["1/2"]
+    with patch.object(type(get_store(filename)), "put_key") as put_key:
+        assert configio.save(changed, filename, changed={"version", "1/2"})
+        put_key.assert_called_once_with("version", "2.0.0")
+
+    configio.save(changed, filename, changed={"version", "1/2"})
+    assert configio.load(filename) == changed
+
+    assert configio.save({"module": "Other"}, filename)
+    assert configio.load(filename) == {"module": "Other"}
+
+
+def test_sharded_write_touches_one_file(tempdir: str) -> None:
+    """Only the shard of the changed key is written"""
+    config = ConfigFile(os.path.join(tempdir, "test.d"))
+    for key, value in CONFIG.items():
+        config.create(key, value)
+    assert config.save()
+
+    written = []
+
+    def counted_write(filename: str, content: str) -> None:
+        written.append(os.path.basename(filename))
+        atomic_write(filename, content)
+
+    config.update("111", {"scores": {}})
+    with patch("eggbot.utils.configstore.atomic_write", counted_write):
+        assert config.save()
+
+    assert written == ["111.json"]
+    assert ConfigFile(config.filename).load()
+
+
+@pytest.mark.asyncio
+async def test_save_async_sqlite(tempdir: str) -> None:
+    """Async saves merge pending changes of partial backends"""
+    config = ConfigFile(os.path.join(tempdir, "test.sqlite"))
+    config.create("module", "Tester")
+    config.create("111", {})
+
+    assert await config.save_async()
+
+    config.update("111", {"new": True})
+    config.delete("module")
+    assert await config.save_async()
+
+    assert ConfigIO().load(config.filename) == {"111": {"new": True}}
+
+
+def test_json_index(tempdir: str) -> None:
+    """Index holds byte offsets of values and is rebuilt when the file changes"""
+    filename = os.path.join(tempdir, "test.json")
+    config = dict(CONFIG, name="Ünïcode 🥚")
+    assert ConfigIO().save(config, filename)
+    assert not os.path.exists(filename + ".idx")
+
+    store = JsonFileStore(filename)
+    index = store.index()
+    assert list(index) == list(config)
+    assert os.path.exists(filename + ".idx")
+    for key, value in config.items():
+        assert store.load_key(key) == value
+
+    with patch.object(JsonFileStore, "_scan") as scan:
+        assert JsonFileStore(filename).index() == index
+        scan.assert_not_called()
+
+    with open(filename, "w", encoding="UTF-8") as out_file:
+        out_file.write('{"module":"Other", "new" : [1, 2]}')
+    assert JsonFileStore(filename).load_key("new") == [1, 2]
+
+    assert ConfigIO().save(config, filename)
+    with patch.object(JsonFileStore, "_scan") as scan:
+        assert JsonFileStore(filename).index() == index
+        scan.assert_not_called()
+
+
+def test_json_index_kept_in_memory(tempdir: str) -> None:
+    """Parsed index is reused until the file changes"""
+    filename = os.path.join(tempdir, "test.json")
+    assert ConfigIO().save(CONFIG, filename)
+    index = JsonFileStore(filename).index()
+    os.remove(filename + ".idx")
+
+    with patch.object(JsonFileStore, "_scan") as scan:
+        for key, value in CONFIG.items():
+            assert JsonFileStore(filename).load_key(key) == value
+        scan.assert_not_called()
+    assert not os.path.exists(filename + ".idx")
+
+    with open(filename, "w", encoding="UTF-8") as out_file:
+        out_file.write('{"module": "Other"}')
+    assert JsonFileStore(filename).index() != index
+
+
+def test_json_index_not_saved_if_changed(tempdir: str) -> None:
+    """Index of a file changed while scanning is not saved under its new stamp"""
+    filename = os.path.join(tempdir, "test.json")
+    assert ConfigIO().save(CONFIG, filename)
+    store = JsonFileStore(filename)
+    real_scan = store._scan  # pylint: disable=protected-access
+
+    def scan_then_change() -> Dict[str, Tuple[int, int]]:
+        offsets = real_scan()
+        with open(filename, "w", encoding="UTF-8") as out_file:
+            out_file.write('{"module": "Changed while scanning"}')
+        return offsets
+
+    with patch.object(store, "_scan", side_effect=scan_then_change):
+        store.index()
+    assert not os.path.exists(filename + ".idx")
+    assert list(JsonFileStore(filename).index()) == ["module"]
+
+
+def test_save_copies_unchanged_values(tempdir: str) -> None:
+    """Keys not changed are copied from the file as found, not decoded"""
+    filename = os.path.join(tempdir, "test.json")
+    with open(filename, "w", encoding="UTF-8") as out_file:
+        out_file.write('{"module": "Tester", "111": {"scores":{"222":5}}}')
+    version = ConfigIO().version(filename)
+
+    with patch("eggbot.utils.configcodec.loads") as loads:
+        config = {"module": "Changed", "new": [1]}
+        changed = {"module", "new"}
+        assert ConfigIO().save(config, filename, changed, version, True)
+        loads.assert_not_called()
+
+    with open(filename, "r", encoding="UTF-8") as in_file:
+        assert '{"scores":{"222":5}}' in in_file.read()
+    saved = ConfigIO().load(filename)
+    assert saved == {"module": "Changed", "111": {"scores": {"222": 5}}, "new": [1]}
+
+
+def test_json_index_invalid(tempdir: str) -> None:
+    """Files that are not a JSON object have no keys"""
+    filename = os.path.join(tempdir, "test.json")
+    with open(filename, "w", encoding="UTF-8") as out_file:
+        out_file.write('["module", "Tester"]')
+    assert JsonFileStore(filename).keys() == []
+    assert JsonFileStore(filename).load_key("module") is None
+
+
+def test_file_lock(tempdir: str) -> None:
+    """Lock is exclusive between open files, as between processes"""
+    filename = os.path.join(tempdir, "test.json")
+    with file_lock(filename):
+        assert os.path.exists(filename + ".lock")
+        with open(filename + ".lock", "a") as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with open(filename + ".lock", "a") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_save_merges_when_version_moved(tempdir: str) -> None:
+    """Writers loaded from the same version keep each other's changes"""
+    filename = os.path.join(tempdir, "test.json")
+    assert ConfigIO().save(CONFIG, filename)
+    first = ConfigFile(filename)
+    second = ConfigFile(filename)
+    first.load()
+    second.load()
+
+    first.update("module", "First")
+    first.create("first", 1)
+    assert first.save()
+    assert ConfigFile.configClient.written[filename] == ConfigIO().version(filename)
+    second.create("second", 2)
+    second.delete("1/2")
+    assert second.save()
+
+    saved = ConfigIO().load(filename)
+    assert saved["module"] == "First"
+    assert saved["first"] == 1 and saved["second"] == 2
+    assert "1/2" not in saved
+
+    first.update("first", 3)
+    assert first.save()
+    second.update("second", 4)
+    assert second.save()
+    saved = ConfigIO().load(filename)
+    assert (saved["first"], saved["second"]) == (3, 4)
+
+
+def _write_keys(filename: str, worker: int, rounds: int) -> None:
+    """Save a key per round from a separate process"""
+    config = ConfigFile(filename)
+    config.load()
+    for count in range(rounds):
+        config.create(f"{worker}-{count}", count)
+        assert config.save()
+
+
+def test_save_from_many_processes(tempdir: str) -> None:
+    """Keys saved by concurrent processes are all kept"""
+    filename = os.path.join(tempdir, "test.json")
+    assert ConfigIO().save({"module": "Tester"}, filename)
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_write_keys, args=(filename, worker, 10))
+        for worker in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    saved = ConfigIO().load(filename)
+    assert len(saved) == 41
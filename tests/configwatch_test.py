@@ -0,0 +1,149 @@
+"""Tests for utils/configwatch.py"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from typing import Any
+from typing import Dict
+from typing import Generator
+from unittest.mock import Mock
+
+import pytest
+
+from eggbot.configfile import ConfigFile
+from eggbot.utils import tomlio
+from eggbot.utils.configwatch import ConfigWatcher
+from eggbot.utils.configwatch import diff
+from eggbot.utils.configwatch import digest
+
+CONFIG = {"module": "Tester", "111": {"active": True}, "222": {"active": False}}
+
+
+@pytest.fixture(scope="function", name="tempdir")
+def fixture_tempdir() -> Generator[str, None, None]:
+    """Creates a directory to save into"""
+    path = tempfile.mkdtemp()
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+def write(filename: str, config: Dict[str, Any]) -> None:
+    """Write a config as an operator would, moving the modified time forward"""
+    mtime = os.stat(filename).st_mtime_ns if os.path.exists(filename) else 0
+    with open(filename, "w", encoding="UTF-8") as out_file:
+        out_file.write(json.dumps(config, indent=4))
+    os.utime(filename, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+
+def load_json(filename: str) -> Dict[str, Any]:
+    """Load JSON, raising if invalid"""
+    with open(filename, "r", encoding="UTF-8") as in_file:
+        return json.load(in_file)
+
+
+def test_diff() -> None:
+    """Added, removed, and changed keys are found"""
+    old = digest(CONFIG)
+    new = digest({"module": "Tester", "111": {"active": False}, "333": {}})
+    assert diff(old, new) == {"111", "222", "333"}
+    assert diff(old, digest(dict(reversed(CONFIG.items())))) == set()
+
+
+@pytest.mark.asyncio
+async def test_check_notifies_changed_keys(tempdir: str) -> None:
+    """Subscribers get only keys changed, invalid files are not applied"""
+    filename = os.path.join(tempdir, "test.json")
+    write(filename, CONFIG)
+    subscriber = Mock()
+    watcher = ConfigWatcher()
+    watcher.subscribe(filename, subscriber, load_json)
+
+    assert not await watcher.check()
+
+    write(filename, dict(CONFIG, **{"111": {"active": False}}))
+    assert await watcher.check()
+    subscriber.assert_called_once()
+    assert subscriber.call_args.args[1] == {"111"}
+
+    with open(filename, "a", encoding="UTF-8") as out_file:
+        out_file.write("{ not json")
+    os.utime(filename, ns=(1, 1))
+    assert not await watcher.check()
+    subscriber.assert_called_once()
+
+    watcher.unsubscribe(filename, subscriber)
+    assert not watcher.watches
+
+
+@pytest.mark.asyncio
+async def test_configfile_watch(tempdir: str) -> None:
+    """ConfigFile applies changed keys, keeping unsaved changes"""
+    filename = os.path.join(tempdir, "test.json")
+    write(filename, CONFIG)
+    config = ConfigFile(filename)
+    config.load()
+    subscriber = Mock()
+    watcher = ConfigWatcher()
+    config.watch(watcher, subscriber)
+
+    config.update("222", {"active": "unsaved"})
+    write(filename, {"module": "Tester", "111": {}, "222": {}, "333": {}})
+    await watcher.check()
+
+    assert subscriber.call_args.args[1] == {"111", "333"}
+    assert config.read("111") == {}
+    assert config.read("333") == {}
+    assert config.read("222") == {"active": "unsaved"}
+
+    write(filename, {"module": "Tester"})
+    await watcher.check()
+    assert "111" not in config
+    assert "222" in config
+
+
+@pytest.mark.asyncio
+async def test_configfile_watch_lazy(tempdir: str) -> None:
+    """Lazy configs drop changed values to be decoded again"""
+    filename = os.path.join(tempdir, "test.json")
+    write(filename, CONFIG)
+    config = ConfigFile(filename, lazy=True)
+    config.load()
+    assert config.read("111") == CONFIG["111"]
+    watcher = ConfigWatcher()
+    config.watch(watcher)
+
+    write(filename, {"111": "changed", "333": "new"})
+    await watcher.check()
+
+    assert config.read("111") == "changed"
+    assert config.read("333") == "new"
+    assert "222" not in config
+
+
+@pytest.mark.asyncio
+async def test_watch_loop(tempdir: str) -> None:
+    """Running watcher picks up changes and awaits async subscribers"""
+    filename = os.path.join(tempdir, "test.toml")
+    tomlio.save(filename, {"111": {"name": "one"}})
+    changes = asyncio.Queue()  # type: ignore
+
+    async def subscriber(config: Any, changed: Any) -> None:
+        await changes.put((config, changed))
+
+    watcher = ConfigWatcher(interval=0.01)
+    watcher.subscribe(filename, subscriber, tomlio.load)
+    watcher.start()
+    try:
+        tomlio.save(filename, {"111": {"name": "two"}, "222": {"name": "new"}})
+        os.utime(filename, ns=(1, 1))
+        config, changed = await asyncio.wait_for(changes.get(), 5)
+    finally:
+        watcher.stop()
+        await asyncio.sleep(0.01)
+
+    assert changed == {"111", "222"}
+    assert config["111"] == {"name": "two"}
+    assert not watcher.running
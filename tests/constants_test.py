@@ -7,4 +7,5 @@ from eggbot import constants
 def test_path_exists() -> None:
     """Watch for mistakes in path names"""
 
-    assert pathlib.Path(constants.FilePaths.exts).is_dir
+    assert pathlib.Path(constants.FilePaths.exts).is_dir()
+    assert pathlib.Path(constants.FilePaths.modules).is_dir()
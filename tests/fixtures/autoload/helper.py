@@ -0,0 +1,5 @@
+AUTO_LOAD: str = "Helper"
+
+
+class Helper:
+    ...
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Any
+from typing import List
+
+AUTO_LOAD: str = "Valid"
+
+
+class Valid:
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self.messages: List[Any] = []
+
+    def register_commands(self, router: Any) -> None:
+        router.add("valid!run", self.on_message, owner=AUTO_LOAD)
+
+    async def on_message(self, message: Any) -> None:
+        self.messages.append(message)
+
+
+class Slow(Valid):
+    EVENT_TIMEOUT = 0.01
+
+    async def on_message(self, message: Any) -> None:
+        await asyncio.sleep(1)
+        self.messages.append(message)
+
+
+class Broken(Valid):
+    async def on_message(self, message: Any) -> None:
+        raise ValueError(message)
@@ -0,0 +1,40 @@
+"""Tests for utils/hyperloglog.py"""
+import pytest
+
+from eggbot.utils.hyperloglog import HyperLogLog
+
+# Discord IDs are large and close together
+BASE_ID = 835348567271768094
+
+
+def test_small_counts_exact() -> None:
+    """Repeats are not counted, small counts are near exact"""
+    authors = HyperLogLog()
+    for _ in range(3):
+        for offset in range(100):
+            authors.add(BASE_ID + offset)
+
+    assert authors.count() == 100
+    assert HyperLogLog().count() == 0
+
+
+def test_large_count_within_error() -> None:
+    """Estimates of many values are within three standard errors"""
+    authors = HyperLogLog(precision=12)
+    for offset in range(200_000):
+        authors.add(BASE_ID + (offset << 22))
+
+    assert abs(authors.count() - 200_000) <= 200_000 * 3 * authors.error_rate
+
+
+def test_merge_is_union() -> None:
+    """Merged estimators count values seen by either once"""
+    first, second = HyperLogLog(), HyperLogLog()
+    for offset in range(1000):
+        first.add(BASE_ID + offset)
+        second.add(BASE_ID + offset + 500)
+    first.merge(second)
+
+    assert abs(first.count() - 1500) <= 1500 * 3 * first.error_rate
+    with pytest.raises(ValueError):
+        first.merge(HyperLogLog(precision=10))
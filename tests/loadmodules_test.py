@@ -0,0 +1,51 @@
+"""Tests for utils/loadmodules.py"""
+from unittest.mock import Mock
+
+import pytest
+
+from eggbot.utils.commandrouter import CommandRouter
+from eggbot.utils.loadmodules import find_modules
+from eggbot.utils.loadmodules import ModuleClass
+from eggbot.utils.loadmodules import ModuleRunner
+
+MOCK_MODULES = "tests/fixtures/autoload"
+MOCK_MODULE = "tests.fixtures.autoload.module_valid"
+
+
+def test_find_modules() -> None:
+    """Only module_*.py files with an AUTO_LOAD class are found"""
+    assert find_modules(MOCK_MODULES) == [ModuleClass(MOCK_MODULE, "Valid")]
+
+
+def test_load_registers_commands() -> None:
+    """Modules are created with the client and their commands routed"""
+    client, router = Mock(), CommandRouter()
+    runner = ModuleRunner(client, router)
+
+    assert runner.load_all(MOCK_MODULES) == ["Valid"]
+    assert runner.modules["Valid"].client is client
+    assert router.commands() == ["valid!run"]
+    assert router.timeouts["Valid"] == runner.timeout
+    assert not runner.load(ModuleClass(MOCK_MODULE, "Missing"))
+
+    runner.register(client)
+    assert client.add_listener.call_count == 5
+
+    runner.close()
+    assert not router.commands()
+
+
+@pytest.mark.asyncio
+async def test_slow_module_does_not_hold_others() -> None:
+    """Hooks past their timeout or raising are logged, others still run"""
+    runner = ModuleRunner(Mock(), CommandRouter())
+    for name in ("Slow", "Broken", "Valid"):
+        assert runner.load(ModuleClass(MOCK_MODULE, name))
+        # All register their commands as Valid
+        runner.router.remove("Valid")
+
+    await runner.run("on_message", "hello")
+    await runner.run("on_ready")
+
+    assert runner.modules["Valid"].messages == ["hello"]
+    assert not runner.modules["Slow"].messages
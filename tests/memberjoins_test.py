@@ -5,14 +5,22 @@ Author  : Preocts
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/eggbot
 """
+import asyncio
+import os
+from typing import Any
+from typing import Dict
 from typing import Generator
+from typing import List
 from unittest.mock import AsyncMock
 from unittest.mock import Mock
 from unittest.mock import patch
 
 import pytest
+from discord.errors import HTTPException
 
+from eggbot.exts.memberjoins import JoinAction
 from eggbot.exts.memberjoins import MemberJoins
+from eggbot.utils.configwatch import watcher
 
 TEST_CONFIG = "./tests/fixtures/memberjoins.toml"
 
@@ -33,35 +41,62 @@ def fixture_member() -> Mock:
 def fixture_cog() -> Generator[MemberJoins, None, None]:
     """Fixture"""
     with patch.object(MemberJoins, "DEFAULT_CONFIG", TEST_CONFIG):
-        yield MemberJoins()
+        cog = MemberJoins()
+        yield cog
+        cog.cog_unload()
 
 
 def test_read_actions_guild_not_found(cog: MemberJoins) -> None:
     """Attempt to get actions for a guild not in config"""
-    result = cog.get_actions("999")
-    assert not result
+    assert "999" not in cog.actions
+    assert not cog.compile_actions("999", [])
 
 
 def test_read_actions_guild_found(cog: MemberJoins) -> None:
     """Attempt to get actions for a guild, ensure expected exist"""
-    expected_names = ["test01", "test02", "test03"]
-    result = cog.get_actions("111")
-    assert len(result) == 3
+    assert [action["name"] for action in cog.config["111"]] == [
+        "test01",
+        "test02",
+        "test03",
+    ]
+    result = cog.compile_actions("111", cog.config["111"])
+    assert result == cog.actions["111"]
     for action in result:
-        assert action.name in expected_names, action
+        assert isinstance(action, JoinAction), action
+
+
+def test_compiled_actions(cog: MemberJoins) -> None:
+    """Inactive actions dropped, channels parsed, invalid actions skipped"""
+    actions = cog.actions["111"]
+    assert [(action.name, action.channel_id) for action in actions] == [
+        ("test01", 123),
+        ("test02", 0),
+    ]
+
+    config = [
+        {"name": "bad", "channel": "#general", "message": "", "active": True},
+        {"name": "partial"},
+        {"name": "ok", "channel": "", "message": "Hi [MENTION]!", "active": True},
+    ]
+    compiled = cog.compile_actions("999", config)
+    assert [action.name for action in compiled] == ["ok"]
+    assert compiled[0].template.literals == ("Hi ", "!")
 
 
 def test_message_formatter(cog: MemberJoins, member: Mock) -> None:
     """Ensure we create metavalues correctly"""
 
     msg = "-[USERNAME]- has joined [GUILDNAME]"
-    assert cog.format_content(msg, member) == "-Tester01- has joined Test Guild"
+    assert cog.TEMPLATES.render(msg, member) == "-Tester01- has joined Test Guild"
+
+    member.name = "[MENTION]"
+    assert cog.TEMPLATES.render("[USERNAME]", member) == "[MENTION]"
 
 
 def test_all_metadata(cog: MemberJoins, member: Mock) -> None:
     """Step through all metadata config, ensure everything works"""
     for key in cog.METADATA:
-        assert cog.format_content(key, member)
+        assert cog.TEMPLATES.render(key, member)
 
 
 @pytest.mark.asyncio
@@ -72,6 +107,8 @@ async def test_on_join_with_actions_success(cog: MemberJoins, member: Mock) -> N
     send_channel = AsyncMock()
     with patch.multiple(cog, _send_dm=send_dm, _send_channel=send_channel):
         await cog.on_member_join(member)
+        assert cog.dm_queue is not None
+        await cog.dm_queue.join()
         send_channel.assert_called_once()
         send_dm.assert_called_once()
 
@@ -110,7 +147,7 @@ async def test_send_channel(cog: MemberJoins) -> None:
     channel = AsyncMock()
     guild.get_channel = Mock(return_value=channel)
 
-    await cog._send_channel("test", "1", guild)
+    await cog._send_channel("test", 1, guild)
 
     assert channel.send.call_count == 1
 
@@ -121,7 +158,7 @@ async def test_send_channel_fail(cog: MemberJoins) -> None:
     guild = Mock()
     guild.get_channel = Mock(return_value=None)
 
-    await cog._send_channel("test", "1", guild)
+    await cog._send_channel("test", 1, guild)
 
 
 @pytest.mark.asyncio
@@ -144,3 +181,162 @@ async def test_send_dm_fail(cog: MemberJoins) -> None:
     await cog._send_dm("test", member)
 
     assert member.create_dm.call_count == 1
+
+
+def test_config_reload(cog: MemberJoins) -> None:
+    """Config edited on disk replaces the loaded config"""
+    action = {"name": "new", "channel": "1", "message": "Hi", "active": True}
+    cog.on_config_change({"999": [action]}, {"111", "999"})
+    assert "111" not in cog.config
+    assert cog.config["999"] == [action]
+    assert "111" not in cog.actions
+    assert cog.actions["999"][0].channel_id == 1
+
+    cog.cog_unload()
+    assert os.path.abspath(TEST_CONFIG) not in watcher.watches
+
+
+@pytest.mark.asyncio
+async def test_join_burst(cog: MemberJoins, member: Mock) -> None:
+    """Joins over the threshold are welcomed together when the window ends"""
+    action = {
+        "name": "welcome",
+        "channel": "123",
+        "message": "Hi [MENTION]",
+        "active": True,
+        "burst_window": 0.05,
+        "burst_threshold": 2,
+        "burst_message": "[COUNT] joined [GUILDNAME]: [MENTIONS]",
+    }
+    cog.on_config_change({"111": [action]}, {"111"})
+    send_channel = AsyncMock()
+    with patch.object(cog, "_send_channel", send_channel):
+        for idx in range(5):
+            joined = Mock(guild=member.guild, bot=False, mention=f"<@{idx}>")
+            await cog.on_member_join(joined)
+        assert [call.args[0] for call in send_channel.call_args_list] == [
+            "Hi <@0>",
+            "Hi <@1>",
+        ]
+        await asyncio.sleep(0.1)
+
+    assert send_channel.call_args.args[0] == "3 joined Test Guild: <@2>, <@3>, <@4>"
+    assert send_channel.call_args.args[1] == 123
+
+
+def test_render_burst_limit(cog: MemberJoins) -> None:
+    """Mentions that do not fit the message limit are counted instead"""
+    guild = Mock()
+    guild.name = "Test Guild"
+    members = [Mock(mention=f"<@{idx:018}>") for idx in range(200)]
+    template = cog.BURST_TEMPLATES.compile("Welcome [MENTIONS]!")
+
+    content = cog.render_burst(template, guild, members)
+
+    assert len(content) <= cog.MESSAGE_LIMIT
+    assert content.endswith(" more!")
+    assert members[0].mention in content
+
+
+@pytest.mark.asyncio
+async def test_dm_queue_paced(cog: MemberJoins, member: Mock) -> None:
+    """DMs are sent one at a time and dropped when the queue is full"""
+    cog.DM_QUEUE_SIZE = 2
+    cog.DM_INTERVAL = 0
+    send_dm = AsyncMock()
+    with patch.object(cog, "_send_dm", send_dm):
+        for _ in range(3):
+            cog.queue_dm("hello", member)
+        assert cog.dm_queue is not None
+        await cog.dm_queue.join()
+
+    assert send_dm.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_actions_concurrent(cog: MemberJoins, member: Mock) -> None:
+    """Actions run together, dependents wait and skip after a failure"""
+    actions: List[Dict[str, Any]] = [
+        {"name": "slow", "channel": "1", "message": "a", "active": True},
+        {"name": "fails", "channel": "2", "message": "b", "active": True},
+        {"name": "after", "channel": "3", "depends_on": "slow"},
+        {"name": "skip", "channel": "4", "depends_on": "fails"},
+    ]
+    for action in actions[2:]:
+        action.update(message="", active=True)
+    cog.on_config_change({"111": actions}, {"111"})
+    order = []
+
+    async def send(content: str, channel_id: int, guild: Mock) -> None:
+        order.append(channel_id)
+        if channel_id == 1:
+            await asyncio.sleep(0.02)
+        if channel_id == 2:
+            raise RuntimeError("failed")
+
+    with patch.object(cog, "_send_channel", send):
+        await cog.on_member_join(member)
+
+    assert order == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_depends_on_dm_sent(cog: MemberJoins, member: Mock) -> None:
+    """Dependents of a direct message wait for it to be sent, not queued"""
+    actions: List[Dict[str, Any]] = [
+        {"name": "dm", "channel": "", "message": "a", "active": True},
+        {"name": "after", "channel": "1", "depends_on": "dm"},
+    ]
+    actions[1].update(message="b", active=True)
+    cog.on_config_change({"111": actions}, {"111"})
+    cog.DM_INTERVAL = 0
+    order = []
+
+    async def send_dm(content: str, _: Mock) -> None:
+        order.append(content)
+        if len(order) > 1:
+            raise HTTPException(Mock(status=403), "Cannot send")
+
+    async def send(content: str, channel_id: int, guild: Mock) -> None:
+        order.append(content)
+
+    with patch.multiple(cog, _send_dm=send_dm, _send_channel=send):
+        await cog.on_member_join(member)
+        assert order == ["a", "b"]
+        await cog.on_member_join(member)
+    assert order == ["a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_depends_on_burst_sent(cog: MemberJoins, member: Mock) -> None:
+    """Dependents of a join held for a burst wait for the burst message"""
+    actions: List[Dict[str, Any]] = [
+        {"name": "welcome", "channel": "1", "message": "Hi", "active": True},
+        {"name": "after", "channel": "2", "message": "Then", "active": True},
+    ]
+    actions[0].update(burst_window=0.05, burst_threshold=0)
+    actions[1]["depends_on"] = "welcome"
+    cog.on_config_change({"111": actions}, {"111"})
+    send = AsyncMock()
+
+    with patch.object(cog, "_send_channel", send):
+        joined = asyncio.ensure_future(cog.on_member_join(member))
+        await asyncio.sleep(0.01)
+        assert not send.called
+        await joined
+
+    assert [call.args[1] for call in send.call_args_list] == [1, 2]
+
+
+def test_depends_on_must_be_earlier(cog: MemberJoins) -> None:
+    """Dependencies on unknown or later actions are dropped"""
+    config = [
+        {"name": "one", "channel": "1", "message": "", "active": True},
+        {"name": "two", "channel": "2", "message": "", "active": True},
+    ]
+    config[0]["depends_on"] = "two"
+    config[1]["depends_on"] = "one"
+
+    compiled = cog.compile_actions("111", config)
+
+    assert [action.depends_on for action in compiled] == ["", "one"]
@@ -0,0 +1,36 @@
+"""Tests for utils/snowflake.py"""
+from datetime import datetime
+
+from discord import utils
+
+from eggbot.utils.snowflake import is_snowflake
+from eggbot.utils.snowflake import MAX_SNOWFLAKE
+from eggbot.utils.snowflake import snowflake_time
+from eggbot.utils.snowflake import time_snowflake
+
+# Message created 2021-04-24 02:56:58.463 UTC
+MESSAGE_ID = 835348567271768094
+
+
+def test_snowflake_time() -> None:
+    """Times match those discord.py reads from IDs"""
+    assert snowflake_time(MESSAGE_ID) == utils.snowflake_time(MESSAGE_ID)
+    assert snowflake_time(0) == datetime(2015, 1, 1)
+
+
+def test_time_snowflake_bounds() -> None:
+    """IDs made from a time bound the IDs created in that millisecond"""
+    created = snowflake_time(MESSAGE_ID)
+    assert time_snowflake(created) <= MESSAGE_ID <= time_snowflake(created, True)
+    assert time_snowflake(created) == utils.time_snowflake(created)
+    assert snowflake_time(time_snowflake(created, high=True)) == created
+
+
+def test_is_snowflake() -> None:
+    """IDs out of range or from the future are not valid"""
+    now = datetime(2021, 5, 1)
+    assert is_snowflake(MESSAGE_ID, now)
+    assert not is_snowflake(0, now)
+    assert not is_snowflake(-1, now)
+    assert not is_snowflake(MAX_SNOWFLAKE + 1, now)
+    assert not is_snowflake(time_snowflake(datetime(2021, 6, 1)), now)
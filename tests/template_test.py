@@ -0,0 +1,32 @@
+"""Tests for utils/template.py"""
+from operator import attrgetter
+from unittest.mock import Mock
+
+from eggbot.utils.template import TemplateEngine
+
+
+def test_render_only_used_tags() -> None:
+    """Tags in the message are resolved once each, unknown tags kept"""
+    expensive = Mock(return_value="unused")
+    engine = TemplateEngine(
+        {"[NAME]": attrgetter("name"), "[NAMES]": lambda _: "many", "[X]": expensive}
+    )
+    member = Mock()
+    member.name = "Egg [X]"
+
+    result = engine.render("[NAME], [NAMES] [OTHER] [NAME]", member)
+
+    assert result == "Egg [X], many [OTHER] Egg [X]"
+    expensive.assert_not_called()
+
+
+def test_compile_cached() -> None:
+    """Compiled templates are reused by content"""
+    engine = TemplateEngine({"[A]": str})
+    template = engine.compile("a[A]b")
+
+    assert engine.compile("a[A]b") is template
+    assert template.literals == ("a", "b")
+    assert template.render(1) == "a1b"
+    assert engine.compile("plain").render(None) == "plain"
+    assert TemplateEngine({}).render("[A]", None) == "[A]"
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ./modules/module_audit.py
+
+To run these tests from command line use the following:
+    $ python -m pytest -v tests/test_module_audit.py
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+import asyncio
+import csv
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from typing import Any
+from typing import AsyncIterator
+from typing import Generator
+from typing import List
+from unittest.mock import AsyncMock
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+from discord.errors import Forbidden
+from discord.errors import HTTPException
+
+from eggbot.utils.snowflake import snowflake_time
+from modules.auditindex import IndexedMessage
+from modules.module_audit import Audit
+from modules.module_audit import write_csv
+
+# Messages created 2021-04-24 02:56:58 and 2021-04-24 03:46:58 UTC
+START_ID = 835348567271768094
+END_ID = 835361150000000000
+CHANNEL_IDS = itertools.count(1)
+
+
+class History:
+    """Channel history of authors, recording requests in flight"""
+
+    running = 0
+    most_running = 0
+    # Message IDs are unique across channels
+    last_id = START_ID
+
+    def __init__(self, authors: List[Any]) -> None:
+        self.authors = authors
+        self.calls = 0
+
+    async def __call__(self, **kwargs: Any) -> AsyncIterator[Mock]:
+        History.running += 1
+        History.most_running = max(History.most_running, History.running)
+        self.calls += 1
+        try:
+            for author in self.authors:
+                await asyncio.sleep(0.005)
+                if isinstance(author, Exception):
+                    raise author
+                History.last_id += 1
+                yield Mock(id=History.last_id, author=author)
+        finally:
+            History.running -= 1
+
+
+def make_author(author_id: int) -> Mock:
+    """Author with a display name, str, and ID"""
+    author = Mock(id=author_id, display_name=f"Name{author_id}")
+    author.__str__ = Mock(return_value=f"User#{author_id}")  # type: ignore
+    return author
+
+
+def make_channel(name: str, authors: List[Any]) -> Mock:
+    """Text channel with history from authors"""
+    channel = Mock(id=next(CHANNEL_IDS))
+    channel.name = name
+    channel.history = History(authors)
+    return channel
+
+
+@pytest.fixture(scope="function", name="audit")
+def fixture_audit() -> Generator[Audit, None, None]:
+    """Audit with no pacing or retry delay, config in a temp directory"""
+    path = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(path, "audit.json")
+        with open(config_file, "w") as out_file:
+            json.dump({"index-messages": True}, out_file)
+        audit = Audit(Mock(), config_file)
+        audit.pace = 0
+        audit.RETRY_DELAY = 0
+        # Test message IDs are from 2021, keep them all
+        audit.retention = 0
+        yield audit
+        audit.close()
+    finally:
+        shutil.rmtree(path)
+
+
+@pytest.mark.asyncio
+async def test_run_audit_from_ids(audit: Audit) -> None:
+    """Audit times come from message IDs, no messages fetched"""
+    channel = make_channel("general", [make_author(1), make_author(1)])
+    channel.fetch_message = AsyncMock()
+
+    result = await audit.run_audit(channel, START_ID, END_ID)
+
+    assert result is not None
+    assert result.counter == 2
+    assert result.unique_authors() == 1
+    assert result.counts[1].messages == 2
+    assert result.counts[1].display_name == "Name1"
+    assert result.start.isoformat().startswith("2021-04-24T02:56:58")
+    assert result.end is not None and result.end > result.start
+    channel.fetch_message.assert_not_called()
+    assert await audit.run_audit(channel, 2 ** 64, None) is None
+
+
+@pytest.mark.asyncio
+async def test_audit_reads_only_gaps(audit: Audit) -> None:
+    """Ranges audited before are counted from the index"""
+    channel = make_channel("general", [make_author(1), make_author(2)])
+    first = await audit.run_audit(channel, START_ID, END_ID)
+    assert channel.history.calls == 1
+
+    second = await audit.run_audit(channel, START_ID, END_ID)
+    assert channel.history.calls == 1
+    assert second == first
+
+    await audit.run_audit(channel, START_ID - 10, END_ID)
+    assert channel.history.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_audit_without_index(audit: Audit) -> None:
+    """Audits read all history when the index is off"""
+    audit.index = None
+    channel = make_channel("general", [make_author(1), make_author(2)])
+    await audit.run_audit(channel, START_ID, END_ID)
+    result = await audit.run_audit(channel, START_ID, END_ID)
+
+    assert result is not None and result.counter == 2
+    assert channel.history.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_guild_audit(audit: Audit) -> None:
+    """Channels audited concurrently to the limit, failures left out"""
+    audit.concurrency = 2
+    response = Mock(status=500, reason="Server Error")
+    channels = [
+        make_channel("one", [make_author(1), make_author(2)]),
+        make_channel("two", [make_author(2), make_author(3)]),
+        make_channel("three", [make_author(4)]),
+        make_channel("hidden", [Forbidden(Mock(status=403), "Missing Access")]),
+        make_channel("down", [HTTPException(response, "Server Error")]),
+    ]
+    guild = Mock(id=111)
+    guild.name = "Test Guild"
+    History.most_running = 0
+
+    result = await audit.run_guild_audit(guild, channels, START_ID, None)
+
+    assert result is not None
+    assert result.channel == "Test Guild"
+    assert result.counter == 5
+    assert result.unique_authors() == 4
+    assert result.counts[2].messages == 2
+    assert History.most_running == 2
+
+
+@pytest.mark.asyncio
+async def test_authors_by_id(audit: Audit) -> None:
+    """Authors who change nickname are counted once"""
+    audit.index = None
+    renamed = make_author(1)
+    channel = make_channel("general", [renamed, make_author(1), make_author(2)])
+    renamed.display_name = "Renamed"
+
+    result = await audit.run_audit(channel, START_ID, END_ID)
+
+    assert result is not None
+    assert result.unique_authors() == 2
+    assert result.counts[1].messages == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_index", (True, False))
+async def test_approximate_authors(audit: Audit, use_index: bool) -> None:
+    """Approximate audits estimate unique authors without keeping them"""
+    audit.approximate = True
+    if not use_index:
+        audit.index = None
+    channels = [
+        make_channel("one", [make_author(1), make_author(2)]),
+        make_channel("two", [make_author(2), make_author(3)]),
+    ]
+    guild = Mock(id=111)
+    guild.name = "Test Guild"
+
+    result = await audit.run_guild_audit(guild, channels, START_ID, None)
+
+    assert result is not None
+    assert result.counter == 4
+    assert not result.counts
+    assert result.unique_authors() == 3
+    assert "about 3 unique authors" in audit.format_results(result)
+
+
+@pytest.mark.asyncio
+async def test_results_csv(audit: Audit) -> None:
+    """Authors written to CSV with counts, most messages first"""
+    channel = make_channel("general", [make_author(1), make_author(2)] * 2)
+    channel.history.authors.append(make_author(2))
+    result = await audit.run_audit(channel, START_ID, END_ID)
+    assert result is not None
+
+    filename = write_csv(result)
+    try:
+        with open(filename, encoding="utf-8", newline="") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+    finally:
+        os.remove(filename)
+
+    assert [row["author_id"] for row in rows] == ["2", "1"]
+    assert rows[0]["messages"] == "3"
+    assert rows[0]["display_name"] == "Name2"
+    assert rows[0]["first_seen"] <= rows[0]["last_seen"]
+
+
+@pytest.mark.asyncio
+async def test_index_live_every_message(audit: Audit) -> None:
+    """Live messages from bots and commands are indexed, no range is missed"""
+    assert audit.index is not None
+    audit.index_live = True
+    channel = make_channel("general", [])
+    channel.type = "text"
+    bot = make_author(3)
+    bot.bot = True
+    for msg_id, author in ((START_ID, make_author(1)), (END_ID, bot)):
+        await audit.on_any_message(Mock(id=msg_id, author=author, channel=channel))
+
+    assert audit.index.gaps(channel.id, START_ID, END_ID) == []
+    counts = audit.index.author_counts(channel.id, START_ID, END_ID)
+    assert [count.author_id for count in counts] == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_index_opt_in_and_pruned(audit: Audit) -> None:
+    """Index is off by default, old messages are pruned once an interval"""
+    path = os.path.dirname(str(audit.config.filename))
+    default = Audit(Mock(), os.path.join(path, "other.json"))
+    assert default.index is None
+    assert await default.prune_index() == 0
+
+    assert audit.index is not None
+    audit.index.add_messages(1, [IndexedMessage(START_ID, 1, "User#1", "Name1")])
+    audit.index.add_messages(1, [IndexedMessage(END_ID, 2, "User#2", "Name2")])
+    audit.retention = 1
+    now = snowflake_time(END_ID) + timedelta(days=1, minutes=-10)
+    assert await audit.prune_index(now) == 1
+    audit.index.add_messages(1, [IndexedMessage(START_ID, 1, "User#1", "Name1")])
+    assert await audit.prune_index(now + timedelta(minutes=1)) == 0
+    assert await audit.prune_index(now + audit.PRUNE_INTERVAL) == 2
+
+    audit.close()
+    assert audit.index is None
+
+
+def test_readable_channels() -> None:
+    """Channels without history permission are skipped"""
+    guild = Mock()
+    readable = Mock()
+    readable.permissions_for.return_value = Mock(
+        read_messages=True, read_message_history=True
+    )
+    hidden = Mock()
+    hidden.permissions_for.return_value = Mock(
+        read_messages=True, read_message_history=False
+    )
+    guild.text_channels = [readable, hidden]
+
+    assert Audit._get_readable_channels(guild) == [readable]  # pylint: disable=W0212
+
+
+def make_message(content: str, channel: Mock) -> Mock:
+    """Command message sent in channel, replies have IDs"""
+    message = Mock(content=content, channel=channel, guild=Mock(id=111))
+    channel.send = AsyncMock(return_value=Mock(id=next(CHANNEL_IDS)))
+    channel.get_partial_message.return_value.edit = AsyncMock()
+    return message
+
+
+@pytest.mark.asyncio
+async def test_audit_job_posts_results(audit: Audit) -> None:
+    """Audit commands start a job which reports its progress and results"""
+    channel = make_channel("general", [make_author(1), make_author(2)])
+    audit.client.get_channel.return_value = channel
+    message = make_message(f"audit!here {START_ID} {END_ID}", channel)
+
+    job = await audit.audit_here(message)
+    assert job is not None and job.state == "running"
+    await audit._tasks[job.job_id]  # pylint: disable=W0212
+
+    assert job.state == "done"
+    assert job.read == 2
+    assert str(channel.id) in job.checkpoints
+    assert "2 unique authors" in channel.send.call_args.args[0]
+    assert channel.send.call_args.kwargs["file"].filename.endswith(".csv")
+    edit = channel.get_partial_message.return_value.edit
+    assert "done, 2 messages read" in edit.call_args.kwargs["content"]
+    assert not audit._tasks  # pylint: disable=W0212
+
+    resume = make_message(f"audit!resume {job.job_id}", channel)
+    await audit.resume_job(resume)
+    assert job.state == "done"
+    assert not audit._tasks  # pylint: disable=W0212
+    assert "only failed or cancelled" in channel.send.call_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_audit_job_unexpected_error(audit: Audit) -> None:
+    """Unexpected errors fail the job, which is saved and can be resumed"""
+    channel = make_channel("general", [make_author(1)])
+    audit.client.get_channel.return_value = channel
+    with patch.object(audit, "run_audit", side_effect=KeyError("boom")):
+        job = await audit.audit_here(make_message(f"audit!here {START_ID}", channel))
+        assert job is not None
+        await audit._tasks[job.job_id]  # pylint: disable=W0212
+
+    assert job.state == "failed"
+    assert "boom" in job.error
+    assert audit.jobs.get(job.job_id).state == "failed"  # type: ignore
+    assert not audit._tasks  # pylint: disable=W0212
+
+
+@pytest.mark.asyncio
+async def test_audit_job_cancel_and_resume(audit: Audit) -> None:
+    """Cancelled jobs are kept, and resume after a restart when running"""
+    channel = make_channel("general", [make_author(1)] * 3)
+    audit.client.get_channel.return_value = channel
+    job = await audit.audit_here(make_message(f"audit!here {START_ID}", channel))
+    assert job is not None
+
+    task = audit._tasks[job.job_id]  # pylint: disable=W0212
+    await audit.cancel_job(make_message(f"audit!cancel {job.job_id}", channel))
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert job.state == "cancelled"
+    assert not audit._tasks  # pylint: disable=W0212
+
+    await audit.resume_job(make_message(f"audit!resume {job.job_id}", channel))
+    assert job.state == "running"
+    audit._tasks[job.job_id].cancel()  # pylint: disable=W0212
+    await asyncio.sleep(0)
+    job.state = "running"
+    audit.jobs.update(job)
+    await audit.jobs.save()
+
+    restarted = Audit(audit.client, str(audit.config.filename))
+    assert [j.job_id for j in restarted.jobs.running()] == [job.job_id]
+    await restarted.on_ready()
+    await restarted._tasks[job.job_id]  # pylint: disable=W0212
+    assert restarted.jobs.get(job.job_id).state == "done"  # type: ignore
+    restarted.close()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ./modules/auditindex.py
+
+To run these tests from command line use the following:
+    $ python -m pytest -v tests/test_module_auditindex.py
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+import os
+import shutil
+import tempfile
+from typing import Generator
+
+import pytest
+
+from modules.auditindex import IndexedMessage
+from modules.auditindex import MessageIndex
+
+
+@pytest.fixture(scope="function", name="index")
+def fixture_index() -> Generator[MessageIndex, None, None]:
+    """Index in a temp directory"""
+    path = tempfile.mkdtemp()
+    try:
+        index = MessageIndex(os.path.join(path, "audit.index"))
+        yield index
+        index.close()
+    finally:
+        shutil.rmtree(path)
+
+
+def test_coverage_gaps(index: MessageIndex) -> None:
+    """Touching and overlapping ranges merge, gaps are what is left"""
+    index.add_coverage(1, 10, 19)
+    index.add_coverage(1, 20, 29)
+    index.add_coverage(1, 50, 59)
+    index.add_coverage(1, 55, 70)
+    index.add_coverage(2, 0, 100)
+
+    assert index.gaps(1, 0, 100) == [(0, 9), (30, 49), (71, 100)]
+    assert index.gaps(1, 12, 25) == []
+    assert index.gaps(1, 25, 55) == [(30, 49)]
+
+    index.add_coverage(1, 0, 100)
+    assert index.gaps(1, 0, 100) == []
+
+
+def test_author_counts(index: MessageIndex) -> None:
+    """Messages counted by author in range, with latest names"""
+    index.add_messages(
+        1,
+        [
+            IndexedMessage(10, 100, "Egg#1", "Egg"),
+            IndexedMessage(11, 200, "Bird#2", "Bird"),
+            IndexedMessage(12, 100, "Egg#1", "Yolk"),
+            IndexedMessage(13, 100, "Egg#1", "Yolk"),
+        ],
+    )
+    index.add_messages(2, [IndexedMessage(14, 100, "Egg#1", "Yolk")])
+
+    counts = index.author_counts(1, 11, 20)
+
+    assert [(row.author_id, row.display_name, row.messages) for row in counts] == [
+        (100, "Yolk", 2),
+        (200, "Bird", 1),
+    ]
+    assert (counts[0].first_id, counts[0].last_id) == (12, 13)
+
+
+def test_prune(index: MessageIndex) -> None:
+    """Messages and coverage before the cutoff go, as do their only authors"""
+    index.add_messages(1, [IndexedMessage(10, 100, "Egg#1", "Egg")])
+    index.add_messages(1, [IndexedMessage(30, 200, "Bird#2", "Bird")])
+    index.add_coverage(1, 5, 12)
+    index.add_coverage(1, 18, 40)
+
+    assert index.prune(20) == 1
+
+    assert index.gaps(1, 0, 40) == [(0, 19)]
+    counts = index.author_counts(1, 0, 40)
+    assert [row.author_id for row in counts] == [200]
+    assert index.prune(20) == 0
@@ -9,6 +9,8 @@ Author  : Preocts <preocts@preocts.com>
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/Egg_Bot
 """
+import pathlib
+import shutil
 from collections import namedtuple
 from typing import Generator
 from typing import List
@@ -19,6 +21,7 @@ from unittest.mock import patch
 import discord
 import pytest
 
+from eggbot.utils.commandrouter import CommandRouter
 from modules.module_chatkudos import ChatKudos
 from modules.module_chatkudos import COMMAND_CONFIG
 from modules.module_chatkudos import Kudos
@@ -27,12 +30,16 @@ from modules.module_chatkudos import MODULE_VERSION
 
 
 @pytest.fixture(scope="function", name="kudos")
-def fixture_kudos() -> Generator[ChatKudos, None, None]:
-    """Fixture"""
-    kudos = ChatKudos(discord.Client(), "./tests/fixtures/mock_chatkudos.json")
+def fixture_kudos(tmp_path: pathlib.Path) -> Generator[ChatKudos, None, None]:
+    """Fixture, a copy of the config as lazy loading writes an index beside it"""
+    filename = str(tmp_path / "mock_chatkudos.json")
+    shutil.copyfile("./tests/fixtures/mock_chatkudos.json", filename)
+    kudos = ChatKudos(discord.Client(), filename)
     # disable writing to the fixture file
-    with patch.object(kudos.config, "save"):
-        yield kudos
+    with patch.object(kudos.config, "save"), patch.object(kudos.scorefile, "save"):
+        with patch.object(kudos.config, "save_async"):
+            with patch.object(kudos.scorefile, "save_async"):
+                yield kudos
 
 
 @pytest.fixture(scope="function", name="message")
@@ -108,6 +115,24 @@ def test_load_guild_not_found(kudos: ChatKudos) -> None:
     assert not result.users
 
 
+def test_guild_models_bounded(kudos: ChatKudos) -> None:
+    """Models of the least recently used guilds are dropped and rebuilt"""
+    kudos.cache_size = 2
+    kudos.save_guild("555", max=5)
+    kudos.get_history("555").record("1", 3)
+    kudos.save_guild("555", history=kudos.get_history("555").as_dict())
+    for guild_id in ("666", "777"):
+        kudos.save_guild(guild_id, max=1)
+        kudos.get_history(guild_id)
+
+    assert list(kudos.guilds) == ["666", "777"]
+    assert list(kudos.history) == ["666", "777"]
+    assert kudos.get_guild("555").max == 5
+    assert kudos.get_history("555").as_dict() == kudos.get_guild("555").history
+    assert kudos.get_history("555").window("week") == {"1": 3}
+    assert list(kudos.guilds) == ["777", "555"]
+
+
 def test_save_guild_exists(kudos: ChatKudos) -> None:
     """Save explict changes, confirm existing don't change"""
     kudos.save_guild("111", max=-1, gain_message="TEST")
@@ -128,6 +153,46 @@ def test_save_guild_not_exists(kudos: ChatKudos) -> None:
     assert kudos.get_guild("999").loss_message == "TEST02"
 
 
+def test_scores_moved_to_sidecar(kudos: ChatKudos) -> None:
+    """Scores found in config load into table and are not saved back to config"""
+    assert dict(kudos.get_guild("111").scores) == {"123": 39, "111": -38}
+
+    kudos.save_guild("111", max=3)
+
+    assert "scores" not in kudos.config.read("111")
+    assert kudos.get_guild("111").scores["123"] == 39
+
+
+@pytest.mark.asyncio
+async def test_save_only_changed(kudos: ChatKudos, message: Mock) -> None:
+    """Score sidecar is only written after scores change"""
+    message.content = "kudos!max 3"
+    kudos.parse_command(message)
+    kudos.scorefile.changed.clear()
+
+    with patch.object(kudos.scorefile, "save_async") as save_scores:
+        await kudos.save_async()
+        save_scores.assert_not_called()
+
+        kudos.apply_kudos("111", [Kudos("222", "Tester02", 3, 0)])
+        await kudos.save_async()
+        save_scores.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_scores_saved_before_config(kudos: ChatKudos) -> None:
+    """Config, which drops legacy scores, is not saved if the scores fail"""
+    kudos.apply_kudos("111", [Kudos("222", "Tester02", 3, 0)])
+    with patch.object(kudos.scorefile, "save_async", return_value=False):
+        with patch.object(kudos.config, "save_async") as config_save:
+            assert not await kudos.save_async()
+            config_save.assert_not_called()
+            assert kudos.scorefile.changed == {"111"}
+
+            await kudos.save_async()
+            config_save.assert_not_called()
+
+
 def test_adjust_max(kudos: ChatKudos, message: Mock) -> None:
     """Change max for existing and non-existing guild"""
     message.content = "kudos!max 10"
@@ -262,6 +327,19 @@ def test_board_limited(kudos: ChatKudos, message: Mock) -> None:
     assert "Tester02" not in result
 
 
+def test_board_window(kudos: ChatKudos, message: Mock) -> None:
+    """Print the weekly board from recorded history, not lifetime scores"""
+    kudos.apply_kudos("111", [Kudos("222", "Tester02", 3, 0)])
+    message.content = "kudos!board week 5"
+    message.guild.get_member.side_effect = None
+    message.guild.get_member.return_value = Mock(display_name="Tester02")
+
+    result = kudos.parse_command(message)
+    assert "Top 5 ChatKudos holders this week:" in result
+    assert "    3 | Tester02" in result
+    assert "39" not in result
+
+
 def test_find_kudos(kudos: ChatKudos, message: Mock) -> None:
     """Return the accurate Kudos count for messages"""
     message.content = "<#!111> ++-++-++ <!222#> just kidding"
@@ -306,14 +384,20 @@ async def test_onmessage_kudos(kudos: ChatKudos, async_message: AsyncMock) -> No
 
 
 @pytest.mark.asyncio
-async def test_onmessage_command(kudos: ChatKudos, async_message: AsyncMock) -> None:
-    """Give a command, ensure we hit the command path"""
+async def test_routed_command(kudos: ChatKudos, async_message: AsyncMock) -> None:
+    """Commands reach the module through the router, for allowed authors"""
+    router = CommandRouter()
+    kudos.register_commands(router)
     async_message.content = "kudos!help"
 
-    await kudos.on_message(async_message)
-
+    assert await router.dispatch(async_message)
+    await router.join()
     async_message.channel.send.assert_called_once()
 
+    async_message.author.id = 999
+    assert not await router.dispatch(async_message)
+    assert router.commands(MODULE_NAME) == sorted(COMMAND_CONFIG)
+
 
 def test_is_command_allowed(kudos: ChatKudos, message: Mock) -> None:
     """Case checks for accessing commands"""
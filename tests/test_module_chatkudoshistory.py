@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ./modules/chatkudoshistory.py
+
+To run these tests from command line use the following:
+    $ python -m pytest -v tests/test_module_chatkudoshistory.py
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+from typing import Dict
+
+from modules.chatkudoshistory import DAILY_RETENTION
+from modules.chatkudoshistory import KudosHistory
+from modules.chatkudoshistory import month_label
+from modules.chatkudoshistory import MONTHLY_RETENTION
+
+TODAY = 20_000
+
+
+def test_record_into_windows() -> None:
+    """Recording updates the daily bucket and every window"""
+    history = KudosHistory(today=TODAY)
+    history.record("111", 3, TODAY)
+    history.record("111", -1, TODAY)
+    history.record("222", 5, TODAY)
+
+    assert history.daily[str(TODAY)] == {"111": 2, "222": 5}
+    assert history.window("week", TODAY) == {"111": 2, "222": 5}
+    assert history.window("month", TODAY) == {"111": 2, "222": 5}
+
+
+def test_window_expires_buckets() -> None:
+    """Buckets leave the week before the month, totals adjust without rescan"""
+    history = KudosHistory(today=TODAY)
+    history.record("111", 3, TODAY)
+    history.record("111", 2, TODAY + 3)
+
+    assert history.window("week", TODAY + 6) == {"111": 5}
+    assert history.window("week", TODAY + 7) == {"111": 2}
+    assert history.window("month", TODAY + 7) == {"111": 5}
+    assert history.window("week", TODAY + 10) == {}
+    assert history.window("month", TODAY + 30) == {"111": 2}
+    assert history.window("month", TODAY + 40) == {}
+
+
+def test_load_from_stored_history() -> None:
+    """Window totals are computed from stored daily buckets"""
+    stored: Dict[str, Dict[str, Dict[str, int]]] = {
+        "daily": {
+            str(TODAY): {"111": 1},
+            str(TODAY - 10): {"111": 4, "222": 2},
+        },
+        "monthly": {},
+    }
+    history = KudosHistory(stored, TODAY)
+
+    assert history.window("week", TODAY) == {"111": 1}
+    assert history.window("month", TODAY) == {"111": 5, "222": 2}
+
+
+def test_downsample_to_monthly() -> None:
+    """Old daily buckets fold into monthly, monthly is bounded"""
+    history = KudosHistory(today=TODAY)
+    history.record("111", 3, TODAY)
+    history.record("111", 4, TODAY + 1)
+    history.advance(TODAY + DAILY_RETENTION + 1)
+
+    assert not history.daily
+    assert history.monthly == {month_label(TODAY): {"111": 7}}
+
+    history.monthly.update({f"1999-{idx:02}": {"111": 1} for idx in range(1, 13)})
+    history.monthly.update({f"2000-{idx:02}": {"111": 1} for idx in range(1, 13)})
+    history.advance(TODAY + DAILY_RETENTION + 2)
+
+    assert len(history.monthly) == MONTHLY_RETENTION
+    assert month_label(TODAY) in history.monthly
+    assert "1999-01" not in history.monthly
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ./modules/chatkudosscores.py
+
+To run these tests from command line use the following:
+    $ python -m pytest -v tests/test_module_chatkudosscores.py
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from typing import AbstractSet
+from typing import Dict
+from typing import Generator
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+
+from modules.chatkudosscores import ScoreFile
+from modules.chatkudosscores import ScoreTable
+
+SNOWFLAKE = "123151368885239809"
+
+
+@pytest.fixture(scope="function", name="score_path")
+def fixture_score_path() -> Generator[str, None, None]:
+    """Creates a file to save into, in a directory for its lock file"""
+    path = tempfile.mkdtemp()
+    try:
+        file_path = os.path.join(path, "chatkudos.scores")
+        open(file_path, "wb").close()
+        yield file_path
+    finally:
+        shutil.rmtree(path)
+
+
+def test_table_mapping() -> None:
+    """Table acts as a dict of str user ID to int score"""
+    table = ScoreTable({"222": 5, "111": -3})
+    table[SNOWFLAKE] = 1
+    table["111"] += 1
+
+    assert list(table) == ["111", "222", SNOWFLAKE]
+    assert table["111"] == -2
+    assert table.get("999", 0) == 0
+    assert "not-an-id" not in table
+    assert len(table) == 3
+    assert table.nbytes == 48
+
+    del table["222"]
+    assert dict(table) == {"111": -2, SNOWFLAKE: 1}
+    with pytest.raises(KeyError):
+        del table["222"]
+
+
+def test_table_invalid_id() -> None:
+    """Only unsigned 64-bit integer IDs can be stored"""
+    table = ScoreTable()
+    with pytest.raises(ValueError):
+        table["-1"] = 1
+    with pytest.raises(ValueError):
+        table["Tester"] = 1
+
+
+def test_save_and_load(score_path: str) -> None:
+    """Round trip tables through the sidecar, empty tables skipped"""
+    scorefile = ScoreFile(score_path)
+    tables = {
+        "111": ScoreTable({"222": 5, SNOWFLAKE: -9}),
+        "999": ScoreTable(),
+    }
+
+    assert scorefile.save(tables)
+    result = scorefile.load()
+
+    assert list(result) == ["111"]
+    assert dict(result["111"]) == {"222": 5, SNOWFLAKE: -9}
+
+
+def test_failed_save_keeps_file(score_path: str) -> None:
+    """A save that fails to write leaves the last saved file whole"""
+    scorefile = ScoreFile(score_path)
+    assert scorefile.save({"111": ScoreTable({"222": 5})})
+
+    with patch("os.replace", side_effect=OSError("disk full")):
+        assert not scorefile.save({"111": ScoreTable({"222": 6, "333": 1})})
+
+    assert dict(scorefile.load()["111"]) == {"222": 5}
+    # No temp file left behind
+    assert sorted(os.listdir(os.path.dirname(score_path))) == [
+        "chatkudos.scores",
+        "chatkudos.scores.lock",
+    ]
+
+
+def test_merge_modes() -> None:
+    """Batches merge into existing and new users by mode"""
+    table = ScoreTable({"111": 5, "333": 1})
+
+    assert table.merge([("111", 2), ("222", 3), ("222", 1)], "add") == 1
+    assert dict(table) == {"111": 7, "222": 4, "333": 1}
+
+    table.merge([("111", 1), ("333", 9), ("444", 2)], "max")
+    assert dict(table) == {"111": 7, "222": 4, "333": 9, "444": 2}
+
+    table.merge([("111", 1), ("050", 6)], "replace")
+    assert list(table) == ["50", "111", "222", "333", "444"]
+    assert table["111"] == 1
+
+
+def test_iter_scores_batched(score_path: str) -> None:
+    """Stream one guild, or all, in small batches"""
+    scorefile = ScoreFile(score_path)
+    scorefile.save(
+        {
+            "111": ScoreTable({str(idx): idx * -1 for idx in range(1, 6)}),
+            "222": ScoreTable({"9": 9}),
+        }
+    )
+
+    result = list(scorefile.iter_scores("111", batch_size=2))
+    assert result == [("111", str(idx), idx * -1) for idx in range(1, 6)]
+
+    result = list(scorefile.iter_scores(batch_size=3))
+    assert len(result) == 6
+    assert result[-1] == ("222", "9", 9)
+
+
+def test_load_missing_or_invalid(score_path: str) -> None:
+    """Missing or invalid files load as empty"""
+    assert ScoreFile("./8675309_call_now/nofile.scores").load() == {}
+
+    with open(score_path, "wb") as out_file:
+        out_file.write(b"not a score file at all")
+
+    assert ScoreFile(score_path).load() == {}
+
+
+@pytest.mark.asyncio
+async def test_save_async_one_write_in_flight(score_path: str) -> None:
+    """Overlapping saves run one at a time and coalesce, newest tables win"""
+    scorefile = ScoreFile(score_path)
+    running, most_running, saved = 0, 0, []
+    real_save = scorefile.save_changed
+
+    def save(tables: Dict[str, ScoreTable], changed: AbstractSet[str]) -> bool:
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        time.sleep(0.01)
+        saved.append(tables["111"]["222"])
+        running -= 1
+        return real_save(tables, changed)
+
+    tables = {"111": ScoreTable()}
+
+    async def change(score: int) -> bool:
+        tables["111"]["222"] = score
+        scorefile.changed.add("111")
+        return await scorefile.save_async(tables)
+
+    with patch.object(scorefile, "save_changed", side_effect=save):
+        results = await asyncio.gather(*(change(n) for n in range(5)))
+
+    assert all(results)
+    assert most_running == 1
+    assert saved[-1] == 4 and len(saved) < 5
+    assert dict(scorefile.load()["111"]) == {"222": 4}
+
+
+@pytest.mark.asyncio
+async def test_save_async_changed_guilds(score_path: str) -> None:
+    """Only changed guilds are copied, others are kept from the file"""
+    scorefile = ScoreFile(score_path)
+    assert scorefile.save(
+        {"111": ScoreTable({"1": 1}), "222": ScoreTable({"2": 2, "3": 3})}
+    )
+    tables = scorefile.load()
+    tables["111"]["1"] = 10
+    tables["333"] = ScoreTable({"4": 4})
+    tables["222"] = Mock(copy=Mock(side_effect=AssertionError("copied")))
+    scorefile.changed.update({"111", "333"})
+
+    assert await scorefile.save_async(tables)
+    assert not scorefile.changed
+    saved = scorefile.load()
+    assert {key: dict(table) for key, table in saved.items()} == {
+        "111": {"1": 10},
+        "222": {"2": 2, "3": 3},
+        "333": {"4": 4},
+    }
+
+    scorefile.changed.add("111")
+    with patch("modules.chatkudosscores.atomic_write", side_effect=OSError):
+        assert not await scorefile.save_async({})
+    assert scorefile.changed == {"111"}
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ./modules/chatkudostransfer.py
+
+To run these tests from command line use the following:
+    $ python -m pytest -v tests/test_module_chatkudostransfer.py
+
+Author  : Preocts <preocts@preocts.com>
+Discord : Preocts#8196
+Git Repo: https://github.com/Preocts/Egg_Bot
+"""
+import json
+import os
+import shutil
+import tempfile
+from typing import Generator
+
+import pytest
+
+from modules import chatkudostransfer
+from modules.chatkudosscores import ScoreTable
+
+FIXTURE = "./tests/fixtures/mock_chatkudos.json"
+
+
+@pytest.fixture(scope="function", name="workdir")
+def fixture_workdir() -> Generator[str, None, None]:
+    """Temp directory with a copy of the ChatKudos fixture config"""
+    path = tempfile.mkdtemp()
+    try:
+        shutil.copy(FIXTURE, os.path.join(path, "chatkudos.json"))
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+def test_export_legacy_scores_csv(workdir: str) -> None:
+    """Scores only found in JSON config are exported"""
+    config = os.path.join(workdir, "chatkudos.json")
+    out_path = os.path.join(workdir, "out.csv")
+
+    assert chatkudostransfer.main(["export", out_path, "--config", config]) == 0
+
+    with open(out_path, "r", encoding="utf-8") as in_file:
+        lines = in_file.read().splitlines()
+    assert lines == ["guild_id,user_id,score", "111,123,39", "111,111,-38"]
+
+
+def test_import_merge_and_export_jsonl(workdir: str) -> None:
+    """Import into sidecar by mode, seeded from JSON config, then export a guild"""
+    config = os.path.join(workdir, "chatkudos.json")
+    in_path = os.path.join(workdir, "in.jsonl")
+    out_path = os.path.join(workdir, "out.jsonl")
+    rows = [
+        {"guild_id": "111", "user_id": "123", "score": 1},
+        {"guild_id": "111", "user_id": "555", "score": 5},
+        {"guild_id": "999", "user_id": "123", "score": 7},
+    ]
+    with open(in_path, "w", encoding="utf-8") as out_file:
+        out_file.write("\n".join(json.dumps(row) for row in rows))
+
+    args = ["import", in_path, "--config", config, "--mode", "add", "--batch", "2"]
+    assert chatkudostransfer.main(args) == 0
+
+    tables = chatkudostransfer.scorefile_for(config).load()
+    assert dict(tables["111"]) == {"111": -38, "123": 40, "555": 5}
+    assert dict(tables["999"]) == {"123": 7}
+
+    args = ["export", out_path, "--config", config, "--guild", "999"]
+    assert chatkudostransfer.main(args) == 0
+    with open(out_path, "r", encoding="utf-8") as in_file:
+        result = [json.loads(line) for line in in_file]
+    assert result == [{"guild_id": "999", "user_id": "123", "score": 7}]
+
+
+def test_import_guild_filter(workdir: str) -> None:
+    """Only rows for the given guild are applied"""
+    config = os.path.join(workdir, "chatkudos.json")
+    rows = iter([("111", "1", 1), ("222", "1", 1)])
+
+    assert chatkudostransfer.import_rows(rows, config, "max", "222") == 1
+
+    tables = chatkudostransfer.scorefile_for(config).load()
+    assert list(tables) == ["222"]
+    assert isinstance(tables["222"], ScoreTable)
+
+
+@pytest.mark.parametrize(
+    ("content", "line"),
+    (
+        ("guild_id,user_id,score\n111,1,1\nmy guild,2,2\n", "Line 3"),
+        ("guild_id,user_id,score\n111,1,1\n111,2\n", "Line 3"),
+        ('{"guild_id": "111", "user_id": "1", "score": 1}\n{"guild_id": -5}', "Line 2"),
+        ('{"guild_id": "111", "user_id": "1", "score": "x"}\n', "Line 1"),
+        ("[1, 2, 3]\n", "Line 1"),
+    ),
+)
+def test_import_invalid_row(
+    workdir: str, content: str, line: str, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Invalid rows stop the import, report their line, and nothing is saved"""
+    config = os.path.join(workdir, "chatkudos.json")
+    file_format = "csv" if content.startswith("guild_id") else "jsonl"
+    in_path = os.path.join(workdir, f"in.{file_format}")
+    with open(in_path, "w", encoding="utf-8") as out_file:
+        out_file.write(content)
+
+    assert chatkudostransfer.main(["import", in_path, "--config", config]) == 1
+
+    assert line in caplog.text
+    assert not os.path.exists(chatkudostransfer.scorefile_for(config).filename)
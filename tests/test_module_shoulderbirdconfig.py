@@ -5,23 +5,35 @@ Unit tests for ShoulderBird config module
 To run these tests from command line use the following:
     $ python -m pytest -v testes/test_module_shoulderbirdconfig.py
 
-These tests create and destroy their own mock config file within
-`./tests/fixtures` for validation.
+These tests create and destroy their own mock config file within a
+temporary directory for validation.
 
 Author  : Preocts <preocts@preocts.com>
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/Egg_Bot
 """
 import os
+import shutil
+import tempfile
 from typing import Optional
 
+import pytest
+
+from eggbot.utils.configwatch import ConfigWatcher
+from modules.shoulderbirdconfig import BirdMember
 from modules.shoulderbirdconfig import ShoulderBirdConfig
 
-MOCK_CONFIG = "tests/fixtures/mock_shoulderbird.json"
+MOCK_DIR = tempfile.mkdtemp()
+MOCK_CONFIG = os.path.join(MOCK_DIR, "mock_shoulderbird.json")
 MOCK_GUILD_ID = "9876543210"
 MOCK_MEMBER_ID = "0123456789"
 
 
+def teardown_module() -> None:
+    """Remove the mock config with its lock file"""
+    shutil.rmtree(MOCK_DIR)
+
+
 class TestShoulderBirdConfig:
     """Test suite"""
 
@@ -100,3 +112,31 @@ class TestShoulderBirdConfig:
         for config in configs:
             assert config.regex == "multi-test"
         self.parser.reload_config()
+
+
+@pytest.mark.asyncio
+async def test_watch_applies_changes_on_disk() -> None:
+    """Members edited in the file are read after the watcher finds them"""
+    filename = os.path.join(MOCK_DIR, "mock_watched.json")
+    watcher = ConfigWatcher()
+    parser = ShoulderBirdConfig(filename, watcher)
+    parser.save_member(MOCK_GUILD_ID, MOCK_MEMBER_ID, regex="before")
+    assert parser.save_config()
+
+    other = ShoulderBirdConfig(filename)
+    other.save_member(MOCK_GUILD_ID, MOCK_MEMBER_ID, regex="after")
+    assert other.save_config()
+    await watcher.check()
+    assert parser.load_member(MOCK_GUILD_ID, MOCK_MEMBER_ID).regex == "after"
+
+    parser.close()
+    assert not watcher.watches
+
+
+def test_member_missing_fields() -> None:
+    """Members edited by hand without every field load with defaults"""
+    member = BirdMember.from_dict(MOCK_GUILD_ID, MOCK_MEMBER_ID, {"regex": "egg"})
+    assert (member.guild_id, member.member_id) == (MOCK_GUILD_ID, MOCK_MEMBER_ID)
+    assert member.regex == "egg"
+    assert member.toggle is True
+    assert member.ignore == set()
@@ -9,6 +9,9 @@ Author  : Preocts <preocts@preocts.com>
 Discord : Preocts#8196
 Git Repo: https://github.com/Preocts/Egg_Bot
 """
+import pathlib
+import shutil
+
 import discord
 import pytest
 
@@ -16,11 +19,11 @@ from modules.module_shoulderbirdparser import ShoulderBirdParser
 
 
 @pytest.fixture(scope="function", name="parser")
-def fixture_parser() -> ShoulderBirdParser:
-    """fixture"""
-    return ShoulderBirdParser(
-        discord.Client(), "./tests/fixtures/mock_shoulderbirdparser.json"
-    )
+def fixture_parser(tmp_path: pathlib.Path) -> ShoulderBirdParser:
+    """fixture, a copy of a 1.0.0 config as loading migrates and saves it"""
+    filename = str(tmp_path / "mock_shoulderbirdparser.json")
+    shutil.copyfile("./tests/fixtures/mock_shoulderbirdparser.json", filename)
+    return ShoulderBirdParser(discord.Client(), filename)
 
 
 def test_positive_match_simple(parser: ShoulderBirdParser) -> None:
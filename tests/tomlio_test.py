@@ -2,6 +2,7 @@
 import os
 import tempfile
 from typing import Generator
+from unittest.mock import patch
 
 import pytest
 
@@ -82,3 +83,38 @@ def test_save_and_load(toml_save: str) -> None:
     result = tomlio.load(toml_save)
 
     assert result == EXPECTED_TOML
+
+
+def test_load_is_cached(toml_load: str) -> None:
+    """Unchanged file is parsed once, changed file is parsed again"""
+    tomlio.clear_cache()
+    with patch.object(tomlio, "_parse", wraps=tomlio._parse) as parse:
+        first = tomlio.load(toml_load)
+        assert tomlio.load(toml_load) is first
+        assert parse.call_count == 1
+
+        with open(toml_load, "a", encoding="utf-8") as out_file:
+            out_file.write('\n[more]\nitems = ["a", "b"]\n')
+        second = tomlio.load(toml_load)
+        assert parse.call_count == 2
+        assert second["more"]["items"] == ("a", "b")
+
+
+def test_load_is_frozen(toml_load: str) -> None:
+    """Loaded config is shared so it cannot be changed, thaw for a copy"""
+    result = tomlio.load(toml_load)
+    with pytest.raises(TypeError):
+        result["default"]["test1"] = "changed"
+
+    copy = tomlio.thaw(result)
+    copy["default"]["test1"] = "changed"
+    assert tomlio.load(toml_load)["default"]["test1"] == "roger"
+
+
+def test_save_updates_cache(toml_save: str) -> None:
+    """Load after save uses the saved config without reading the file"""
+    tomlio.save(toml_save, {"default": {"items": [1, 2]}})
+    with patch("builtins.open") as mock_open:
+        result = tomlio.load(toml_save)
+        mock_open.assert_not_called()
+    assert result == {"default": {"items": (1, 2)}}